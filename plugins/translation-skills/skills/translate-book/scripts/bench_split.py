@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+bench_split.py - Time the markdown splitting step of convert.py.
+
+Runs line classification, structural block parsing and chunk merging over each
+given input.md (or a generated book of --synthetic-mb megabytes) and reports
+the best of --runs timings plus the peak memory parsing allocates, as JSON.
+"""
+
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from convert import classify_lines, merge_blocks_to_chunks, parse_structural_blocks
+
+
+def synthetic_book(megabytes, seed=0):
+    """A novel-shaped markdown document: mostly prose, with the odd list,
+    quote, table, image and code block between chapter headings."""
+    rng = random.Random(seed)
+    words = ("the sea lamp harbour keeper letter key island fog tide wall boat "
+             "night rail drawer photograph quarter hour weighed palm asleep").split()
+
+    def sentence():
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 18))).capitalize() + "."
+
+    parts = []
+    size = 0
+    chapter = 0
+    while size < megabytes * 1_000_000:
+        roll = rng.random()
+        if roll < 0.02:
+            chapter += 1
+            part = f"## Chapter {chapter}"
+        elif roll < 0.05:
+            part = "\n".join(f"- {sentence()}" for _ in range(rng.randint(2, 6)))
+        elif roll < 0.07:
+            part = "> " + sentence() + "\n" + sentence()
+        elif roll < 0.08:
+            part = "| a | b |\n|---|---|\n" + "\n".join(f"| {i} | {rng.choice(words)} |" for i in range(5))
+        elif roll < 0.09:
+            part = f"![figure](images/fig{rng.randint(1, 99)}.png)"
+        elif roll < 0.095:
+            part = "```\n" + "\n".join(sentence() for _ in range(4)) + "\n```"
+        else:
+            part = "\n".join(sentence() for _ in range(rng.randint(1, 6)))
+        parts.append(part)
+        size += len(part) + 2
+    return "\n\n".join(parts)
+
+
+def _best(fn, runs):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), result
+
+
+def bench(name, content, runs, chunk_size):
+    lines = content.split('\n')
+    classify_seconds, _ = _best(lambda: classify_lines(lines), runs)
+    parse_seconds, blocks = _best(lambda: parse_structural_blocks(content), runs)
+    merge_seconds, chunks = _best(lambda: merge_blocks_to_chunks(blocks, chunk_size), runs)
+
+    tracemalloc.start()
+    parse_structural_blocks(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    megabytes = len(content.encode('utf-8')) / 1_000_000
+    return {
+        "input": name,
+        "megabytes": round(megabytes, 2),
+        "lines": len(lines),
+        "blocks": len(blocks),
+        "chunks": len(chunks),
+        "classify_seconds": round(classify_seconds, 4),
+        "parse_seconds": round(parse_seconds, 4),
+        "merge_seconds": round(merge_seconds, 4),
+        "parse_mb_per_second": round(megabytes / max(parse_seconds, 1e-9), 1),
+        "parse_peak_mb": round(peak / 1_000_000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark convert.py's markdown splitting")
+    parser.add_argument("markdown", nargs="*", help="Markdown files to split (e.g. <book>_temp/input.md)")
+    parser.add_argument("--synthetic-mb", type=float, default=0,
+                        help="Also benchmark a generated book of this many megabytes")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per step; the best is reported (default: 3)")
+    parser.add_argument("--chunk-size", type=int, default=6000, help="Target chunk size (default: 6000)")
+    args = parser.parse_args()
+    if not args.markdown and not args.synthetic_mb:
+        parser.error("give at least one markdown file or --synthetic-mb")
+
+    reports = []
+    for path in args.markdown:
+        with open(path, 'r', encoding='utf-8') as f:
+            reports.append(bench(path, f.read(), args.runs, args.chunk_size))
+    if args.synthetic_mb:
+        content = synthetic_book(args.synthetic_mb)
+        reports.append(bench(f"synthetic {args.synthetic_mb} MB", content, args.runs, args.chunk_size))
+    print(json.dumps(reports, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+build_graph.py - Content-hash bookkeeping for merge_and_build.py's steps.
+
+The build is a chain of steps: output_chunk*.md -> output.md -> book.html
+(+TOC) and book_doc.html -> book.docx / book.epub / book.pdf. For each step
+build_state.json records the SHA-256 of every input (files and parameters
+such as the title) and of every output as last built. A step re-runs only
+when an input's content changed, or an output is missing or was changed
+outside the build; touching a file or a skewed clock never triggers work.
+
+File hashes are cached by (size, mtime_ns), which only decides whether a
+file must be re-hashed, never whether it is newer than another.
+"""
+
+import json
+import os
+import threading
+
+from manifest import file_hash, save_json
+
+STATE_FILE = "build_state.json"
+STATE_VERSION = 1
+
+
+def _summary(names, limit=5):
+    names = sorted(names)
+    return ", ".join(names[:limit]) + (f" (+{len(names) - limit} more)" if len(names) > limit else "")
+
+
+class BuildGraph:
+    """Recorded inputs and outputs of each build step of one temp_dir.
+
+    Steps may be checked and recorded from several threads at once.
+    """
+
+    def __init__(self, temp_dir, explain=False):
+        self.temp_dir = temp_dir
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._state = {"version": STATE_VERSION, "files": {}, "steps": {}}
+        try:
+            with open(os.path.join(temp_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("version") == STATE_VERSION:
+                self._state = state
+        except (OSError, ValueError):
+            pass
+
+    def _name(self, path):
+        # Files in temp_dir by relative name, so the directory can be moved;
+        # anything else (the templates) by absolute path
+        name = os.path.relpath(path, self.temp_dir)
+        return os.path.abspath(path) if name.startswith(os.pardir) else name
+
+    def file_hash(self, path):
+        """SHA-256 of path, or None if it does not exist."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        name = self._name(path)
+        with self._lock:
+            cached = self._state["files"].get(name)
+        if cached and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+            return cached[2]
+        digest = file_hash(path)
+        with self._lock:
+            self._state["files"][name] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def inputs(self, paths=(), **params):
+        """Input signature of a step: a hash per file, and each parameter's value."""
+        signature = {self._name(path): self.file_hash(path) for path in paths}
+        signature.update({f"param:{key}": value for key, value in params.items()})
+        return signature
+
+    def outdated(self, step, inputs, outputs):
+        """Why step must run, or None if its recorded build is still current."""
+        with self._lock:
+            recorded = self._state["steps"].get(step)
+        if recorded is None:
+            return "no previous build recorded"
+        for path in outputs:
+            name = self._name(path)
+            digest = self.file_hash(path)
+            if digest is None:
+                return f"{name} is missing"
+            if digest != recorded["outputs"].get(name):
+                return f"{name} was changed outside the build"
+        before = recorded["inputs"]
+        changed = [name for name in inputs if name in before and before[name] != inputs[name]]
+        added = [name for name in inputs if name not in before]
+        removed = [name for name in before if name not in inputs]
+        reasons = []
+        if changed:
+            reasons.append(f"changed: {_summary(changed)}")
+        if added:
+            reasons.append(f"new: {_summary(added)}")
+        if removed:
+            reasons.append(f"removed: {_summary(removed)}")
+        return "; ".join(reasons) or None
+
+    def check(self, step, inputs, outputs, log=print):
+        """outdated(), explained through log when explain is on."""
+        reason = self.outdated(step, inputs, outputs)
+        if self.explain:
+            if reason:
+                log(f"[explain] {step}: running — {reason}")
+            else:
+                log(f"[explain] {step}: skipped — {len(inputs)} input(s) and {len(outputs)} output(s) unchanged")
+        return reason
+
+    def record(self, step, inputs, outputs):
+        """Record a successful run of step and save build_state.json."""
+        entry = {
+            "inputs": inputs,
+            "outputs": {self._name(path): self.file_hash(path) for path in outputs},
+        }
+        with self._lock:
+            self._state["steps"][step] = entry
+            save_json(self.temp_dir, STATE_FILE, self._state)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+calibre_cache.py - Reuse earlier Calibre conversions of identical input.
+
+calibre_html_publish.py converts a private working directory (the prepared
+work.html plus the images it embeds). A conversion is keyed by the SHA-256
+of the Calibre version, the full ebook-convert argument list (with the input
+and output paths replaced by placeholders, so the key does not depend on
+where the book lives) and the content of every file in that directory. A
+hit copies the stored artifact instead of running Calibre, so re-publishing
+the same book with the same settings costs a file copy.
+
+Artifacts are stored as <key><ext> in one directory shared by every book
+(see DEFAULT_CACHE_DIR). A hit refreshes the entry's mtime, and after each
+store the least recently used entries are removed until the directory fits
+in max_bytes.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from manifest import atomic_write, file_hash
+
+CACHE_VERSION = "1"
+DEFAULT_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "translate-book",
+    "calibre",
+)
+DEFAULT_CACHE_MAX_MB = 1024
+
+INPUT_PLACEHOLDER = "<input>"
+OUTPUT_PLACEHOLDER = "<output>"
+
+
+def conversion_key(calibre_version, args, work_dir, exclude=()):
+    """Cache key of converting work_dir with ebook-convert args (without argv[0]).
+
+    args must already have the input and output paths replaced by
+    INPUT_PLACEHOLDER and OUTPUT_PLACEHOLDER. Files listed in exclude (such
+    as an output written inside work_dir) are left out of the key.
+    """
+    excluded = {os.path.abspath(path) for path in exclude}
+    digest = hashlib.sha256(json.dumps([CACHE_VERSION, calibre_version, list(args)]).encode('utf-8'))
+    files = []
+    for dirpath, dirnames, filenames in os.walk(work_dir):
+        dirnames.sort()
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if os.path.abspath(path) not in excluded:
+                files.append(path)
+    for path in sorted(files):
+        name = os.path.relpath(path, work_dir).replace(os.sep, '/')
+        digest.update(name.encode('utf-8') + b"\0" + file_hash(path).encode() + b"\0")
+    return digest.hexdigest()
+
+
+class ConversionCache:
+    """Converted books stored under cache_dir, at most max_bytes in total."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def _path(self, key, ext):
+        return os.path.join(self.cache_dir, f"{key}{ext}")
+
+    def fetch(self, key, ext, output_file):
+        """Copy the artifact stored for key to output_file; False on a miss."""
+        entry = self._path(key, ext)
+        try:
+            # Another process may evict the entry at any point: that is a miss
+            with open(entry, 'rb') as src, atomic_write(output_file, 'wb') as out:
+                shutil.copyfileobj(src, out, 1 << 20)
+        except FileNotFoundError:
+            return False
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        return True
+
+    def store(self, key, ext, artifact):
+        """Keep a copy of artifact for key, then evict down to max_bytes."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(artifact, 'rb') as src, atomic_write(self._path(key, ext), 'wb') as out:
+            shutil.copyfileobj(src, out, 1 << 20)
+        return self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the total fits; returns how many."""
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file():
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, entry.path))
+                total += st.st_size
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        return removed
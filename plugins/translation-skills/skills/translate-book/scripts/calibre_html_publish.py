@@ -14,13 +14,39 @@ import shutil
 from pathlib import Path
 import signal
 import re
+import time
 
-def timeout_handler(signum, frame):
-    """Handle timeout signal"""
-    raise TimeoutError("Conversion timed out")
+from calibre_cache import (DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB, INPUT_PLACEHOLDER, OUTPUT_PLACEHOLDER,
+                           ConversionCache, conversion_key)
+from image_assets import DEFAULT_MAX_DIM, PIL_AVAILABLE, optimize_images
+
+def run_with_timeout(cmd, timeout):
+    """Run cmd, capturing text output, and kill it with its children after timeout seconds.
+
+    The command gets its own process group, so the kill also reaches the
+    worker processes ebook-convert starts, and nothing here touches
+    process-wide signal state: several conversions can run side by side.
+    Raises subprocess.TimeoutExpired on timeout.
+    """
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            start_new_session=True)
+    try:
+        stdout, stderr = proc.communicate(timeout=timeout)
+    except BaseException:
+        # Timeout or Ctrl-C alike: take down ebook-convert and its workers
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        proc.communicate()
+        raise
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
 
 def find_calibre_convert():
-    """Find ebook-convert command from Calibre installation"""
+    """Find ebook-convert command from Calibre installation
+
+    Returns (path, version string), or (None, None) if it is not installed.
+    """
     possible_paths = [
         "/Applications/calibre.app/Contents/MacOS/ebook-convert",
         "/usr/bin/ebook-convert", 
@@ -33,11 +59,11 @@ def find_calibre_convert():
             result = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10)
             if result.returncode == 0:
                 print(f"✓ Found Calibre ebook-convert: {path}")
-                return path
+                return path, result.stdout.strip()
         except (FileNotFoundError, subprocess.TimeoutExpired):
             continue
     
-    return None
+    return None, None
 
 def extract_html_metadata(html_file):
     """Extract title and author from HTML file"""
@@ -211,10 +237,15 @@ def get_output_format(output_file):
     }
     return format_map.get(ext)
 
-def convert_html_with_calibre(html_file, output_file, format_type, timeout=600, lang="zh-CN"):
-    """Convert HTML to specified format using Calibre with timeout protection"""
+def convert_html_with_calibre(html_file, output_file, format_type, timeout=600, lang="zh-CN", cache=None):
+    """Convert HTML to specified format using Calibre with timeout protection
+
+    With a ConversionCache, the directory holding html_file (the prepared
+    HTML and its images) is looked up first and a hit is copied to
+    output_file without running Calibre; a fresh conversion is stored.
+    """
     
-    calibre_path = find_calibre_convert()
+    calibre_path, calibre_version = find_calibre_convert()
     if not calibre_path:
         raise RuntimeError("Calibre ebook-convert not found. Please install Calibre.")
     
@@ -258,21 +289,38 @@ def convert_html_with_calibre(html_file, output_file, format_type, timeout=600,
             "--pdf-mono-font-size", "12"
         ])
     
+    key = None
+    ext = os.path.splitext(output_file)[1].lower()
+    if cache:
+        args = [INPUT_PLACEHOLDER if arg == html_file else OUTPUT_PLACEHOLDER + ext if arg == output_file else arg
+                for arg in cmd[1:]]
+        try:
+            key = conversion_key(calibre_version, args, os.path.dirname(html_file), exclude=[output_file])
+            if cache.fetch(key, ext, output_file):
+                file_size = os.path.getsize(output_file)
+                print(f"Conversion cache: hit {key[:12]}, copied {file_size:,} bytes")
+                print(f"✓ {format_type.upper()} conversion successful: {output_file} ({file_size} bytes)")
+                return True
+            print(f"Conversion cache: miss {key[:12]}")
+        except OSError as e:
+            print(f"Warning: Conversion cache unavailable: {e}")
+            key = None
+    
     try:
-        # Set up timeout signal
-        signal.signal(signal.SIGALRM, timeout_handler)
-        signal.alarm(timeout)
-        
         print(f"Starting conversion (timeout: {timeout}s)...")
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        
-        # Cancel timeout
-        signal.alarm(0)
+        result = run_with_timeout(cmd, timeout)
         
         if result.returncode == 0:
             if os.path.exists(output_file):
                 file_size = os.path.getsize(output_file)
                 print(f"✓ {format_type.upper()} conversion successful: {output_file} ({file_size} bytes)")
+                if key:
+                    try:
+                        evicted = cache.store(key, ext, output_file)
+                        print(f"✓ Stored in conversion cache {cache.cache_dir}"
+                              + (f" ({evicted} least recently used evicted)" if evicted else ""))
+                    except OSError as e:
+                        print(f"Warning: Could not store conversion in cache: {e}")
                 return True
             else:
                 print(f"✗ {format_type.upper()} file was not created")
@@ -284,15 +332,9 @@ def convert_html_with_calibre(html_file, output_file, format_type, timeout=600,
     except subprocess.TimeoutExpired:
         print(f"✗ Conversion timed out after {timeout} seconds")
         return False
-    except TimeoutError:
-        print(f"✗ Conversion timed out after {timeout} seconds")
-        return False
     except Exception as e:
         print(f"✗ Conversion error: {e}")
         return False
-    finally:
-        # Ensure timeout is cancelled
-        signal.alarm(0)
 
 def main():
     """Main function"""
@@ -303,6 +345,17 @@ def main():
                        help='Conversion timeout in seconds (default: 600)')
     parser.add_argument('--lang', default='zh-CN',
                        help='Language code for output metadata (default: zh-CN)')
+    parser.add_argument('--image-max-dim', type=int, default=None,
+                       help='Downsize images to this many pixels on the long side, 0 to keep sizes '
+                            f'(default: {", ".join(f"{k} {v}" for k, v in DEFAULT_MAX_DIM.items())})')
+    parser.add_argument('--no-image-optimize', action='store_true',
+                       help='Embed images as they are (no deduplication, resizing or recompression)')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                       help=f'Cache of earlier conversions (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_CACHE_MAX_MB,
+                       help=f'Evict least recently used conversions beyond this size (default: {DEFAULT_CACHE_MAX_MB})')
+    parser.add_argument('--no-cache', action='store_true',
+                       help='Always run Calibre and leave the cache untouched')
     
     args = parser.parse_args()
     
@@ -338,7 +391,9 @@ def main():
         # Create temp directory in the same directory as input HTML
         input_dir = os.path.dirname(os.path.abspath(input_html))
         base_name = os.path.splitext(os.path.basename(input_html))[0]
-        temp_dir = os.path.join(input_dir, f"{base_name}_conversion_temp")
+        # One working directory per output format, so conversions of the
+        # same HTML can run at the same time
+        temp_dir = os.path.join(input_dir, f"{base_name}_{format_type}_conversion_temp")
         os.makedirs(temp_dir, exist_ok=True)
         
         print(f"Working directory: {temp_dir}")
@@ -349,16 +404,36 @@ def main():
         # Prepare HTML with styling
         work_html = prepare_html_for_conversion(input_html, temp_dir, args.lang)
         
+        # Deduplicate and shrink the working copy's images before Calibre embeds them
+        if image_count and not args.no_image_optimize:
+            max_dim = args.image_max_dim if args.image_max_dim is not None else DEFAULT_MAX_DIM[format_type]
+            started = time.monotonic()
+            stats = optimize_images(temp_dir, work_html, max_dim)
+            saved = stats['bytes_before'] - stats['bytes_after']
+            print(f"Image optimization: {stats['images']} images, {stats['duplicates']} duplicates removed, "
+                  f"{stats['resized_or_recompressed']} recompressed (max {max_dim or 'any'} px), "
+                  f"{stats['bytes_before']:,} -> {stats['bytes_after']:,} bytes "
+                  f"(saved {saved:,}) in {time.monotonic() - started:.1f}s")
+            if not PIL_AVAILABLE:
+                print("ℹ Pillow not installed - images deduplicated but not resized")
+        
         # Convert to specified format
-        if convert_html_with_calibre(work_html, final_output, format_type, args.timeout, args.lang):
+        started = time.monotonic()
+        cache = None if args.no_cache else ConversionCache(args.cache_dir, args.cache_max_mb * 1024 * 1024)
+        converted = convert_html_with_calibre(work_html, final_output, format_type, args.timeout, args.lang, cache)
+        print(f"Conversion time: {time.monotonic() - started:.1f}s")
+        if converted:
             print("\n" + "="*50)
             print(f"✅ Conversion completed successfully!")
             print(f"📁 File: {final_output}")
             
             # Copy images directory to the final output directory if they exist in temp
             image_count = 0
-            if os.path.exists(temp_dir):
-                output_dir = os.path.dirname(final_output)
+            output_dir = os.path.dirname(final_output)
+            # When the output sits next to the input, its images are already
+            # there; replacing them would pull them from under any other
+            # conversion still copying them
+            if os.path.exists(temp_dir) and os.path.abspath(output_dir) != input_dir:
                 images_dirs = ['images', 'media', 'image', 'pics']
                 
                 for img_dir_name in images_dirs:
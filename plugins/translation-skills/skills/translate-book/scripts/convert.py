@@ -12,9 +12,14 @@ import shutil
 import tempfile
 import argparse
 import glob
+import hashlib
+import io
+import itertools
 import re
+import sqlite3
 
-from manifest import create_manifest
+from manifest import chunk_entry, create_manifest, write_manifest
+from translation_memory import DEFAULT_MEMORY_PATH, TranslationMemory
 
 
 def find_calibre_convert():
@@ -243,113 +248,141 @@ def clean_calibre_markers(content):
 # Structural block parsing and chunk splitting (Step 3)
 # =============================================================================
 
-def parse_structural_blocks(content):
-    """Parse markdown into structural blocks that should not be split.
+# Line types, one per input line. The non-blank ones are the group numbers of
+# _LINE_RE, whose alternatives begin with distinct characters, so a stripped
+# line matches at most one of them.
+_BLANK, _FENCE, _HEADING, _QUOTE, _TABLE, _LIST, _IMAGE, _TEXT = range(8)
+_LINE_RE = re.compile(r'(```)|(#{1,6}\s)|(>)|(\|)|([-*+]\s|\d+\.\s)|(!\[)')
+_MULTILINE = (_FENCE, _QUOTE, _TABLE, _LIST, _TEXT)
+BLOCK_WINDOW_LINES = 4096
 
-    Returns list of (text, block_type) tuples where block_type is one of:
-    'heading', 'code_block', 'table', 'list', 'blockquote', 'image', 'paragraph'
+
+def classify_lines(lines):
+    """Return a bytearray holding the type of each line."""
+    match = _LINE_RE.match
+    types = bytearray(len(lines))
+    for n, line in enumerate(lines):
+        stripped = line.strip()
+        if stripped:
+            m = match(stripped)
+            types[n] = m.lastindex if m else _TEXT
+    return types
+
+
+def _group_blocks(lines, types, final=True):
+    """Group classified lines into (text, block_type) blocks.
+
+    Returns (blocks, consumed). Unless final, more lines may follow, so a
+    block that runs to within a line of the end (where the next line could
+    still extend it) is left out, and consumed is where it starts.
     """
+    n = len(lines)
     blocks = []
-    lines = content.split('\n')
     i = 0
 
-    while i < len(lines):
-        line = lines[i]
-        stripped = line.strip()
+    while i < n:
+        line_type = types[i]
+        start = i
+        i += 1
 
-        # Code block (fenced)
-        if stripped.startswith('```'):
-            block_lines = [line]
-            i += 1
-            while i < len(lines):
-                block_lines.append(lines[i])
-                if lines[i].strip().startswith('```') and len(block_lines) > 1:
-                    i += 1
-                    break
+        # Code block (fenced): runs through the closing fence
+        if line_type == _FENCE:
+            while i < n:
                 i += 1
-            blocks.append(('\n'.join(block_lines), 'code_block'))
-            continue
+                if types[i - 1] == _FENCE:
+                    break
+            block_type = 'code_block'
 
-        # Heading
-        if re.match(r'^#{1,6}\s', stripped):
-            blocks.append((line, 'heading'))
-            i += 1
-            continue
+        elif line_type == _HEADING:
+            block_type = 'heading'
 
-        # Blockquote
-        if stripped.startswith('>'):
-            block_lines = [line]
-            i += 1
-            while i < len(lines) and (lines[i].strip().startswith('>') or
-                                       (lines[i].strip() and not re.match(r'^#{1,6}\s', lines[i].strip())
-                                        and not lines[i].strip().startswith('```')
-                                        and not lines[i].strip().startswith('|')
-                                        and not re.match(r'^[-*+]\s', lines[i].strip())
-                                        and not re.match(r'^\d+\.\s', lines[i].strip())
-                                        and block_lines[-1].strip().startswith('>'))):
-                block_lines.append(lines[i])
+        # Blockquote: '>' lines, plus lazy continuation lines (plain text or
+        # an image) directly after a '>' line
+        elif line_type == _QUOTE:
+            while i < n and (types[i] == _QUOTE or
+                             (types[i] in (_TEXT, _IMAGE) and types[i - 1] == _QUOTE)):
                 i += 1
-            blocks.append(('\n'.join(block_lines), 'blockquote'))
-            continue
+            block_type = 'blockquote'
 
         # Table (lines starting with |)
-        if stripped.startswith('|'):
-            block_lines = [line]
-            i += 1
-            while i < len(lines) and lines[i].strip().startswith('|'):
-                block_lines.append(lines[i])
+        elif line_type == _TABLE:
+            while i < n and types[i] == _TABLE:
                 i += 1
-            blocks.append(('\n'.join(block_lines), 'table'))
-            continue
-
-        # List (unordered or ordered)
-        if re.match(r'^[-*+]\s', stripped) or re.match(r'^\d+\.\s', stripped):
-            block_lines = [line]
-            i += 1
-            while i < len(lines):
-                s = lines[i].strip()
-                # Continue list: list items, indented continuation, or blank lines within list
-                if (re.match(r'^[-*+]\s', s) or re.match(r'^\d+\.\s', s) or
-                        (lines[i].startswith('  ') and s) or
-                        (s == '' and i + 1 < len(lines) and
-                         (re.match(r'^[-*+]\s', lines[i+1].strip()) or
-                          re.match(r'^\d+\.\s', lines[i+1].strip()) or
-                          lines[i+1].startswith('  ')))):
-                    block_lines.append(lines[i])
+            block_type = 'table'
+
+        # List: list items, indented continuation, or blank lines within list
+        elif line_type == _LIST:
+            while i < n:
+                if (types[i] == _LIST or
+                        (types[i] != _BLANK and lines[i].startswith('  ')) or
+                        (types[i] == _BLANK and i + 1 < n and
+                         (types[i + 1] == _LIST or lines[i + 1].startswith('  ')))):
                     i += 1
                 else:
                     break
-            blocks.append(('\n'.join(block_lines), 'list'))
-            continue
+            block_type = 'list'
 
         # Image line (standalone or with surrounding caption)
-        if re.match(r'!\[', stripped):
-            blocks.append((line, 'image'))
-            i += 1
-            continue
+        elif line_type == _IMAGE:
+            block_type = 'image'
 
         # Empty line — just a paragraph separator
-        if stripped == '':
-            blocks.append((line, 'paragraph'))
-            i += 1
-            continue
+        elif line_type == _BLANK:
+            block_type = 'paragraph'
 
-        # Regular paragraph — collect contiguous non-empty, non-special lines
-        block_lines = [line]
-        i += 1
-        while i < len(lines):
-            s = lines[i].strip()
-            if (s == '' or s.startswith('```') or re.match(r'^#{1,6}\s', s) or
-                    s.startswith('>') or s.startswith('|') or
-                    re.match(r'^[-*+]\s', s) or re.match(r'^\d+\.\s', s) or
-                    re.match(r'!\[', s)):
-                break
-            block_lines.append(lines[i])
-            i += 1
-        blocks.append(('\n'.join(block_lines), 'paragraph'))
-        continue
+        # Regular paragraph — collect contiguous plain text lines
+        else:
+            while i < n and types[i] == _TEXT:
+                i += 1
+            block_type = 'paragraph'
+
+        if not final and i >= n - 1 and line_type in _MULTILINE:
+            return blocks, start
+        blocks.append(('\n'.join(lines[start:i]), block_type))
+
+    return blocks, n
 
-    return blocks
+
+def parse_structural_blocks(content):
+    """Parse markdown into structural blocks that should not be split.
+
+    Returns list of (text, block_type) tuples where block_type is one of:
+    'heading', 'code_block', 'table', 'list', 'blockquote', 'image', 'paragraph'
+
+    Every line is classified once by classify_lines; the grouping only
+    looks at the resulting types (and, inside lists, at indentation).
+    """
+    lines = content.split('\n')
+    return _group_blocks(lines, classify_lines(lines))[0]
+
+
+def iter_structural_blocks(lines, window=BLOCK_WINDOW_LINES):
+    """parse_structural_blocks over an iterable of lines (without newlines).
+
+    Lines are grouped window lines at a time; a block still open at the end
+    of a window is carried into the next, so the blocks are the same as for
+    the whole text while only a window (or one block, if longer) is held.
+    """
+    lines = iter(lines)
+    pending, pending_types = [], bytearray()
+    while True:
+        batch = list(itertools.islice(lines, window))
+        pending += batch
+        pending_types += classify_lines(batch)
+        blocks, consumed = _group_blocks(pending, pending_types, final=not batch)
+        yield from blocks
+        if not batch:
+            return
+        del pending[:consumed], pending_types[:consumed]
+
+
+def read_lines(f):
+    """Yield the lines of a text file the way f.read().split('\\n') would."""
+    line = ''
+    for line in f:
+        yield line[:-1] if line.endswith('\n') else line
+    if not line or line.endswith('\n'):
+        yield ''
 
 
 def merge_blocks_to_chunks(blocks, target_size=6000):
@@ -358,41 +391,38 @@ def merge_blocks_to_chunks(blocks, target_size=6000):
     Prefers to split at heading boundaries. Never splits within a single
     structural block unless the block itself exceeds target_size * 2.
     """
-    chunks = []
+    return list(iter_chunks(blocks, target_size))
+
+
+def iter_chunks(blocks, target_size=6000):
+    """merge_blocks_to_chunks as a generator: each chunk is yielded as soon
+    as the block after it is seen, so blocks can be a stream."""
     current_parts = []
     current_size = 0
 
-    def flush():
-        nonlocal current_parts, current_size
-        if current_parts:
-            chunks.append('\n'.join(current_parts))
-            current_parts = []
-            current_size = 0
-
     for text, btype in blocks:
         block_size = len(text)
 
         # If a single block is oversized, handle degradation
         if block_size > target_size * 2:
-            flush()
+            if current_parts:
+                yield '\n'.join(current_parts)
+                current_parts, current_size = [], 0
             print(f"  WARNING: Oversized {btype} block ({block_size} chars), force-splitting")
-            sub_chunks = _force_split_block(text, target_size)
-            chunks.extend(sub_chunks)
+            yield from _force_split_block(text, target_size)
             continue
 
-        # Prefer to split at heading boundaries
-        if btype == 'heading' and current_size > 0:
-            flush()
-
-        # Would adding this block exceed target?
-        if current_size + block_size > target_size and current_parts:
-            flush()
+        # Prefer to split at heading boundaries; would adding this block exceed target?
+        if current_parts and ((btype == 'heading' and current_size > 0) or
+                              current_size + block_size > target_size):
+            yield '\n'.join(current_parts)
+            current_parts, current_size = [], 0
 
         current_parts.append(text)
         current_size += block_size
 
-    flush()
-    return chunks
+    if current_parts:
+        yield '\n'.join(current_parts)
 
 
 def _force_split_block(text, target_size):
@@ -464,33 +494,209 @@ def _force_split_block(text, target_size):
     return chunks
 
 
-def split_markdown_structured(md_file, temp_dir, target_size=6000):
-    """Split markdown into structural chunks.
+# =============================================================================
+# Makespan-balanced chunking
+# =============================================================================
+# Sub-agents run in batches of `concurrency` chunks, and each batch lasts as
+# long as its costliest chunk, so the book takes the sum of the batch maxima.
+# Balanced mode picks a multiple of `concurrency` chunks and cuts the block
+# sequence so the costliest chunk is as cheap as possible, still only between
+# structural blocks (and at a heading when a chunk is already mostly full).
+
+COST_MODELS = ('chars', 'tokens')
+HEADING_BREAK_FILL = 0.6
+
+_CJK_RE = re.compile(r'[\u1100-\u11ff\u2e80-\ua4cf\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+
+
+def estimate_tokens(text):
+    """Rough token count: one per CJK character, one per four other non-space characters."""
+    cjk = len(_CJK_RE.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\n')
+    return cjk + (other + 3) // 4
+
+
+def block_cost(text, cost_model):
+    return estimate_tokens(text) if cost_model == 'tokens' else len(text)
+
+
+def _split_oversized(blocks, target_size, warn=False):
+    """Blocks, with any over target_size * 2 characters force-split into pieces."""
+    for text, btype in blocks:
+        if len(text) > target_size * 2:
+            if warn:
+                print(f"  WARNING: Oversized {btype} block ({len(text)} chars), force-splitting")
+            for piece in _force_split_block(text, target_size):
+                yield piece, btype
+        else:
+            yield text, btype
+
+
+def _pack(costs, headings, cap, heading_fill):
+    """Greedy contiguous packing under cap; returns per-chunk block counts and costs."""
+    counts, chunk_costs = [], []
+    count = current = 0
+    for cost, heading in zip(costs, headings):
+        if count and (current + cost > cap or
+                      (heading and heading_fill is not None and current >= cap * heading_fill)):
+            counts.append(count)
+            chunk_costs.append(current)
+            count = current = 0
+        count += 1
+        current += cost
+    if count:
+        counts.append(count)
+        chunk_costs.append(current)
+    return counts, chunk_costs
+
+
+def plan_balanced_chunks(costs, headings, concurrency, target_cost):
+    """Cut a block sequence into chunks whose costs are even within batches.
+
+    costs and headings describe each block (cost, starts with a heading). The
+    number of chunks is the smallest multiple of concurrency that keeps the
+    average at or under target_cost; the cap on a chunk's cost is then the smallest under
+    which greedy packing fits in that many chunks (binary search).
+    Returns (block count per chunk, cost per chunk).
+    """
+    if not costs:
+        return [], []
+    total = sum(costs)
+    batches = max(1, -(-total // (target_cost * concurrency)))
+    limit = min(batches * concurrency, len(costs))
+
+    for heading_fill in (HEADING_BREAK_FILL, None):
+        lo, hi = max(costs), total
+        if len(_pack(costs, headings, hi, heading_fill)[0]) > limit:
+            continue
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if len(_pack(costs, headings, mid, heading_fill)[0]) <= limit:
+                hi = mid
+            else:
+                lo = mid + 1
+        return _pack(costs, headings, lo, heading_fill)
+    return _pack(costs, headings, total, None)
+
+
+def predicted_makespan(chunk_costs, concurrency):
+    """Total cost when chunks run in order, concurrency at a time, each batch
+    waiting for its costliest chunk."""
+    return sum(max(chunk_costs[i:i + concurrency]) for i in range(0, len(chunk_costs), concurrency))
+
+
+def iter_planned_chunks(blocks, counts):
+    """Join consecutive blocks into chunks of the given block counts."""
+    blocks = iter(blocks)
+    for count in counts:
+        yield '\n'.join(text for text, _ in itertools.islice(blocks, count))
+
+
+class _HashingReader(io.RawIOBase):
+    """Binary reader that feeds every byte it reads to digest."""
+
+    def __init__(self, raw, digest):
+        self._raw = raw
+        self._digest = digest
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._raw.readinto(buffer)
+        if count:
+            self._digest.update(memoryview(buffer)[:count])
+        return count
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+def _plan_file(md_file, target_size, concurrency, cost_model):
+    """First pass of balanced mode: cost every block, keeping only the numbers."""
+    costs, headings = [], []
+    char_total = 0
+    with open(md_file, 'r', encoding='utf-8') as f:
+        for text, btype in _split_oversized(iter_structural_blocks(read_lines(f)), target_size):
+            costs.append(block_cost(text, cost_model))
+            headings.append(btype == 'heading')
+            char_total += len(text)
+    # target_size is in characters; express it in the cost model's units
+    target_cost = target_size * sum(costs) / char_total if char_total else target_size
+    return plan_balanced_chunks(costs, headings, concurrency, max(int(target_cost), 1))
+
+
+def split_markdown_structured(md_file, temp_dir, target_size=6000, memory=None,
+                              concurrency=None, cost_model='chars'):
+    """Split markdown into structural chunks and write manifest.json for them.
+
+    The file streams through lines -> blocks -> chunks -> chunkNNNN.md, each
+    chunk hashed from the bytes just written and the source hashed as it is
+    read, so nothing is read twice and memory does not grow with the book.
+
+    With a TranslationMemory, a chunk it can fully translate also gets its
+    output_chunkNNNN.md written, so no sub-agent is needed for it.
+
+    With concurrency, chunks are balanced for batches of that many sub-agents
+    (see plan_balanced_chunks) instead of packed greedily. That takes one
+    extra pass over the file to cost the blocks; each chunk's cost and the
+    predicted makespan are printed and recorded in the manifest.
 
     Returns list of chunk filenames (e.g. ['chunk0001.md', ...]).
     """
     try:
-        with open(md_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        blocks = parse_structural_blocks(content)
-        chunk_texts = merge_blocks_to_chunks(blocks, target_size)
-
-        chunk_files = []
-        for i, chunk_text in enumerate(chunk_texts, 1):
-            filename = f"chunk{i:04d}.md"
-            chunk_file = os.path.join(temp_dir, filename)
-            with open(chunk_file, 'w', encoding='utf-8') as f:
-                f.write(chunk_text)
-            chunk_files.append(filename)
-
-        print(f"Split into {len(chunk_files)} chunks")
-        for filename in chunk_files:
-            filepath = os.path.join(temp_dir, filename)
-            size = os.path.getsize(filepath)
-            print(f"  {filename}: {size} characters")
-
-        return chunk_files
+        source_digest = hashlib.sha256()
+        chunks = []
+        sizes = []
+        prefilled = 0
+        if concurrency:
+            counts, chunk_costs = _plan_file(md_file, target_size, concurrency, cost_model)
+        raw = _HashingReader(open(md_file, 'rb'), source_digest)
+        with io.TextIOWrapper(io.BufferedReader(raw), encoding='utf-8') as f:
+            blocks = iter_structural_blocks(read_lines(f))
+            if concurrency:
+                chunk_texts = iter_planned_chunks(_split_oversized(blocks, target_size, warn=True), counts)
+            else:
+                chunk_texts = iter_chunks(blocks, target_size)
+            for order, chunk_text in enumerate(chunk_texts, 1):
+                filename = f"chunk{order:04d}.md"
+                data = chunk_text.encode('utf-8')
+                chunk_path = os.path.join(temp_dir, filename)
+                with open(chunk_path, 'wb') as out:
+                    out.write(data)
+                chunks.append(chunk_entry(order, filename, hashlib.sha256(data).hexdigest(), os.stat(chunk_path)))
+                sizes.append(len(data))
+                if memory is not None:
+                    translation = memory.translate_chunk(chunk_text, parse_structural_blocks(chunk_text))
+                    if translation is not None:
+                        with open(os.path.join(temp_dir, f"output_{filename}"), 'w', encoding='utf-8') as out:
+                            out.write(translation)
+                        prefilled += 1
+
+        print(f"Split into {len(chunks)} chunks")
+        schedule = None
+        if concurrency:
+            for i, (chunk, size, cost) in enumerate(zip(chunks, sizes, chunk_costs)):
+                chunk["cost"] = cost
+                print(f"  {chunk['source_file']}: {size} characters, cost {cost} {cost_model} (batch {i // concurrency + 1})")
+            schedule = {
+                "concurrency": concurrency,
+                "cost_model": cost_model,
+                "predicted_makespan": predicted_makespan(chunk_costs, concurrency),
+            }
+            print(f"Predicted makespan: {schedule['predicted_makespan']} {cost_model} over "
+                  f"{-(-len(chunks) // concurrency)} batches of {concurrency} "
+                  f"(lower bound {-(-sum(chunk_costs) // concurrency)})")
+        else:
+            for chunk, size in zip(chunks, sizes):
+                print(f"  {chunk['source_file']}: {size} characters")
+        if prefilled:
+            print(f"Pre-filled {prefilled} of {len(chunks)} chunks from translation memory ({memory.path})")
+
+        if chunks:
+            write_manifest(temp_dir, chunks, source_digest.hexdigest(), schedule)
+        return [chunk["source_file"] for chunk in chunks]
     except Exception as e:
         print(f"Error splitting markdown: {e}")
         return []
@@ -541,7 +747,7 @@ conversion_method=calibre_htmlz
         return False
 
 
-def _do_split_and_manifest(temp_dir, input_md, chunk_size):
+def _do_split_and_manifest(temp_dir, input_md, chunk_size, memory=None, concurrency=None, cost_model='chars'):
     """Split markdown and create manifest. Returns chunk count or 0 on failure."""
     existing, is_legacy = _find_existing_chunk_files(temp_dir)
     if existing:
@@ -550,13 +756,21 @@ def _do_split_and_manifest(temp_dir, input_md, chunk_size):
         create_manifest(temp_dir, existing, input_md)
         return len(existing)
 
-    chunk_files = split_markdown_structured(input_md, temp_dir, chunk_size)
-    if not chunk_files:
-        return 0
-    create_manifest(temp_dir, chunk_files, input_md)
+    chunk_files = split_markdown_structured(input_md, temp_dir, chunk_size, memory, concurrency, cost_model)
     return len(chunk_files)
 
 
+def open_memory(args):
+    """The translation memory for this run's language pair, or None."""
+    if args.no_memory:
+        return None
+    try:
+        return TranslationMemory(args.memory, args.ilang, args.olang)
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: translation memory unavailable ({e}); every chunk will need translating")
+        return None
+
+
 def main():
     """Main conversion function"""
     parser = argparse.ArgumentParser(description="Convert PDF/DOCX/EPUB to markdown chunks via HTMLZ")
@@ -564,8 +778,19 @@ def main():
     parser.add_argument("-l", "--ilang", default="auto", help="Input language (default: auto)")
     parser.add_argument("--olang", default="zh", help="Output language (default: zh)")
     parser.add_argument("--chunk-size", type=int, default=6000, help="Target chunk size in characters (default: 6000)")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="Balance chunk sizes for batches of this many parallel sub-agents "
+                             "(default: pack greedily up to --chunk-size)")
+    parser.add_argument("--cost-model", choices=COST_MODELS, default="chars",
+                        help="What balanced chunking evens out: characters, or estimated tokens "
+                             "(counts CJK text per character) (default: chars)")
+    parser.add_argument("--memory", default=DEFAULT_MEMORY_PATH,
+                        help=f"Translation memory used to pre-fill chunks (default: {DEFAULT_MEMORY_PATH})")
+    parser.add_argument("--no-memory", action="store_true", help="Do not pre-fill chunks from the translation memory")
 
     args = parser.parse_args()
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
     input_file = args.input_file
 
     if not os.path.exists(input_file):
@@ -588,6 +813,7 @@ def main():
         sys.exit(1)
 
     htmlz_file = f"{os.path.splitext(input_file)[0]}.htmlz"
+    memory = open_memory(args)
 
     try:
         base_name = os.path.splitext(os.path.basename(input_file))[0]
@@ -623,7 +849,8 @@ def main():
                 if not convert_html_to_markdown(input_html_path, input_md):
                     sys.exit(1)
 
-            chunk_count = _do_split_and_manifest(temp_dir, input_md, args.chunk_size)
+            chunk_count = _do_split_and_manifest(temp_dir, input_md, args.chunk_size, memory,
+                                                 args.concurrency, args.cost_model)
             if chunk_count == 0:
                 sys.exit(1)
 
@@ -655,7 +882,8 @@ def main():
                 if not convert_html_to_markdown(input_html, input_md):
                     sys.exit(1)
 
-            chunk_count = _do_split_and_manifest(temp_dir, input_md, args.chunk_size)
+            chunk_count = _do_split_and_manifest(temp_dir, input_md, args.chunk_size, memory,
+                                                 args.concurrency, args.cost_model)
             if chunk_count == 0:
                 sys.exit(1)
 
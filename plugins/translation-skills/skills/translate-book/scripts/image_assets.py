@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+image_assets.py - Deduplicate, downsize and recompress a book's images.
+
+Runs on the private copy calibre_html_publish.py makes for each format, just
+before Calibre embeds the images:
+
+1. Every image under the working directory is hashed, and the HTML's
+   src/href references to byte-identical copies are rewritten to the one
+   that is kept, so Calibre embeds each picture once. A copy is deleted
+   only when the HTML no longer mentions it anywhere (a CSS url() or a
+   srcset still needs the file).
+2. JPEG, PNG and WebP images larger than max_dim on their long side are
+   scaled down, and all of them are re-encoded; a result is only kept when
+   it is smaller (or was resized).
+
+Hashing and re-encoding run on a thread pool. Resizing needs Pillow; without
+it only the deduplication runs.
+"""
+
+import os
+import re
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote
+
+from manifest import file_hash
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.svg', '.webp', '.bmp')
+RECOMPRESS_FORMATS = {'JPEG', 'PNG', 'WEBP'}
+JPEG_QUALITY = 85
+
+# Long-side pixel limit per output format: e-readers gain nothing past
+# about 1600 px, print PDF keeps more for a full-width figure at ~250 dpi
+DEFAULT_MAX_DIM = {'docx': 1600, 'epub': 1600, 'pdf': 2000}
+
+_REF_RE = re.compile(r'''(\b(?:src|href)\s*=\s*)(["'])([^"']+)\2''', re.IGNORECASE)
+
+
+def find_images(root):
+    """Image files under root, as sorted paths relative to it (with '/')."""
+    images = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                images.append(os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, '/'))
+    return sorted(images)
+
+
+def rewrite_references(html, replacements):
+    """html with src/href values naming a key of replacements pointed at its
+    (URL-quoted) value."""
+    def replace(match):
+        value = match.group(3)
+        target = replacements.get(unquote(value).removeprefix('./'))
+        if target is None:
+            return match.group(0)
+        return f'{match.group(1)}{match.group(2)}{quote(target)}{match.group(2)}'
+    return _REF_RE.sub(replace, html)
+
+
+def _mentioned(html, name):
+    """Whether html may still refer to image name in any form."""
+    base = name.rsplit('/', 1)[-1]
+    return any(re.search(rf'(?<![\w.-]){re.escape(form)}(?![\w.-])', html) for form in {base, quote(base)})
+
+
+def _recompress(path, max_dim):
+    """Shrink and re-encode one image in place; returns (bytes before, after)."""
+    before = os.path.getsize(path)
+    tmp = None
+    try:
+        with Image.open(path) as image:
+            if image.format not in RECOMPRESS_FORMATS or getattr(image, 'n_frames', 1) > 1:
+                return before, before
+            image_format = image.format
+            resized = bool(max_dim) and max(image.size) > max_dim
+            image = ImageOps.exif_transpose(image)
+            if resized:
+                image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+            options = {'optimize': True}
+            if image_format in ('JPEG', 'WEBP'):
+                options['quality'] = JPEG_QUALITY
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=os.path.splitext(path)[1])
+            with os.fdopen(fd, 'wb') as out:
+                image.save(out, image_format, **options)
+        after = os.path.getsize(tmp)
+        if resized or after < before:
+            os.replace(tmp, path)
+            return before, after
+    except OSError:
+        pass  # unreadable or unsupported: leave it to Calibre
+    if tmp and os.path.exists(tmp):
+        os.remove(tmp)
+    return before, before
+
+
+def optimize_images(root, html_file, max_dim=None, workers=None):
+    """Deduplicate and recompress the images under root that html_file uses.
+
+    max_dim of None or 0 only re-encodes, never resizes. Returns a dict of
+    counts and byte totals for reporting.
+    """
+    images = find_images(root)
+    stats = {'images': len(images), 'duplicates': 0, 'resized_or_recompressed': 0,
+             'bytes_before': 0, 'bytes_after': 0}
+    if not images:
+        return stats
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        paths = [os.path.join(root, name) for name in images]
+        sizes = [os.path.getsize(path) for path in paths]
+        stats['bytes_before'] = sum(sizes)
+
+        # Only files sharing a size can be identical; hash just those
+        by_size = defaultdict(list)
+        for name, size in zip(images, sizes):
+            by_size[size].append(name)
+        candidates = [name for group in by_size.values() if len(group) > 1 for name in group]
+        by_hash = defaultdict(list)
+        for name, digest in zip(candidates, pool.map(lambda n: file_hash(os.path.join(root, n)), candidates)):
+            by_hash[digest].append(name)
+
+        replacements = {}
+        for group in by_hash.values():
+            for duplicate in group[1:]:
+                replacements[duplicate] = group[0]
+        removed = set()
+        if replacements:
+            with open(html_file, 'r', encoding='utf-8') as f:
+                html = rewrite_references(f.read(), replacements)
+            with open(html_file, 'w', encoding='utf-8') as f:
+                f.write(html)
+            for duplicate in replacements:
+                if not _mentioned(html, duplicate):
+                    os.remove(os.path.join(root, duplicate))
+                    removed.add(duplicate)
+        stats['duplicates'] = len(removed)
+
+        kept = [os.path.join(root, name) for name in images if name not in removed]
+        if PIL_AVAILABLE:
+            results = list(pool.map(lambda path: _recompress(path, max_dim), kept))
+            stats['resized_or_recompressed'] = sum(1 for before, after in results if after != before)
+            stats['bytes_after'] = sum(after for _, after in results)
+        else:
+            stats['bytes_after'] = sum(os.path.getsize(path) for path in kept)
+    return stats
@@ -6,19 +6,97 @@ manifest.py - Manifest management for chunk tracking and merge validation.
 import os
 import json
 import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+# mkstemp creates files readable by the owner only; atomic_write gives its
+# files the mode a plain open() would
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 
 def file_hash(filepath):
     """Compute SHA-256 hash of a file."""
     h = hashlib.sha256()
     with open(filepath, 'rb') as f:
-        for block in iter(lambda: f.read(8192), b''):
+        for block in iter(lambda: f.read(1 << 20), b''):
             h.update(block)
     return h.hexdigest()
 
 
+def chunk_entry(order, filename, source_hash, source_stat=None):
+    """Manifest entry for one chunk file.
+
+    source_stat (os.stat of the chunk as hashed) lets validate_for_merge skip
+    re-hashing the chunk while its size and mtime are unchanged.
+    """
+    # Derive output filename: chunk0001.md -> output_chunk0001.md
+    entry = {
+        "id": os.path.splitext(filename)[0],  # e.g. "chunk0001"
+        "order": order,
+        "source_file": filename,
+        "source_hash": source_hash,
+        "output_file": f"output_{filename}",
+    }
+    if source_stat is not None:
+        _record_stat(entry, source_stat)
+    return entry
+
+
+def _record_stat(entry, st):
+    entry["source_size"] = st.st_size
+    entry["source_mtime_ns"] = st.st_mtime_ns
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8'):
+    """Open a temp file that replaces path once the block completes, so an
+    interrupted write never leaves a truncated file behind."""
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=f".{name}-")
+    try:
+        os.fchmod(fd, 0o666 & ~_UMASK)
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def save_json(temp_dir, name, data):
+    """Replace temp_dir/name atomically with data as JSON."""
+    with atomic_write(os.path.join(temp_dir, name)) as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+
+
+def _save_manifest(temp_dir, manifest):
+    save_json(temp_dir, "manifest.json", manifest)
+
+
+def write_manifest(temp_dir, chunks, source_hash, schedule=None):
+    """Write manifest.json from chunk entries built with chunk_entry().
+
+    schedule, if given, records how balanced chunking expects the chunks to
+    run (concurrency, cost model, predicted makespan).
+    """
+    manifest = {
+        "chunk_count": len(chunks),
+        "source_hash": source_hash,
+        "chunks": chunks,
+    }
+    if schedule:
+        manifest["schedule"] = schedule
+
+    _save_manifest(temp_dir, manifest)
+    print(f"Created manifest.json ({len(chunks)} chunks)")
+    return manifest
+
+
 def create_manifest(temp_dir, chunk_files, source_md_path):
-    """Create manifest.json after splitting.
+    """Create manifest.json for chunk files already on disk, hashing each.
 
     Args:
         temp_dir: temp directory path
@@ -30,30 +108,36 @@ def create_manifest(temp_dir, chunk_files, source_md_path):
     chunks = []
     for order, filename in enumerate(chunk_files, 1):
         filepath = os.path.join(temp_dir, filename)
-        # Derive output filename: chunk0001.md -> output_chunk0001.md
-        output_filename = f"output_{filename}"
-        chunk_id = os.path.splitext(filename)[0]  # e.g. "chunk0001"
-
-        chunks.append({
-            "id": chunk_id,
-            "order": order,
-            "source_file": filename,
-            "source_hash": file_hash(filepath) if os.path.exists(filepath) else "",
-            "output_file": output_filename,
-        })
+        if os.path.exists(filepath):
+            chunks.append(chunk_entry(order, filename, file_hash(filepath), os.stat(filepath)))
+        else:
+            chunks.append(chunk_entry(order, filename, ""))
 
-    manifest = {
-        "chunk_count": len(chunks),
-        "source_hash": source_hash,
+    return write_manifest(temp_dir, chunks, source_hash)
+
+
+def write_merge_index(temp_dir, output_hash, output_size, chunks):
+    """Write merge_index.json describing output.md as merged.
+
+    chunks is [{"output_file", "offset", "length", "hash"}, ...] in merge
+    order: where each chunk's stripped text sits in output.md (byte offset
+    and length, separator excluded) and its SHA-256, so a later step can tell
+    which parts of output.md changed without re-reading every chunk.
+    """
+    save_json(temp_dir, "merge_index.json", {
+        "output_hash": output_hash,
+        "output_size": output_size,
         "chunks": chunks,
-    }
+    })
 
-    manifest_path = os.path.join(temp_dir, "manifest.json")
-    with open(manifest_path, 'w', encoding='utf-8') as f:
-        json.dump(manifest, f, indent=2, ensure_ascii=False)
 
-    print(f"Created manifest.json ({len(chunks)} chunks)")
-    return manifest
+def load_merge_index(temp_dir):
+    """Load merge_index.json from temp_dir. Returns None if not found."""
+    index_path = os.path.join(temp_dir, "merge_index.json")
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 
 def load_manifest(temp_dir):
@@ -65,9 +149,75 @@ def load_manifest(temp_dir):
         return json.load(f)
 
 
-def validate_for_merge(temp_dir):
+def _check_chunk(temp_dir, chunk, full_verify):
+    """Validate one chunk's source and output.
+
+    Returns (error, warning, output_path, source_stat); source_stat is set
+    when the source was re-hashed, matched, and its stat should be recorded.
+    """
+    output_path = os.path.join(temp_dir, chunk["output_file"])
+    source_path = os.path.join(temp_dir, chunk["source_file"])
+
+    # Check source file exists — reject outputs without source chunks
+    try:
+        source_stat = os.stat(source_path)
+    except FileNotFoundError:
+        return (
+            f"Missing source: {chunk['source_file']} (chunk {chunk['id']}) — "
+            f"cannot verify output integrity without source chunk"
+        ), None, None, None
+
+    # Check source hash matches — detect stale outputs from changed sources.
+    # A chunk whose size and mtime match what was recorded when it was last
+    # hashed is taken as unchanged, unless full_verify asks for every hash.
+    rehashed = None
+    unchanged = (
+        not full_verify
+        and chunk.get("source_size") == source_stat.st_size
+        and chunk.get("source_mtime_ns") == source_stat.st_mtime_ns
+    )
+    if chunk.get("source_hash") and not unchanged:
+        current_hash = file_hash(source_path)
+        if current_hash != chunk["source_hash"]:
+            return (
+                f"Source changed since splitting: {chunk['source_file']} "
+                f"(chunk {chunk['id']}). "
+                f"Expected hash {chunk['source_hash'][:12]}..., "
+                f"got {current_hash[:12]}... — "
+                f"delete output and re-translate, or re-run convert.py to re-split"
+            ), None, None, None
+        rehashed = source_stat
+
+    # Check output exists
+    try:
+        output_size = os.path.getsize(output_path)
+    except FileNotFoundError:
+        return f"Missing output: {chunk['output_file']} (chunk {chunk['id']})", None, None, rehashed
+
+    # Check non-empty
+    if output_size == 0:
+        return f"Empty output: {chunk['output_file']} (chunk {chunk['id']})", None, None, rehashed
+
+    # Check abnormally short
+    warning = None
+    source_size = source_stat.st_size
+    if source_size > 0 and output_size < source_size * 0.1:
+        warning = (
+            f"Suspiciously short: {chunk['output_file']} "
+            f"({output_size} bytes vs source {source_size} bytes)"
+        )
+
+    return None, warning, output_path, rehashed
+
+
+def validate_for_merge(temp_dir, full_verify=False):
     """Validate that all chunks have been translated before merging.
 
+    Chunks are checked concurrently. A source chunk is re-hashed only when
+    its size or mtime differs from the manifest (or the manifest predates
+    those fields), and the stat of each chunk that re-hashes clean is saved
+    back to the manifest; full_verify re-hashes every chunk regardless.
+
     Returns (ok, ordered_output_files, warnings) where:
         ok: True if merge can proceed
         ordered_output_files: list of output file paths in order
@@ -81,53 +231,27 @@ def validate_for_merge(temp_dir):
     errors = []
     warnings = []
     ordered_output_files = []
+    restat = 0
 
-    for chunk in sorted(manifest["chunks"], key=lambda c: c["order"]):
-        output_path = os.path.join(temp_dir, chunk["output_file"])
-        source_path = os.path.join(temp_dir, chunk["source_file"])
-
-        # Check source file exists — reject outputs without source chunks
-        if not os.path.exists(source_path):
-            errors.append(
-                f"Missing source: {chunk['source_file']} (chunk {chunk['id']}) — "
-                f"cannot verify output integrity without source chunk"
-            )
-            continue
-
-        # Check source hash matches — detect stale outputs from changed sources
-        if chunk.get("source_hash"):
-            current_hash = file_hash(source_path)
-            if current_hash != chunk["source_hash"]:
-                errors.append(
-                    f"Source changed since splitting: {chunk['source_file']} "
-                    f"(chunk {chunk['id']}). "
-                    f"Expected hash {chunk['source_hash'][:12]}..., "
-                    f"got {current_hash[:12]}... — "
-                    f"delete output and re-translate, or re-run convert.py to re-split"
-                )
+    chunks = sorted(manifest["chunks"], key=lambda c: c["order"])
+    with ThreadPoolExecutor() as pool:
+        results = pool.map(lambda chunk: _check_chunk(temp_dir, chunk, full_verify), chunks)
+        for chunk, (error, warning, output_path, source_stat) in zip(chunks, results):
+            if source_stat is not None and (
+                chunk.get("source_size") != source_stat.st_size
+                or chunk.get("source_mtime_ns") != source_stat.st_mtime_ns
+            ):
+                _record_stat(chunk, source_stat)
+                restat += 1
+            if error:
+                errors.append(error)
                 continue
+            if warning:
+                warnings.append(warning)
+            ordered_output_files.append(output_path)
 
-        # Check output exists
-        if not os.path.exists(output_path):
-            errors.append(f"Missing output: {chunk['output_file']} (chunk {chunk['id']})")
-            continue
-
-        # Check non-empty
-        output_size = os.path.getsize(output_path)
-        if output_size == 0:
-            errors.append(f"Empty output: {chunk['output_file']} (chunk {chunk['id']})")
-            continue
-
-        # Check abnormally short
-        if os.path.exists(source_path):
-            source_size = os.path.getsize(source_path)
-            if source_size > 0 and output_size < source_size * 0.1:
-                warnings.append(
-                    f"Suspiciously short: {chunk['output_file']} "
-                    f"({output_size} bytes vs source {source_size} bytes)"
-                )
-
-        ordered_output_files.append(output_path)
+    if restat:
+        _save_manifest(temp_dir, manifest)
 
     if errors:
         for e in errors:
@@ -13,16 +13,17 @@ import glob
 import shutil
 import subprocess
 import argparse
+import hashlib
+import html
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
-from manifest import validate_for_merge
-
-# Try to import BeautifulSoup for TOC generation
-try:
-    from bs4 import BeautifulSoup
-    BS4_AVAILABLE = True
-except ImportError:
-    BS4_AVAILABLE = False
+from build_graph import BuildGraph
+from convert import parse_structural_blocks
+from manifest import atomic_write, load_manifest, validate_for_merge, write_merge_index
+from translation_memory import DEFAULT_MEMORY_PATH, TranslationMemory
 
 # Try to import markdown
 try:
@@ -33,6 +34,9 @@ except ImportError:
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
+FORMAT_WORKERS = 3
+FORMAT_TIMEOUT = 600
+
 # =============================================================================
 # Language configuration — single source of truth for lang-dependent values
 # =============================================================================
@@ -129,51 +133,32 @@ def natural_sort_key(text):
 # Step 4: Merge translated markdown files
 # =============================================================================
 
-def merge_markdown_files(temp_dir):
-    """Merge all translated output files into output.md"""
+def merge_markdown_files(temp_dir, full_verify=False, graph=None):
+    """Merge all translated output files into output.md
+
+    full_verify re-hashes every source chunk instead of only those whose
+    size or mtime changed since the manifest last recorded them. The merge
+    is skipped when graph (a BuildGraph) shows the output chunks and
+    output.md are unchanged since it last ran.
+    """
     print("=== Merging translated markdown files ===")
 
     output_md = os.path.join(temp_dir, 'output.md')
+    graph = graph or BuildGraph(temp_dir)
 
     # Always validate manifest, even if output.md exists (catch stale/corrupt outputs)
-    ok, ordered_files, warnings = validate_for_merge(temp_dir)
+    ok, ordered_files, warnings = validate_for_merge(temp_dir, full_verify)
 
-    if os.path.exists(output_md):
-        if not ok:
+    if not ok:
+        if os.path.exists(output_md):
             print(f"WARNING: output.md exists but manifest validation failed — deleting stale output.md")
             os.remove(output_md)
-        else:
-            # Check if any output_chunk is newer than output.md (re-translated chunks)
-            output_md_mtime = os.path.getmtime(output_md)
-            newer_chunks = []
-            if ordered_files:
-                newer_chunks = [
-                    os.path.basename(f) for f in ordered_files
-                    if os.path.getmtime(f) > output_md_mtime
-                ]
-            if newer_chunks:
-                print(f"Re-merging — {len(newer_chunks)} chunk(s) newer than output.md: {', '.join(newer_chunks[:5])}{'...' if len(newer_chunks) > 5 else ''}")
-                os.remove(output_md)
-            else:
-                print(f"Skipping merge - output.md already exists and is up to date")
-                return True
-
-    if not ok:
         print("ERROR: Merge validation failed. Fix the issues above before merging.")
         return False
 
     if ordered_files is not None:
         # Manifest-based merge
-        print(f"Merging {len(ordered_files)} translated files (manifest-ordered)")
-        merged_content = ""
-        for file_path in ordered_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                if content:
-                    merged_content += content + "\n\n"
-            except Exception as e:
-                print(f"Error reading {os.path.basename(file_path)}: {e}")
+        mode = "manifest-ordered"
     else:
         # Legacy fallback: glob-based merge (no manifest)
         print("WARNING: No manifest.json found — using legacy glob-based merge.")
@@ -219,29 +204,92 @@ def merge_markdown_files(temp_dir):
             os.path.join(temp_dir, f"output_{name}")
             for name in source_basenames
         ]
-        print(f"Merging {len(output_files)} translated files (legacy glob)")
-
-        merged_content = ""
-        for file_path in output_files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read().strip()
-                if content:
-                    merged_content += content + "\n\n"
-            except Exception as e:
-                print(f"Error reading {os.path.basename(file_path)}: {e}")
+        mode = "legacy glob"
+        ordered_files = output_files
+
+    inputs = graph.inputs(ordered_files)
+    reason = graph.check('merge', inputs, [output_md])
+    if reason is None:
+        print(f"Skipping merge - output.md is up to date")
+        return True
+    if os.path.exists(output_md):
+        print(f"Re-merging - {reason}")
+
+    print(f"Merging {len(ordered_files)} translated files ({mode})")
+    if not stream_merge(temp_dir, ordered_files):
+        return False
+    graph.record('merge', inputs, [output_md])
+    return True
+
 
+def stream_merge(temp_dir, ordered_files):
+    """Write each chunk, stripped and followed by a blank line, into output.md.
+
+    Chunks go one at a time into a temp file that replaces output.md only
+    once complete, so memory stays at one chunk and an interrupted merge
+    leaves no partial output.md. The result's hash and each chunk's byte
+    offset, length and hash are recorded in merge_index.json.
+    """
+    output_md = os.path.join(temp_dir, 'output.md')
+    digest = hashlib.sha256()
+    index = []
+    offset = 0
     try:
-        with open(output_md, 'w', encoding='utf-8') as f:
-            f.write(merged_content)
-        file_size = os.path.getsize(output_md)
-        print(f"Merged into output.md ({file_size:,} bytes)")
+        with atomic_write(output_md, 'wb') as out:
+            for file_path in ordered_files:
+                try:
+                    with open(file_path, 'r', encoding='utf-8') as f:
+                        content = f.read().strip()
+                except Exception as e:
+                    print(f"Error reading {os.path.basename(file_path)}: {e}")
+                    continue
+                data = content.encode('utf-8')
+                index.append({
+                    "output_file": os.path.basename(file_path),
+                    "offset": offset,
+                    "length": len(data),
+                    "hash": hashlib.sha256(data).hexdigest(),
+                })
+                if data:
+                    data += b"\n\n"
+                    out.write(data)
+                    digest.update(data)
+                    offset += len(data)
+        write_merge_index(temp_dir, digest.hexdigest(), offset, index)
+        print(f"Merged into output.md ({offset:,} bytes)")
         return True
     except Exception as e:
         print(f"Error saving merged file: {e}")
         return False
 
 
+def remember_translations(temp_dir, memory_path, source_lang, target_lang):
+    """Record every merged chunk (and its blocks, where they align) in the
+    translation memory, so later splits can pre-fill repeats."""
+    manifest = load_manifest(temp_dir)
+    if manifest is None:
+        return
+    chunks = blocks = 0
+    try:
+        with TranslationMemory(memory_path, source_lang, target_lang) as memory:
+            for chunk in manifest["chunks"]:
+                source_path = os.path.join(temp_dir, chunk["source_file"])
+                output_path = os.path.join(temp_dir, chunk["output_file"])
+                if not (os.path.exists(source_path) and os.path.exists(output_path)):
+                    continue
+                with open(source_path, 'r', encoding='utf-8') as f:
+                    source_text = f.read()
+                with open(output_path, 'r', encoding='utf-8') as f:
+                    output_text = f.read()
+                blocks += memory.learn_chunk(source_text, parse_structural_blocks(source_text),
+                                             output_text, parse_structural_blocks(output_text))
+                chunks += 1
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: could not update translation memory: {e}")
+        return
+    print(f"Translation memory: recorded {chunks} chunks and {blocks} aligned blocks ({memory_path})")
+
+
 # =============================================================================
 # Step 5: Convert markdown to HTML
 # =============================================================================
@@ -452,6 +500,34 @@ def process_html_separators(html_file):
         print(f"Error processing separators: {e}")
 
 
+def build_html(temp_dir, title, lang_cfg, author=None, graph=None):
+    """Steps 5-6: render output.md into book_doc.html and book.html (with TOC).
+
+    Skipped when graph (a BuildGraph) shows output.md, the templates and the
+    title, language and author are unchanged and both HTML files are as
+    they were built.
+    """
+    md_file = os.path.join(temp_dir, 'output.md')
+    outputs = [os.path.join(temp_dir, 'book_doc.html'), os.path.join(temp_dir, 'book.html')]
+    graph = graph or BuildGraph(temp_dir)
+    inputs = graph.inputs(
+        [md_file, os.path.join(SCRIPT_DIR, 'template_ebook.html'), os.path.join(SCRIPT_DIR, 'template.html')],
+        title=title, lang=lang_cfg['lang_attr'], author=author,
+    )
+    reason = graph.check('html', inputs, outputs)
+    if reason is None:
+        print("Skipping HTML generation - book_doc.html and book.html are up to date")
+        return True
+    if os.path.exists(outputs[0]):
+        print(f"Re-generating HTML - {reason}")
+
+    if not convert_md_to_html(temp_dir, title, lang_cfg, author):
+        return False
+    add_toc(temp_dir)
+    graph.record('html', inputs, outputs)
+    return True
+
+
 def convert_md_to_html(temp_dir, title, lang_cfg, author=None):
     """Convert output.md to HTML with templates"""
     print("=== Converting markdown to HTML ===")
@@ -461,16 +537,6 @@ def convert_md_to_html(temp_dir, title, lang_cfg, author=None):
         print("Error: output.md not found.")
         return False
 
-    book_doc_file = os.path.join(temp_dir, 'book_doc.html')
-
-    # Skip HTML generation if book_doc.html exists and is newer than output.md
-    if os.path.exists(book_doc_file):
-        if os.path.getmtime(book_doc_file) > os.path.getmtime(md_file):
-            print("Skipping HTML generation - book_doc.html is up to date")
-            return True
-        else:
-            print("Re-generating HTML - output.md is newer")
-
     temp_html_file = os.path.join(temp_dir, 'output.html')
 
     # Try pandoc -> python-markdown -> basic regex
@@ -519,8 +585,13 @@ def convert_md_to_html(temp_dir, title, lang_cfg, author=None):
 # Step 6: Add TOC
 # =============================================================================
 
-def generate_heading_id(text, existing_ids):
-    """Generate unique ID for heading"""
+def generate_heading_id(text, existing_ids, next_suffix=None):
+    """Generate unique ID for heading
+
+    existing_ids is a set of the IDs handed out so far. next_suffix, a dict
+    shared across calls, remembers where each base ID's "-N" search got to,
+    so repeated headings ("Chapter 1" x 1000) do not rescan every suffix.
+    """
     base_id = re.sub(r'[^\w\s-]', '', text.lower())
     base_id = re.sub(r'[-\s]+', '-', base_id)
     base_id = base_id.strip('-')
@@ -529,10 +600,15 @@ def generate_heading_id(text, existing_ids):
         base_id = 'heading'
 
     heading_id = base_id
-    counter = 1
-    while heading_id in existing_ids:
+    counter = next_suffix.get(base_id, 1) if next_suffix is not None else 1
+    if heading_id in existing_ids:
         heading_id = f"{base_id}-{counter}"
+        while heading_id in existing_ids:
+            counter += 1
+            heading_id = f"{base_id}-{counter}"
         counter += 1
+    if next_suffix is not None:
+        next_suffix[base_id] = counter
 
     return heading_id
 
@@ -542,35 +618,138 @@ def generate_simple_toc_html(toc_data):
     if not toc_data:
         return ""
 
-    toc_html = '<ul>\n'
+    parts = ['<ul>\n']
     current_level = 1
 
     for item in toc_data:
         level = item['level']
-        text = item['text']
+        text = html.escape(item['text'], quote=False)
         heading_id = item['id']
 
         if level > current_level:
             while current_level < level:
-                toc_html += '<li><ul>\n'
+                parts.append('<li><ul>\n')
                 current_level += 1
         elif level < current_level:
             while current_level > level:
-                toc_html += '</ul></li>\n'
+                parts.append('</ul></li>\n')
                 current_level -= 1
 
-        toc_html += f'<li><a href="#{heading_id}">{text}</a></li>\n'
+        parts.append(f'<li><a href="#{heading_id}">{text}</a></li>\n')
 
     while current_level > 1:
-        toc_html += '</ul></li>\n'
+        parts.append('</ul></li>\n')
         current_level -= 1
 
-    toc_html += '</ul>\n'
-    return toc_html
-
-
-def insert_toc_with_bs4(html_file):
-    """Insert TOC using BeautifulSoup"""
+    parts.append('</ul>\n')
+    return ''.join(parts)
+
+
+# Attribute text of a start tag; quoted values may contain '>'
+_ATTRS = r'''[^'">]*(?:(?:"[^"]*"|'[^']*')[^'">]*)*'''
+# Comments and script/style bodies: any tags inside them are not markup
+_SKIP = r'<!--.*?(?:-->|\Z)|<(?P<raw>script|style)\b' + _ATTRS + r'>.*?(?:</(?P=raw)\s*>|\Z)'
+# Any other tag, matched whole so that a tag in an attribute value is not seen
+_OTHER_TAG = r'</?[a-zA-Z]' + _ATTRS + r'>'
+_HEADING_START_RE = re.compile(
+    _SKIP + r'|<(?P<tag>h[1-6])(?P<attrs>\s' + _ATTRS + r')?>|' + _OTHER_TAG, re.IGNORECASE | re.DOTALL)
+_HEADING_END_RE = re.compile(_SKIP + r'|</(?P<tag>h[1-6])\s*>|' + _OTHER_TAG, re.IGNORECASE | re.DOTALL)
+_DIV_RE = re.compile(
+    _SKIP + r'|<(?P<close>/)?div\b(?P<attrs>' + _ATTRS + r')>|' + _OTHER_TAG, re.IGNORECASE | re.DOTALL)
+_ATTR_RE = re.compile(r'''(?P<name>[^\s/>][^\s/=>]*)(?:\s*=\s*(?P<value>'[^']*'|"[^"]*"|(?!['"])[^>\s]*))?''')
+_TAG_RE = re.compile(r'<(?:!--.*?(?:-->|\Z)|/?[a-zA-Z]' + _ATTRS + r'>|[!?][^>]*>)', re.DOTALL)
+_ASCII_SPACES = ' \t\n\r\f'
+
+
+def _heading_text(inner_html):
+    """A heading's text as an HTML parser's get_text() returns it: tags and
+    comments dropped, entities decoded, and whitespace-only runs between
+    them collapsed to one space (or newline), then stripped."""
+    pieces = []
+    for piece in _TAG_RE.split(inner_html):
+        piece = html.unescape(piece)
+        if piece and not piece.strip(_ASCII_SPACES):
+            piece = '\n' if '\n' in piece else ' '
+        pieces.append(piece)
+    return ''.join(pieces).strip()
+
+
+def _attr_value(match):
+    value = match.group('value') or ''
+    if value[:1] in ('"', "'"):
+        value = value[1:-1]
+    return html.unescape(value)
+
+
+def _with_id(attrs, heading_id):
+    """attrs (a start tag's attribute text) with id set to heading_id."""
+    ids = [m for m in _ATTR_RE.finditer(attrs) if m.group('name').lower() == 'id']
+    if not ids:
+        return f'{attrs.rstrip()} id="{heading_id}"'
+    # A parser keeps one of repeated ids; keep just the one being set
+    parts = [attrs[:ids[0].start()], f'id="{heading_id}"']
+    pos = ids[0].end()
+    for m in ids[1:]:
+        parts.append(attrs[pos:m.start()])
+        pos = m.end()
+    parts.append(attrs[pos:])
+    return ''.join(parts)
+
+
+def _find_toc_div(html_content):
+    """(start, end) of the first .toc-content div's contents, or None."""
+    depth = 0
+    opened = None
+    for match in _DIV_RE.finditer(html_content):
+        if match.group('raw') is not None or match.group('attrs') is None:
+            continue  # comment, script, style or another tag
+        if opened is None:
+            if not match.group('close') and any(
+                m.group('name').lower() == 'class' and 'toc-content' in _attr_value(m).split()
+                for m in _ATTR_RE.finditer(match.group('attrs'))
+            ):
+                opened = match.end()
+                depth = 1
+            continue
+        depth += -1 if match.group('close') else 1
+        if depth == 0:
+            return opened, match.start()
+    return None if opened is None else (opened, len(html_content))
+
+
+def _headings(html_content):
+    """(start tag, end tag) matches of each heading outside comments,
+    scripts and styles, in document order."""
+    pos = 0
+    while True:
+        start = _HEADING_START_RE.search(html_content, pos)
+        if start is None:
+            return
+        pos = start.end()
+        tag = start.group('tag')
+        if tag is None:
+            continue  # comment, script, style or another tag
+        scan = start.end()
+        while True:
+            end = _HEADING_END_RE.search(html_content, scan)
+            if end is None or (end.group('tag') or '').lower() == tag.lower():
+                break
+            scan = end.end()
+        if end is not None:
+            # Scanning goes on inside the heading: a parser finds headings
+            # nested in it too
+            yield start, end
+
+
+def insert_toc(html_file):
+    """Give every heading an ID and fill .toc-content with a nested TOC.
+
+    One regex pass finds the headings (in document order, skipping comments,
+    scripts and styles, their text as _heading_text() reads it); IDs are
+    unique via a set; the edited start tags and the TOC are spliced
+    into the original text in a single join. Everything else in the file is
+    left byte for byte as it was.
+    """
     try:
         with open(html_file, 'r', encoding='utf-8') as f:
             html_content = f.read()
@@ -578,96 +757,49 @@ def insert_toc_with_bs4(html_file):
         print(f"Error reading HTML file: {e}")
         return False
 
-    soup = BeautifulSoup(html_content, 'html.parser')
-
     toc_data = []
-    existing_ids = []
+    existing_ids = set()
+    next_suffix = {}
+    edits = []  # (start, end, replacement), in document order
 
-    for heading in soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']):
-        level = int(heading.name[1])
-        text = heading.get_text().strip()
+    for start, end in _headings(html_content):
+        text = _heading_text(html_content[start.end():end.start()])
         if not text:
             continue
 
-        heading_id = generate_heading_id(text, existing_ids)
-        existing_ids.append(heading_id)
-        heading['id'] = heading_id
-        toc_data.append({'level': level, 'text': text, 'id': heading_id})
+        heading_id = generate_heading_id(text, existing_ids, next_suffix)
+        existing_ids.add(heading_id)
+        tag = start.group('tag')
+        toc_data.append({'level': int(tag[1]), 'text': text, 'id': heading_id})
+        edits.append((start.start(), start.end(), f'<{tag}{_with_id(start.group("attrs") or "", heading_id)}>'))
 
     if not toc_data:
         print("No headings found for TOC")
         return False
 
-    toc_html = generate_simple_toc_html(toc_data)
-
-    toc_content_div = soup.find('div', class_='toc-content')
-    if toc_content_div:
-        toc_content_div.clear()
-        toc_soup = BeautifulSoup(toc_html, 'html.parser')
-        toc_content_div.append(toc_soup)
-        print(f"TOC inserted ({len(toc_data)} headings)")
-    else:
+    toc_div = _find_toc_div(html_content)
+    if toc_div is None:
         print("Warning: .toc-content div not found, TOC not inserted")
         return False
 
-    try:
-        with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(str(soup))
-        return True
-    except Exception as e:
-        print(f"Error saving HTML file: {e}")
-        return False
-
-
-def insert_toc_with_regex(html_file):
-    """Insert TOC using regex (fallback)"""
-    try:
-        with open(html_file, 'r', encoding='utf-8') as f:
-            html_content = f.read()
-    except Exception as e:
-        print(f"Error reading HTML file: {e}")
-        return False
-
-    heading_pattern = r'<(h[1-6])(?:[^>]*)>(.*?)</\1>'
-    headings = re.findall(heading_pattern, html_content, re.IGNORECASE | re.DOTALL)
-
-    if not headings:
-        print("No headings found for TOC")
-        return False
-
-    toc_html = '<ul>\n'
-    for i, (tag, text) in enumerate(headings):
-        level = int(tag[1])
-        clean_text = re.sub(r'<[^>]+>', '', text).strip()
-        heading_id = f"heading-{i+1}"
-
-        old_heading = f'<{tag}>{text}</{tag}>'
-        new_heading = f'<{tag} id="{heading_id}">{text}</{tag}>'
-        html_content = html_content.replace(old_heading, new_heading, 1)
-
-        if level > 1:
-            for _ in range(level - 1):
-                toc_html += '  '
-        toc_html += f'<li><a href="#{heading_id}">{clean_text}</a></li>\n'
-
-    toc_html += '</ul>\n'
-
-    toc_content_pattern = r'(<div[^>]*class="toc-content[^"]*"[^>]*>).*?(</div>)'
-    if re.search(toc_content_pattern, html_content, re.DOTALL):
-        html_content = re.sub(
-            toc_content_pattern,
-            r'\1' + toc_html + r'\2',
-            html_content,
-            flags=re.DOTALL
-        )
-        print(f"TOC inserted ({len(headings)} headings)")
-    else:
-        print("Warning: .toc-content div not found")
-        return False
+    # Headings inside the div are listed in the TOC but replaced along with
+    # the rest of its contents, so their id edits are dropped
+    edits = [edit for edit in edits if not toc_div[0] <= edit[0] < toc_div[1]]
+    edits.append((toc_div[0], toc_div[1], generate_simple_toc_html(toc_data)))
+    edits.sort(key=lambda edit: edit[0])
+
+    parts = []
+    pos = 0
+    for start, end, replacement in edits:
+        parts.append(html_content[pos:start])
+        parts.append(replacement)
+        pos = end
+    parts.append(html_content[pos:])
+    print(f"TOC inserted ({len(toc_data)} headings)")
 
     try:
         with open(html_file, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+            f.write(''.join(parts))
         return True
     except Exception as e:
         print(f"Error saving HTML file: {e}")
@@ -683,79 +815,93 @@ def add_toc(temp_dir):
         print("Warning: book.html not found, skipping TOC")
         return False
 
-    if BS4_AVAILABLE:
-        return insert_toc_with_bs4(book_file)
-    else:
-        return insert_toc_with_regex(book_file)
+    return insert_toc(book_file)
 
 
 # =============================================================================
 # Step 7: Generate DOCX/EPUB/PDF with error transparency
 # =============================================================================
 
-def generate_format(html_file, temp_dir, output_ext, lang_attr):
-    """Generate a specific format using calibre_html_publish.py"""
+def generate_format(html_file, temp_dir, output_ext, lang_attr, timeout=FORMAT_TIMEOUT, log=print, graph=None,
+                    image_max_dim=None, optimize_images=True, use_cache=True):
+    """Generate a specific format using calibre_html_publish.py
+
+    Progress goes to log (print by default) so concurrent callers can keep
+    each format's messages together. Skipped when graph (a BuildGraph)
+    shows the HTML, its images (Calibre embeds these) and the language are
+    unchanged and the output is as it was built. Otherwise the publisher
+    still reuses an identical earlier conversion from its cache unless
+    use_cache is False.
+    """
     output_file = os.path.join(temp_dir, f"book{output_ext}")
 
+    images_dir = os.path.join(temp_dir, 'images')
+    images = []
+    if os.path.isdir(images_dir):
+        images = sorted(
+            os.path.join(images_dir, img) for img in os.listdir(images_dir)
+            if os.path.isfile(os.path.join(images_dir, img))
+        )
+    graph = graph or BuildGraph(temp_dir)
+    inputs = graph.inputs([html_file] + images, lang=lang_attr,
+                          image_max_dim=image_max_dim if optimize_images else "off")
+    step = f"format{output_ext}"
+    reason = graph.check(step, inputs, [output_file], log)
+    if reason is None:
+        file_size = os.path.getsize(output_file)
+        log(f"Skipping {output_ext} - already exists and up to date ({file_size:,} bytes)")
+        return output_file
     if os.path.exists(output_file):
-        output_mtime = os.path.getmtime(output_file)
-
-        # Check if source HTML is newer
-        html_newer = os.path.getmtime(html_file) > output_mtime
-
-        # Check if any image asset is newer (Calibre embeds these)
-        images_newer = False
-        images_dir = os.path.join(temp_dir, 'images')
-        if os.path.isdir(images_dir):
-            for img in os.listdir(images_dir):
-                img_path = os.path.join(images_dir, img)
-                if os.path.isfile(img_path) and os.path.getmtime(img_path) > output_mtime:
-                    images_newer = True
-                    break
-
-        if not html_newer and not images_newer:
-            file_size = os.path.getsize(output_file)
-            print(f"Skipping {output_ext} - already exists and up to date ({file_size:,} bytes)")
-            return output_file
-        else:
-            reasons = []
-            if html_newer:
-                reasons.append("source HTML changed")
-            if images_newer:
-                reasons.append("image assets changed")
-            print(f"Rebuilding {output_ext} - {', '.join(reasons)}")
+        log(f"Rebuilding {output_ext} - {reason}")
 
     publish_script = os.path.join(SCRIPT_DIR, "calibre_html_publish.py")
     if not os.path.exists(publish_script):
-        print(f"calibre_html_publish.py not found at: {publish_script}")
+        log(f"calibre_html_publish.py not found at: {publish_script}")
         return None
 
     try:
-        cmd = ["python3", publish_script, html_file, "-o", output_file, "--lang", lang_attr]
+        cmd = ["python3", publish_script, html_file, "-o", output_file, "--lang", lang_attr,
+               "--timeout", str(timeout)]
+        if not optimize_images:
+            cmd.append("--no-image-optimize")
+        elif image_max_dim is not None:
+            cmd.extend(["--image-max-dim", str(image_max_dim)])
+        if not use_cache:
+            cmd.append("--no-cache")
         result = subprocess.run(cmd, check=True, capture_output=True, text=True)
+        for line in result.stdout.splitlines():
+            if line.startswith(("Image optimization:", "Conversion cache:", "Conversion time:")):
+                log(line)
 
         if os.path.exists(output_file):
-            file_size = os.path.getsize(output_file)
+            graph.record(step, inputs, [output_file])
             return output_file
         else:
-            print(f"Failed to generate {output_ext}")
+            log(f"Failed to generate {output_ext}")
             if result.stdout:
-                print(f"  stdout: {result.stdout[-500:]}")
+                log(f"  stdout: {result.stdout[-500:]}")
             return None
     except subprocess.CalledProcessError as e:
-        print(f"Failed to generate {output_ext}")
+        log(f"Failed to generate {output_ext}")
         if e.stdout:
-            print(f"  stdout: {e.stdout[-500:]}")
+            log(f"  stdout: {e.stdout[-500:]}")
         if e.stderr:
-            print(f"  stderr: {e.stderr[-500:]}")
+            log(f"  stderr: {e.stderr[-500:]}")
         return None
     except Exception as e:
-        print(f"Error generating {output_ext}: {e}")
+        log(f"Error generating {output_ext}: {e}")
         return None
 
 
-def generate_formats(temp_dir, lang_attr):
-    """Generate DOCX, EPUB, and PDF with result summary"""
+def generate_formats(temp_dir, lang_attr, workers=FORMAT_WORKERS, timeout=FORMAT_TIMEOUT, graph=None,
+                     image_max_dim=None, optimize_images=True, use_cache=True):
+    """Generate DOCX, EPUB, and PDF with result summary
+
+    Up to workers conversions run at once, each limited to timeout seconds.
+    Images are deduplicated and downsized per format first (image_max_dim
+    pixels, else each format's default) unless optimize_images is False.
+    use_cache=False makes every conversion run Calibre.
+    """
     print("=== Generating output formats ===")
 
     html_file = os.path.join(temp_dir, "book_doc.html")
@@ -767,14 +913,32 @@ def generate_formats(temp_dir, lang_attr):
             print("No HTML files found for format generation")
             return
 
+    graph = graph or BuildGraph(temp_dir)
+    # The conversions are independent, so they run side by side (each
+    # Calibre process enforces its own timeout); a format's messages are
+    # printed together once it finishes
+    def build(ext):
+        lines = []
+        started = time.monotonic()
+        result = generate_format(html_file, temp_dir, ext, lang_attr, timeout, lines.append, graph,
+                                 image_max_dim, optimize_images, use_cache)
+        return result, lines, time.monotonic() - started
+
+    exts = ['.docx', '.epub', '.pdf']
     results = {}
-    for ext in ['.docx', '.epub', '.pdf']:
-        result = generate_format(html_file, temp_dir, ext, lang_attr)
-        if result:
-            file_size = os.path.getsize(result)
-            results[ext] = ('OK', f"{file_size:,} bytes")
-        else:
-            results[ext] = ('FAILED', '')
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(build, ext): ext for ext in exts}
+        for future in as_completed(futures):
+            ext = futures[future]
+            result, lines, seconds = future.result()
+            for line in lines:
+                print(f"[{ext}] {line}")
+            if result:
+                file_size = os.path.getsize(result)
+                results[ext] = ('OK', f"{file_size:,} bytes, {seconds:.1f}s")
+            else:
+                results[ext] = ('FAILED', '')
+    results = {ext: results[ext] for ext in exts}
 
     # Print summary table
     print("\nFormat results:")
@@ -800,6 +964,24 @@ def main():
     parser.add_argument('--author', default=None, help='Author name (override config)')
     parser.add_argument('--lang', default=None, help='Output language code (override config)')
     parser.add_argument('--cleanup', action='store_true', help='Remove intermediate artifacts after successful build')
+    parser.add_argument('--format-workers', type=int, default=FORMAT_WORKERS,
+                        help=f'DOCX/EPUB/PDF conversions to run at once (default: {FORMAT_WORKERS})')
+    parser.add_argument('--format-timeout', type=int, default=FORMAT_TIMEOUT,
+                        help=f'Seconds each conversion may take (default: {FORMAT_TIMEOUT})')
+    parser.add_argument('--image-max-dim', type=int, default=None,
+                        help='Downsize images to this many pixels on the long side in every format, '
+                             '0 to keep sizes (default: 1600 for DOCX/EPUB, 2000 for PDF)')
+    parser.add_argument('--no-image-optimize', action='store_true',
+                        help='Give Calibre the images as they are (no deduplication or resizing)')
+    parser.add_argument('--no-conversion-cache', action='store_true',
+                        help='Run Calibre even when an identical conversion is cached')
+    parser.add_argument('--explain', action='store_true',
+                        help='Show why each build step ran or was skipped')
+    parser.add_argument('--full-verify', action='store_true',
+                        help='Re-hash every source chunk, not just those whose size or mtime changed')
+    parser.add_argument('--memory', default=DEFAULT_MEMORY_PATH,
+                        help=f'Translation memory to record merged chunks in (default: {DEFAULT_MEMORY_PATH})')
+    parser.add_argument('--no-memory', action='store_true', help='Do not record this book in the translation memory')
 
     args = parser.parse_args()
     temp_dir = args.temp_dir
@@ -823,19 +1005,21 @@ def main():
     print(f"Author: {author}")
     print(f"Language: {lang_code} (attr: {lang_cfg['lang_attr']})")
 
+    graph = BuildGraph(temp_dir, explain=args.explain)
+
     # Step 4: Merge
-    if not merge_markdown_files(temp_dir):
+    if not merge_markdown_files(temp_dir, args.full_verify, graph):
         sys.exit(1)
+    if not args.no_memory:
+        remember_translations(temp_dir, args.memory, config.get('input_lang', 'auto'), lang_code)
 
-    # Step 5: Convert to HTML
-    if not convert_md_to_html(temp_dir, title, lang_cfg, author):
+    # Steps 5-6: Convert to HTML and add TOC
+    if not build_html(temp_dir, title, lang_cfg, author, graph):
         sys.exit(1)
 
-    # Step 6: Add TOC
-    add_toc(temp_dir)
-
     # Step 7: Generate formats
-    all_formats_ok = generate_formats(temp_dir, lang_cfg['lang_attr'])
+    all_formats_ok = generate_formats(temp_dir, lang_cfg['lang_attr'], args.format_workers, args.format_timeout, graph,
+                                      args.image_max_dim, not args.no_image_optimize, not args.no_conversion_cache)
 
     print("\n=== Build Complete ===")
     print(f"All outputs saved to: {temp_dir}")
@@ -868,7 +1052,8 @@ def cleanup_intermediate_files(temp_dir):
             removed.append(os.path.basename(filepath))
 
     # Remove specific intermediate files
-    for name in ['input.html', 'input.md', 'output.html']:
+    for name in ['input.html', 'input.md', 'output.html', 'merge_index.json', 'build_state.json',
+                 'translate_state.json']:
         filepath = os.path.join(temp_dir, name)
         if os.path.exists(filepath):
             os.remove(filepath)
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+translate_chunks.py - Translate a temp directory's pending chunks unattended.
+
+Reads manifest.json, queues every chunk whose output_chunkNNNN.md is missing
+or empty, and runs them through a translation backend on a pool of asyncio
+workers. Requests (and, optionally, estimated tokens) are rate-limited with
+token buckets; a failed attempt is retried with exponential backoff and
+jitter. Each translation is written atomically, and per-chunk status plus
+run metrics go to translate_state.json, so an interrupted run resumes where
+it stopped simply by being started again.
+
+Backends:
+  echo               returns each chunk unchanged (with --echo-delay and
+                     --echo-fail-rate), to benchmark the pipeline offline
+  command            pipes each chunk to --command's stdin and takes its
+                     stdout as the translation; TRANSLATE_TARGET_LANG and
+                     TRANSLATE_CHUNK_ID are set in its environment
+  package.module:Class
+                     any Backend subclass, built as Class(target_lang)
+
+Usage: translate_chunks.py --temp-dir <path> --backend <backend> [--command <cmd>]
+       [--concurrency N] [--rpm N] [--tpm N] [--retries N]
+"""
+
+import abc
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import signal
+import statistics
+import sys
+import time
+
+from convert import estimate_tokens
+from manifest import atomic_write, load_manifest, save_json
+
+STATE_FILE = "translate_state.json"
+DEFAULT_CONCURRENCY = 8
+
+
+# =============================================================================
+# Backends
+# =============================================================================
+
+class Backend(abc.ABC):
+    """Translates one chunk at a time; raise to fail the attempt."""
+
+    def __init__(self, target_lang):
+        self.target_lang = target_lang
+
+    @abc.abstractmethod
+    async def translate(self, text, chunk_id):
+        """The translation of text, the source of chunk chunk_id."""
+
+    async def close(self):
+        pass
+
+
+class EchoBackend(Backend):
+    """Returns the source text after delay seconds; fails a fail_rate share
+    of attempts at random, to exercise retries."""
+
+    def __init__(self, target_lang, delay=0.0, fail_rate=0.0, seed=None):
+        super().__init__(target_lang)
+        self.delay = delay
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+
+    async def translate(self, text, chunk_id):
+        await asyncio.sleep(self.delay)
+        if self._random.random() < self.fail_rate:
+            raise RuntimeError("simulated failure")
+        return text
+
+
+class CommandBackend(Backend):
+    """Runs a shell command per chunk: source on stdin, translation on stdout."""
+
+    def __init__(self, target_lang, command, timeout=600):
+        super().__init__(target_lang)
+        self.command = command
+        self.timeout = timeout
+
+    async def translate(self, text, chunk_id):
+        env = dict(os.environ, TRANSLATE_TARGET_LANG=self.target_lang, TRANSLATE_CHUNK_ID=chunk_id)
+        proc = await asyncio.create_subprocess_shell(
+            self.command, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE, env=env, start_new_session=True,
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(text.encode('utf-8')), self.timeout)
+        except asyncio.TimeoutError:
+            os.killpg(proc.pid, signal.SIGKILL)
+            await proc.wait()
+            raise RuntimeError(f"timed out after {self.timeout}s")
+        except BaseException:
+            # The shell runs in its own session; take down whatever it started
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await proc.wait()
+            raise
+        if proc.returncode != 0:
+            raise RuntimeError(f"exit status {proc.returncode}: {stderr.decode('utf-8', 'replace')[-300:].strip()}")
+        return stdout.decode('utf-8')
+
+
+BACKENDS = {"echo": EchoBackend, "command": CommandBackend}
+
+
+def load_backend(spec, target_lang, **options):
+    """Backend named spec (see BACKENDS) or imported from "module:Class"."""
+    if spec in BACKENDS:
+        return BACKENDS[spec](target_lang, **options)
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"unknown backend {spec!r}: use {', '.join(BACKENDS)} or module:Class")
+    return getattr(importlib.import_module(module_name), class_name)(target_lang)
+
+
+# =============================================================================
+# Scheduling
+# =============================================================================
+
+class TokenBucket:
+    """Hands out rate units per second on average, in bursts of up to capacity."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        # More than capacity could never be granted; take a full bucket instead
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+def write_output(path, text):
+    """Write text to path atomically, so a killed run never leaves half a
+    translation that would pass for a finished one."""
+    with atomic_write(path) as f:
+        f.write(text)
+
+
+def pending_chunks(temp_dir, manifest):
+    """Manifest chunks, in order, whose output is missing or empty."""
+    pending = []
+    for chunk in sorted(manifest["chunks"], key=lambda c: c["order"]):
+        output_path = os.path.join(temp_dir, chunk["output_file"])
+        if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+            pending.append(chunk)
+    return pending
+
+
+def load_state(temp_dir):
+    """translate_state.json of temp_dir, or a fresh state."""
+    try:
+        with open(os.path.join(temp_dir, STATE_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"chunks": {}}
+
+
+class Scheduler:
+    """Translates chunks of temp_dir with backend on concurrency workers.
+
+    retries is the number of extra attempts per chunk; the n-th retry waits
+    backoff * 2**(n-1) seconds, stretched by up to 100% random jitter.
+    """
+
+    def __init__(self, temp_dir, backend, concurrency=DEFAULT_CONCURRENCY, retries=1, backoff=2.0,
+                 requests=None, tokens=None):
+        self.temp_dir = temp_dir
+        self.backend = backend
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = requests
+        self.tokens = tokens
+        self.state = load_state(temp_dir)
+        self.latencies = []
+        self.retried = 0
+        self.chars = 0
+
+    def _status(self, chunk_id, **fields):
+        self.state["chunks"].setdefault(chunk_id, {"attempts": 0}).update(fields)
+        save_json(self.temp_dir, STATE_FILE, self.state)
+
+    async def run(self, chunks):
+        """Translate chunks; returns (translated ids, failed ids)."""
+        queue = asyncio.Queue()
+        for chunk in chunks:
+            queue.put_nowait(chunk)
+        done, failed = [], []
+        workers = [asyncio.create_task(self._worker(queue, done, failed))
+                   for _ in range(min(self.concurrency, len(chunks)))]
+        try:
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.backend.close()
+        return done, failed
+
+    async def _worker(self, queue, done, failed):
+        while True:
+            chunk = await queue.get()
+            try:
+                try:
+                    translated = await self._translate(chunk)
+                except Exception as e:
+                    # A chunk that cannot be attempted at all (unreadable
+                    # source, unwritable output) fails alone; the worker
+                    # moves on, so queue.join() still returns
+                    error = str(e) or type(e).__name__
+                    print(f"  {chunk['id']}: failed — {error}")
+                    try:
+                        self._status(chunk["id"], status="failed", error=error)
+                    except OSError:
+                        pass
+                    translated = False
+                (done if translated else failed).append(chunk["id"])
+            finally:
+                queue.task_done()
+
+    async def _translate(self, chunk):
+        with open(os.path.join(self.temp_dir, chunk["source_file"]), 'r', encoding='utf-8') as f:
+            source = f.read()
+        cost = estimate_tokens(source)
+        attempts = self.state["chunks"].get(chunk["id"], {}).get("attempts", 0)
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1) * (1 + random.random()))
+            if self.requests:
+                await self.requests.acquire()
+            if self.tokens:
+                await self.tokens.acquire(cost)
+
+            attempts += 1
+            self._status(chunk["id"], status="running", attempts=attempts)
+            started = time.monotonic()
+            try:
+                translation = await self.backend.translate(source, chunk["id"])
+                if not translation.strip():
+                    raise RuntimeError("empty translation")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                print(f"  {chunk['id']}: attempt {attempt + 1} failed — {error}")
+                self._status(chunk["id"], status="failed", error=error)
+                continue
+
+            seconds = time.monotonic() - started
+            write_output(os.path.join(self.temp_dir, chunk["output_file"]), translation)
+            self.latencies.append(seconds)
+            self.chars += len(source)
+            self._status(chunk["id"], status="done", error=None, seconds=round(seconds, 3))
+            return True
+        return False
+
+    def metrics(self, wall_seconds, done, failed):
+        latencies = sorted(self.latencies)
+        quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else latencies * 19
+        return {
+            "translated": len(done),
+            "failed": len(failed),
+            "retries": self.retried,
+            "wall_seconds": round(wall_seconds, 3),
+            "chunks_per_minute": round(len(done) * 60 / wall_seconds, 1) if wall_seconds else None,
+            "source_chars_per_second": round(self.chars / wall_seconds, 1) if wall_seconds else None,
+            "latency_p50_seconds": round(statistics.median(latencies), 3) if latencies else None,
+            "latency_p95_seconds": round(quantiles[18], 3) if latencies else None,
+        }
+
+
+# =============================================================================
+# Main
+# =============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description='Translate pending chunks with a local job scheduler')
+    parser.add_argument('--temp-dir', required=True, help='Temp directory path (with manifest.json)')
+    parser.add_argument('--backend', required=True,
+                        help=f'Translation backend: {", ".join(BACKENDS)}, or module:Class')
+    parser.add_argument('--command', help='Shell command for the command backend (chunk on stdin, translation on stdout)')
+    parser.add_argument('--target-lang', default=None, help='Target language (default: output_lang from config.txt)')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help=f'Parallel workers (default: the concurrency convert.py balanced for, else {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--rpm', type=float, default=0, help='Requests per minute, 0 for no limit (default: 0)')
+    parser.add_argument('--tpm', type=float, default=0,
+                        help='Estimated source tokens per minute, 0 for no limit (default: 0)')
+    parser.add_argument('--retries', type=int, default=1, help='Extra attempts per chunk (default: 1)')
+    parser.add_argument('--backoff', type=float, default=2.0, help='Seconds before the first retry, doubling after (default: 2)')
+    parser.add_argument('--timeout', type=int, default=600, help='Seconds per command backend call (default: 600)')
+    parser.add_argument('--echo-delay', type=float, default=0.0, help='Seconds each echo backend call takes (default: 0)')
+    parser.add_argument('--echo-fail-rate', type=float, default=0.0,
+                        help='Share of echo backend calls that fail (default: 0)')
+    args = parser.parse_args()
+    if args.concurrency is not None and args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    manifest = load_manifest(args.temp_dir)
+    if manifest is None:
+        print(f"Error: no manifest.json in {args.temp_dir} — run convert.py first")
+        sys.exit(1)
+
+    target_lang = args.target_lang
+    if target_lang is None:
+        target_lang = 'zh'
+        config_file = os.path.join(args.temp_dir, 'config.txt')
+        if os.path.exists(config_file):
+            with open(config_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.startswith('output_lang='):
+                        target_lang = line.strip().split('=', 1)[1]
+
+    if args.backend == 'echo':
+        options = {"delay": args.echo_delay, "fail_rate": args.echo_fail_rate}
+    elif args.backend == 'command':
+        if not args.command:
+            parser.error("the command backend needs --command")
+        options = {"command": args.command, "timeout": args.timeout}
+    else:
+        options = {}
+    try:
+        backend = load_backend(args.backend, target_lang, **options)
+    except (ValueError, ImportError, AttributeError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    concurrency = args.concurrency
+    if concurrency is None:
+        concurrency = manifest.get("schedule", {}).get("concurrency") or DEFAULT_CONCURRENCY
+    requests = TokenBucket(args.rpm / 60, concurrency) if args.rpm else None
+    tokens = TokenBucket(args.tpm / 60, args.tpm) if args.tpm else None
+
+    chunks = pending_chunks(args.temp_dir, manifest)
+    print(f"=== Translating {len(chunks)} of {len(manifest['chunks'])} chunks "
+          f"({args.backend}, {concurrency} workers) ===")
+    if not chunks:
+        print("Nothing to do — every chunk has an output")
+        return
+
+    scheduler = Scheduler(args.temp_dir, backend, concurrency, args.retries, args.backoff, requests, tokens)
+    started = time.monotonic()
+    done, failed = asyncio.run(scheduler.run(chunks))
+    metrics = scheduler.metrics(time.monotonic() - started, done, failed)
+    scheduler.state["last_run"] = metrics
+    save_json(args.temp_dir, STATE_FILE, scheduler.state)
+
+    for key, value in metrics.items():
+        print(f"  {key}: {value}")
+    if failed:
+        print(f"Failed after {args.retries + 1} attempt(s): {', '.join(sorted(failed))}")
+        print("Re-run to retry them; finished chunks are kept.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
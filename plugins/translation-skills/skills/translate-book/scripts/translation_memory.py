@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+translation_memory.py - Content-addressed store of earlier translations.
+
+Entries are keyed by (hash of the normalized source text, source language,
+target language) and hold either a whole chunk or one structural block.
+merge_and_build.py records every chunk it merges, plus its blocks when the
+translation lines up block for block with the source. convert.py looks each
+new chunk up as it splits, so repeated front matter, recurring headings and
+the shared prefaces of a series are translated once. Fenced code blocks are
+never looked up or stored on their own: they are copied through verbatim.
+
+The store is one SQLite file shared by every book (see DEFAULT_MEMORY_PATH).
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+
+DEFAULT_MEMORY_PATH = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "translate-book",
+    "memory.sqlite3",
+)
+
+_INLINE_WHITESPACE_RE = re.compile(r'[^\S\n]+')
+_INDENT_RE = re.compile(r'[ \t]*')
+
+
+def normalize(text):
+    """Source text as keyed: NFC, and within each line whitespace runs
+    collapsed and trailing whitespace dropped; leading blank lines and
+    trailing ones are stripped.
+
+    Line breaks and each line's indentation are kept, because they are
+    markdown structure: a nested list and a flat one, or a verse block and
+    a paragraph, must not share a translation.
+    """
+    text = unicodedata.normalize('NFC', text).replace('\r\n', '\n').replace('\r', '\n')
+    lines = []
+    for line in text.split('\n'):
+        indent = _INDENT_RE.match(line).group()
+        lines.append(indent + _INLINE_WHITESPACE_RE.sub(' ', line[len(indent):]).rstrip())
+    return '\n'.join(lines).strip('\n')
+
+
+def text_key(text):
+    return hashlib.sha256(normalize(text).encode('utf-8')).hexdigest()
+
+
+def _is_blank(block):
+    return not block[0].strip()
+
+
+def align_blocks(source_blocks, output_blocks):
+    """Pair up source and translated blocks, ignoring blank separators.
+
+    Returns [(source_text, translated_text, block_type), ...] when both sides
+    have the same sequence of block types, else None (the translation merged,
+    split or reordered blocks, so no block-level pairing can be trusted).
+    """
+    source = [b for b in source_blocks if not _is_blank(b)]
+    output = [b for b in output_blocks if not _is_blank(b)]
+    if len(source) != len(output) or any(s[1] != o[1] for s, o in zip(source, output)):
+        return None
+    return [(s[0], o[0], s[1]) for s, o in zip(source, output)]
+
+
+class TranslationMemory:
+    """Translations from source_lang to target_lang, stored at path."""
+
+    def __init__(self, path, source_lang, target_lang):
+        self.path = path
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            " key TEXT NOT NULL, source_lang TEXT NOT NULL, target_lang TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " PRIMARY KEY (key, source_lang, target_lang)) WITHOUT ROWID"
+        )
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def lookup(self, text):
+        row = self._db.execute(
+            "SELECT translation FROM translations WHERE key = ? AND source_lang = ? AND target_lang = ?",
+            (text_key(text), self.source_lang, self.target_lang),
+        ).fetchone()
+        return row[0] if row else None
+
+    def store(self, pairs):
+        """Record (source_text, translated_text) pairs; a later translation
+        of the same source replaces the earlier one."""
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)",
+                [(text_key(source), self.source_lang, self.target_lang, translation)
+                 for source, translation in pairs if normalize(source) and translation.strip()],
+            )
+
+    def translate_chunk(self, chunk_text, blocks):
+        """The chunk's translation if it can be assembled without a translator.
+
+        blocks is parse_structural_blocks(chunk_text). A whole-chunk hit wins;
+        otherwise every non-blank block must be a code block (copied as is)
+        or a hit of its own. Returns None if anything is left to translate.
+        """
+        if not chunk_text.strip():
+            return None
+        cached = self.lookup(chunk_text)
+        if cached is not None:
+            return cached
+        parts = []
+        for text, block_type in blocks:
+            if block_type == 'code_block' or not text.strip():
+                parts.append(text)
+                continue
+            cached = self.lookup(text)
+            if cached is None:
+                return None
+            parts.append(cached)
+        return '\n'.join(parts)
+
+    def learn_chunk(self, source_text, source_blocks, output_text, output_blocks):
+        """Record a translated chunk, and its blocks if they align.
+
+        Returns the number of block pairs recorded.
+        """
+        aligned = align_blocks(source_blocks, output_blocks) or []
+        block_pairs = [(s, o) for s, o, block_type in aligned if block_type != 'code_block']
+        self.store([(source_text, output_text)] + block_pairs)
+        return len(block_pairs)
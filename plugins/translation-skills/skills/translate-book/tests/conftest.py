@@ -0,0 +1,25 @@
+"""Shared fixtures for the translate-book script tests."""
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import manifest  # noqa: E402
+
+
+@pytest.fixture
+def make_book(tmp_path):
+    """Factory for a split book in tmp_path: count chunkNNNN.md sources, an
+    output_chunkNNNN.md for each of outputs, and manifest.json (returned)."""
+    def make(count=None, outputs=()):
+        outputs = list(outputs)
+        names = [f"chunk{i:04d}.md" for i in range(1, (count or len(outputs)) + 1)]
+        for name, output in zip(names, outputs + [None] * len(names)):
+            (tmp_path / name).write_text(f"Source text of {name}\n", encoding="utf-8")
+            if output is not None:
+                (tmp_path / f"output_{name}").write_text(output, encoding="utf-8")
+        return manifest.create_manifest(str(tmp_path), names, str(tmp_path / "input.md"))
+    return make
@@ -0,0 +1,52 @@
+"""Tests for scripts/build_graph.py."""
+import os
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from build_graph import BuildGraph  # noqa: E402
+
+
+def _build(tmp_path, title="Book"):
+    """Run a one-step 'build' (concatenate the chunks) if the graph says so."""
+    graph = BuildGraph(str(tmp_path))
+    chunks = sorted(str(p) for p in tmp_path.glob("part*.md"))
+    output = tmp_path / "out.md"
+    inputs = graph.inputs(chunks, title=title)
+    reason = graph.check("merge", inputs, [str(output)])
+    if reason:
+        output.write_text(title + "".join(Path(c).read_text() for c in chunks))
+        graph.record("merge", inputs, [str(output)])
+    return reason
+
+
+def test_touch_does_not_rebuild(tmp_path):
+    (tmp_path / "part1.md").write_text("one\n")
+    (tmp_path / "part2.md").write_text("two\n")
+    assert _build(tmp_path) == "no previous build recorded"
+    assert _build(tmp_path) is None
+
+    for path in tmp_path.iterdir():
+        os.utime(path, ns=(0, 0))
+    assert _build(tmp_path) is None
+
+
+def test_changed_input_param_or_output_rebuilds(tmp_path):
+    (tmp_path / "part1.md").write_text("one\n")
+    _build(tmp_path)
+
+    (tmp_path / "part1.md").write_text("uno\n")
+    assert _build(tmp_path) == "changed: part1.md"
+
+    (tmp_path / "part2.md").write_text("two\n")
+    assert _build(tmp_path) == "new: part2.md"
+
+    assert _build(tmp_path, title="Other") == "changed: param:title"
+
+    (tmp_path / "out.md").write_text("edited by hand")
+    assert _build(tmp_path, title="Other") == "out.md was changed outside the build"
+
+    (tmp_path / "out.md").unlink()
+    assert _build(tmp_path, title="Other") == "out.md is missing"
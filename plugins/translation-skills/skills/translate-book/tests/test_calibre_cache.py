@@ -0,0 +1,70 @@
+"""Tests for scripts/calibre_cache.py."""
+import os
+import sys
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from calibre_cache import ConversionCache, conversion_key  # noqa: E402
+
+ARGS = ["<input>", "<output>.epub", "--title", "Book", "--epub-version", "3"]
+
+
+def _work_dir(root):
+    (root / "images").mkdir(parents=True)
+    (root / "work.html").write_text('<img src="images/a.png">', encoding="utf-8")
+    (root / "images" / "a.png").write_bytes(b"png")
+    return root
+
+
+def test_key_depends_on_content_args_and_version_not_location(tmp_path):
+    first = _work_dir(tmp_path / "one")
+    second = _work_dir(tmp_path / "two")
+    key = conversion_key("calibre 7.0", ARGS, str(first))
+
+    assert conversion_key("calibre 7.0", ARGS, str(second)) == key
+    assert conversion_key("calibre 7.1", ARGS, str(first)) != key
+    assert conversion_key("calibre 7.0", ARGS + ["--smarten-punctuation"], str(first)) != key
+    (second / "images" / "a.png").write_bytes(b"png, edited")
+    assert conversion_key("calibre 7.0", ARGS, str(second)) != key
+
+
+def test_excluded_output_does_not_change_the_key(tmp_path):
+    work = _work_dir(tmp_path)
+    key = conversion_key("v", ARGS, str(work))
+    (work / "book.epub").write_bytes(b"epub")
+
+    assert conversion_key("v", ARGS, str(work), exclude=[str(work / "book.epub")]) == key
+
+
+def test_fetch_returns_the_stored_artifact(tmp_path):
+    cache = ConversionCache(str(tmp_path / "cache"))
+    artifact = tmp_path / "book.epub"
+    artifact.write_bytes(b"converted")
+    output = tmp_path / "out" / "book.epub"
+    output.parent.mkdir()
+
+    assert not cache.fetch("k", ".epub", str(output))
+    cache.store("k", ".epub", str(artifact))
+    assert cache.fetch("k", ".epub", str(output))
+    assert output.read_bytes() == b"converted"
+    assert sorted(os.listdir(output.parent)) == ["book.epub"]
+    umask = os.umask(0)
+    os.umask(umask)
+    assert output.stat().st_mode & 0o777 == 0o666 & ~umask
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache = ConversionCache(str(cache_dir), max_bytes=30)
+    artifact = tmp_path / "artifact"
+    artifact.write_bytes(b"x" * 10)
+    for age, key in enumerate(["old", "used", "new"]):
+        cache.store(key, ".pdf", str(artifact))
+        os.utime(cache_dir / f"{key}.pdf", ns=(age * 10**9, age * 10**9))
+    assert cache.fetch("old", ".pdf", str(tmp_path / "copy.pdf"))
+
+    cache.max_bytes = 25
+    assert cache.evict() == 1
+    assert sorted(os.listdir(cache_dir)) == ["new.pdf", "old.pdf"]
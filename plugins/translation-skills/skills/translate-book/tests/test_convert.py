@@ -0,0 +1,135 @@
+"""Tests for scripts/convert.py.
+
+Run from anywhere with pytest:
+
+    pytest plugins/translation-skills/skills/translate-book/tests
+
+The golden files in fixtures/books/*.blocks.json hold the blocks the original
+regex-per-check parser produced for each sample book; the single-pass
+classifier must reproduce them exactly.
+"""
+import io
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+BOOKS = Path(__file__).resolve().parent / "fixtures" / "books"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import convert  # noqa: E402
+import manifest  # noqa: E402
+
+
+@pytest.mark.parametrize("book", sorted(p.stem for p in BOOKS.glob("*.md")))
+def test_blocks_match_golden(book):
+    content = (BOOKS / f"{book}.md").read_text(encoding="utf-8")
+    golden = json.loads((BOOKS / f"{book}.blocks.json").read_text(encoding="utf-8"))
+    assert [list(b) for b in convert.parse_structural_blocks(content)] == golden
+
+
+@pytest.mark.parametrize("window", [1, 2, 3, 50])
+def test_streamed_blocks_match_golden(window):
+    with open(BOOKS / "edge_cases.md", encoding="utf-8") as f:
+        blocks = list(convert.iter_structural_blocks(convert.read_lines(f), window=window))
+    golden = json.loads((BOOKS / "edge_cases.blocks.json").read_text(encoding="utf-8"))
+    assert [list(b) for b in blocks] == golden
+
+
+@pytest.mark.parametrize("text", ["", "\n", "one", "one\n", "one\n\ntwo\n\n"])
+def test_read_lines_matches_split(text):
+    assert list(convert.read_lines(io.StringIO(text))) == text.split("\n")
+
+
+def test_split_writes_chunks_and_manifest_in_one_pass(tmp_path):
+    source = tmp_path / "input.md"
+    content = (BOOKS / "novel.md").read_text(encoding="utf-8")
+    source.write_text(content, encoding="utf-8")
+
+    files = convert.split_markdown_structured(str(source), str(tmp_path), target_size=300)
+
+    expected = convert.merge_blocks_to_chunks(convert.parse_structural_blocks(content), 300)
+    assert [(tmp_path / name).read_text(encoding="utf-8") for name in files] == expected
+    written = manifest.load_manifest(str(tmp_path))
+    assert written["source_hash"] == manifest.file_hash(str(source))
+    assert [c["source_file"] for c in written["chunks"]] == files
+    for chunk in written["chunks"]:
+        assert chunk["source_hash"] == manifest.file_hash(str(tmp_path / chunk["source_file"]))
+
+
+def test_blocks_rejoin_to_input():
+    content = (BOOKS / "novel.md").read_text(encoding="utf-8")
+    assert "\n".join(text for text, _ in convert.parse_structural_blocks(content)) == content
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("", convert._BLANK),
+    ("   ", convert._BLANK),
+    ("```python", convert._FENCE),
+    ("## Title", convert._HEADING),
+    ("####### seven", convert._TEXT),
+    ("#", convert._TEXT),
+    ("> quote", convert._QUOTE),
+    ("| a | b |", convert._TABLE),
+    ("- item", convert._LIST),
+    ("- ", convert._TEXT),
+    ("12. twelve", convert._LIST),
+    ("1) paren", convert._TEXT),
+    ("![alt](x.png)", convert._IMAGE),
+    ("!important", convert._TEXT),
+    ("  indented text", convert._TEXT),
+])
+def test_classify_lines(line, expected):
+    assert convert.classify_lines([line])[0] == expected
+
+
+def test_unterminated_fence_runs_to_end():
+    blocks = convert.parse_structural_blocks("```\ncode\n# not a heading")
+    assert blocks == [("```\ncode\n# not a heading", "code_block")]
+
+
+def test_balanced_plan_evens_chunk_costs():
+    costs = [100, 900, 50, 400, 400, 300, 700, 100, 200, 500, 600, 250]
+    headings = [False] * len(costs)
+    counts, chunk_costs = convert.plan_balanced_chunks(costs, headings, concurrency=2, target_cost=1200)
+
+    assert len(counts) == 4
+    assert sum(counts) == len(costs)
+    assert sum(chunk_costs) == sum(costs)
+    # the costliest chunk is as cheap as any 4-way contiguous split allows
+    assert max(chunk_costs) == 1350
+    assert convert.predicted_makespan(chunk_costs, 2) == max(chunk_costs[:2]) + max(chunk_costs[2:])
+
+
+def test_balanced_split_preserves_text(tmp_path):
+    source = (BOOKS / "novel.md").read_text(encoding="utf-8")
+    md = tmp_path / "input.md"
+    md.write_text(source, encoding="utf-8")
+
+    files = convert.split_markdown_structured(str(md), str(tmp_path), target_size=400,
+                                              concurrency=3, cost_model="tokens")
+
+    assert len(files) % 3 == 0
+    assert "\n".join((tmp_path / f).read_text(encoding="utf-8") for f in files) == source
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert manifest["schedule"]["concurrency"] == 3
+    costs = [chunk["cost"] for chunk in manifest["chunks"]]
+    assert manifest["schedule"]["predicted_makespan"] == convert.predicted_makespan(costs, 3)
+
+
+def test_estimate_tokens_counts_cjk_per_character():
+    assert convert.estimate_tokens("灯台守の手紙") == 6
+    assert convert.estimate_tokens("lighthouse keeper") == 4
+
+
+@pytest.mark.parametrize("value", ["0", "-3"])
+def test_concurrency_below_one_is_a_usage_error(tmp_path, value):
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "convert.py"), str(tmp_path / "book.epub"), "--concurrency", value],
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 2
+    assert "--concurrency must be at least 1" in result.stderr
@@ -0,0 +1,78 @@
+"""Tests for scripts/image_assets.py."""
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import image_assets  # noqa: E402
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def _book(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (3000, 1500), (200, 30, 30)).save(images / "scan.jpg", quality=95)
+    (images / "scan copy.jpg").write_bytes((images / "scan.jpg").read_bytes())
+    Image.new("RGB", (40, 40), (0, 0, 255)).save(images / "icon.png")
+    (images / "icon2.png").write_bytes((images / "icon.png").read_bytes())
+    html = tmp_path / "work.html"
+    html.write_text(
+        '<img src="images/scan.jpg"><img src="./images/scan%20copy.jpg">'
+        "<img src='images/icon2.png'><a href=\"images/icon.png\">icon</a>",
+        encoding="utf-8",
+    )
+    return html
+
+
+def test_duplicates_are_removed_and_references_rewritten(tmp_path):
+    html = _book(tmp_path)
+
+    stats = image_assets.optimize_images(str(tmp_path), str(html), max_dim=1600)
+
+    assert stats["images"] == 4 and stats["duplicates"] == 2
+    assert image_assets.find_images(str(tmp_path)) == ["images/icon.png", "images/scan copy.jpg"]
+    assert html.read_text(encoding="utf-8") == (
+        '<img src="images/scan%20copy.jpg"><img src="./images/scan%20copy.jpg">'
+        "<img src='images/icon.png'><a href=\"images/icon.png\">icon</a>"
+    )
+    with Image.open(tmp_path / "images" / "scan copy.jpg") as image:
+        assert image.size == (1600, 800)
+    assert stats["bytes_after"] < stats["bytes_before"]
+
+
+def test_small_images_are_kept_unless_recompression_helps(tmp_path):
+    html = _book(tmp_path)
+    icon = (tmp_path / "images" / "icon.png").read_bytes()
+
+    stats = image_assets.optimize_images(str(tmp_path), str(html), max_dim=0)
+
+    assert stats["images"] == 4
+    assert len((tmp_path / "images" / "icon.png").read_bytes()) <= len(icon)
+    with Image.open(tmp_path / "images" / "scan copy.jpg") as image:
+        assert image.size == (3000, 1500)
+
+
+def test_duplicates_still_referenced_elsewhere_are_kept(tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (20, 20), (0, 128, 0)).save(images / "a.png")
+    for name in ("b.png", "c.png"):
+        (images / name).write_bytes((images / "a.png").read_bytes())
+    html = tmp_path / "work.html"
+    html.write_text(
+        '<img src="images/a.png"><img src="images/b.png"><img src="images/c.png">'
+        '<div style="background:url(images/b.png)"></div><img srcset="images/c.png 2x">',
+        encoding="utf-8",
+    )
+
+    stats = image_assets.optimize_images(str(tmp_path), str(html))
+
+    assert stats["duplicates"] == 0
+    assert image_assets.find_images(str(tmp_path)) == ["images/a.png", "images/b.png", "images/c.png"]
+    assert html.read_text(encoding="utf-8").startswith(
+        '<img src="images/a.png"><img src="images/a.png"><img src="images/a.png">'
+    )
@@ -0,0 +1,82 @@
+"""Tests for scripts/manifest.py merge validation."""
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import manifest  # noqa: E402
+
+
+@pytest.fixture
+def book(tmp_path, make_book):
+    make_book(outputs=[f"Translated chunk{i:04d}.md\n" for i in range(1, 4)])
+    return tmp_path
+
+
+def _hashes(monkeypatch):
+    hashed = []
+    real = manifest.file_hash
+    monkeypatch.setattr(manifest, "file_hash", lambda path: hashed.append(os.path.basename(path)) or real(path))
+    return hashed
+
+
+def test_unchanged_chunks_are_not_rehashed(book, monkeypatch):
+    hashed = _hashes(monkeypatch)
+    ok, files, _ = manifest.validate_for_merge(str(book))
+    assert ok
+    assert [os.path.basename(f) for f in files] == [f"output_chunk{i:04d}.md" for i in range(1, 4)]
+    assert hashed == []
+
+    manifest.validate_for_merge(str(book), full_verify=True)
+    assert sorted(hashed) == [f"chunk{i:04d}.md" for i in range(1, 4)]
+
+
+def test_touched_chunk_is_rehashed_once_and_restatted(book, monkeypatch):
+    chunk = book / "chunk0002.md"
+    st = chunk.stat()
+    os.utime(chunk, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    hashed = _hashes(monkeypatch)
+
+    assert manifest.validate_for_merge(str(book))[0]
+    assert hashed == ["chunk0002.md"]
+    entry = json.loads((book / "manifest.json").read_text())["chunks"][1]
+    assert entry["source_mtime_ns"] == chunk.stat().st_mtime_ns
+
+    assert manifest.validate_for_merge(str(book))[0]
+    assert hashed == ["chunk0002.md"]
+
+
+def test_edited_chunk_fails_validation(book):
+    chunk = book / "chunk0003.md"
+    chunk.write_text("Different source text\n", encoding="utf-8")
+
+    ok, files, _ = manifest.validate_for_merge(str(book))
+    assert not ok and files is None
+
+
+def test_manifest_without_stats_is_hashed(book, monkeypatch):
+    data = json.loads((book / "manifest.json").read_text())
+    for chunk in data["chunks"]:
+        del chunk["source_size"], chunk["source_mtime_ns"]
+    (book / "manifest.json").write_text(json.dumps(data))
+    hashed = _hashes(monkeypatch)
+
+    assert manifest.validate_for_merge(str(book))[0]
+    assert len(hashed) == 3
+    assert all("source_mtime_ns" in c for c in json.loads((book / "manifest.json").read_text())["chunks"])
+
+
+def test_manifest_gets_default_permissions(book):
+    umask = os.umask(0)
+    os.umask(umask)
+    manifest.validate_for_merge(str(book))
+    (book / "chunk0001.md").touch()
+    manifest.validate_for_merge(str(book))
+
+    assert (book / "manifest.json").stat().st_mode & 0o777 == 0o666 & ~umask
+    assert [p.name for p in book.iterdir() if p.name.startswith(".")] == []
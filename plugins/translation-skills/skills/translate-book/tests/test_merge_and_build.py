@@ -0,0 +1,71 @@
+"""Tests for the merge step of scripts/merge_and_build.py."""
+import hashlib
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+TOC = Path(__file__).resolve().parent / "fixtures" / "toc"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import manifest  # noqa: E402
+import merge_and_build  # noqa: E402
+
+OUTPUTS = ["\n# Chapter One\n\nThe keeper wrote.\n\n\n", "   \n", "Ünïcode tail  "]
+
+
+def test_merge_strips_chunks_and_records_offsets(tmp_path, make_book):
+    make_book(outputs=OUTPUTS)
+
+    assert merge_and_build.merge_markdown_files(str(tmp_path))
+
+    merged = (tmp_path / "output.md").read_bytes()
+    assert merged == "# Chapter One\n\nThe keeper wrote.\n\nÜnïcode tail\n\n".encode("utf-8")
+    index = manifest.load_merge_index(str(tmp_path))
+    assert index["output_hash"] == hashlib.sha256(merged).hexdigest()
+    assert index["output_size"] == len(merged)
+    for entry, output in zip(index["chunks"], OUTPUTS):
+        piece = merged[entry["offset"]:entry["offset"] + entry["length"]]
+        assert piece == output.strip().encode("utf-8")
+        assert entry["hash"] == hashlib.sha256(piece).hexdigest()
+    assert not list(tmp_path.glob(".output.md-*"))
+    umask = os.umask(0)
+    os.umask(umask)
+    assert (tmp_path / "output.md").stat().st_mode & 0o777 == 0o666 & ~umask
+
+
+def test_merge_without_manifest_uses_source_order(tmp_path, make_book):
+    make_book(outputs=OUTPUTS)
+    (tmp_path / "manifest.json").unlink()
+
+    assert merge_and_build.merge_markdown_files(str(tmp_path))
+    assert (tmp_path / "output.md").read_text(encoding="utf-8").startswith("# Chapter One")
+
+
+def test_toc_matches_golden(tmp_path):
+    # fixtures/toc/book.toc.html is what the former BeautifulSoup pass made of
+    # book.html; the single-pass splice only edits heading tags and the TOC,
+    # so its output parses back to exactly that document
+    bs4 = pytest.importorskip("bs4")
+    book = tmp_path / "book.html"
+    book.write_text((TOC / "book.html").read_text(encoding="utf-8"), encoding="utf-8")
+
+    assert merge_and_build.insert_toc(str(book))
+
+    result = book.read_text(encoding="utf-8")
+    assert str(bs4.BeautifulSoup(result, "html.parser")) == (TOC / "book.toc.html").read_text(encoding="utf-8")
+    assert 'href="#chapter-1-2"' in result
+    # Headings in comments and scripts are not markup; a quoted '>' does not end a tag
+    assert "<!-- <h2>Draft Chapter</h2> left out of this edition -->" in result
+    assert "<h1 title=\"a>b\" data-note='<h2>not a heading</h2>' id=\"angle-brackets\">" in result
+    # A heading inside .toc-content is listed, then replaced with the rest of the div
+    assert "Old Contents</h2>" not in result
+
+
+def test_heading_ids_are_unique():
+    ids, next_suffix = set(), {}
+    for text in ["Chapter 1", "chapter-1", "Chapter 1", "Chapter 1-1", "Chapter 1", "!!!", "?"]:
+        ids.add(merge_and_build.generate_heading_id(text, ids, next_suffix))
+    assert ids == {"chapter-1", "chapter-1-1", "chapter-1-2", "chapter-1-1-1", "chapter-1-3", "heading", "heading-1"}
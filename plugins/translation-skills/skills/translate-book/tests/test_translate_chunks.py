@@ -0,0 +1,110 @@
+"""Tests for scripts/translate_chunks.py."""
+import asyncio
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import translate_chunks  # noqa: E402
+
+
+class FlakyBackend(translate_chunks.Backend):
+    """Fails each chunk's first attempt, then upper-cases it."""
+
+    def __init__(self, target_lang):
+        super().__init__(target_lang)
+        self.seen = set()
+
+    async def translate(self, text, chunk_id):
+        if chunk_id not in self.seen:
+            self.seen.add(chunk_id)
+            raise RuntimeError("transient")
+        return text.upper()
+
+
+def test_echo_run_translates_pending_chunks_and_resumes(tmp_path, make_book):
+    data = make_book(count=6)
+    (tmp_path / "output_chunk0002.md").write_text("already done", encoding="utf-8")
+    chunks = translate_chunks.pending_chunks(str(tmp_path), data)
+    assert [c["id"] for c in chunks] == ["chunk0001", "chunk0003", "chunk0004", "chunk0005", "chunk0006"]
+
+    scheduler = translate_chunks.Scheduler(str(tmp_path), translate_chunks.EchoBackend("en"), concurrency=3)
+    done, failed = asyncio.run(scheduler.run(chunks))
+
+    assert sorted(done) == [c["id"] for c in chunks] and failed == []
+    assert (tmp_path / "output_chunk0001.md").read_text() == "Source text of chunk0001.md\n"
+    assert (tmp_path / "output_chunk0002.md").read_text() == "already done"
+    assert translate_chunks.pending_chunks(str(tmp_path), data) == []
+    state = json.loads((tmp_path / translate_chunks.STATE_FILE).read_text())
+    assert state["chunks"]["chunk0003"]["status"] == "done"
+    assert not list(tmp_path.glob(".output_chunk*"))
+
+
+def test_failed_attempts_are_retried(tmp_path, make_book):
+    data = make_book(count=3)
+    chunks = translate_chunks.pending_chunks(str(tmp_path), data)
+
+    scheduler = translate_chunks.Scheduler(str(tmp_path), FlakyBackend("en"), concurrency=2, retries=1, backoff=0)
+    done, failed = asyncio.run(scheduler.run(chunks))
+    assert len(done) == 3 and failed == [] and scheduler.retried == 3
+    assert (tmp_path / "output_chunk0003.md").read_text() == "SOURCE TEXT OF CHUNK0003.MD\n"
+
+    (tmp_path / "output_chunk0003.md").unlink()
+    scheduler = translate_chunks.Scheduler(str(tmp_path), FlakyBackend("en"), retries=0)
+    done, failed = asyncio.run(scheduler.run(translate_chunks.pending_chunks(str(tmp_path), data)))
+    assert failed == ["chunk0003"]
+    state = json.loads((tmp_path / translate_chunks.STATE_FILE).read_text())
+    entry = state["chunks"]["chunk0003"]
+    assert (entry["attempts"], entry["status"], entry["error"]) == (3, "failed", "transient")
+
+
+def test_token_bucket_limits_rate():
+    async def take(count):
+        bucket = translate_chunks.TokenBucket(rate=50, capacity=5)
+        started = time.monotonic()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # 5 come from the initial burst, the other 10 at 50 per second
+    assert 0.18 <= asyncio.run(take(15)) < 0.5
+
+
+def test_chunk_that_cannot_be_read_fails_without_stopping_the_run(tmp_path, make_book):
+    data = make_book(count=2)
+    (tmp_path / "chunk0001.md").unlink()
+    chunks = translate_chunks.pending_chunks(str(tmp_path), data)
+
+    scheduler = translate_chunks.Scheduler(str(tmp_path), translate_chunks.EchoBackend("en"), concurrency=1)
+    done, failed = asyncio.run(asyncio.wait_for(scheduler.run(chunks), 5))
+
+    assert (done, failed) == (["chunk0002"], ["chunk0001"])
+    state = json.loads((tmp_path / translate_chunks.STATE_FILE).read_text())
+    assert state["chunks"]["chunk0001"]["status"] == "failed"
+    assert "chunk0001.md" in state["chunks"]["chunk0001"]["error"]
+
+
+def test_backend_must_implement_translate():
+    class Incomplete(translate_chunks.Backend):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("en")
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_concurrency_below_one_is_a_usage_error(tmp_path, make_book, value):
+    make_book(count=1)
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "translate_chunks.py"), "--temp-dir", str(tmp_path),
+         "--backend", "echo", "--concurrency", value],
+        capture_output=True, text=True, timeout=30,
+    )
+    assert result.returncode == 2
+    assert "--concurrency must be at least 1" in result.stderr
@@ -0,0 +1,68 @@
+"""Tests for scripts/translation_memory.py."""
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from convert import parse_structural_blocks  # noqa: E402
+from translation_memory import TranslationMemory, align_blocks  # noqa: E402
+
+SOURCE = "## Preface\n\nThis book is a work of fiction.\n\n```\nprint('hi')\n```"
+OUTPUT = "## 序言\n\n本书纯属虚构。\n\n```\nprint('hi')\n```"
+
+
+@pytest.fixture
+def memory(tmp_path):
+    with TranslationMemory(str(tmp_path / "memory.sqlite3"), "en", "zh") as m:
+        yield m
+
+
+def _learn(memory, source, output):
+    return memory.learn_chunk(source, parse_structural_blocks(source), output, parse_structural_blocks(output))
+
+
+def test_aligned_blocks_are_reused_in_a_new_chunk(memory):
+    assert _learn(memory, SOURCE, OUTPUT) == 2  # heading and paragraph; the code block is not stored
+    chunk = "This book is a work of fiction.\n\n## Preface"
+    assert memory.translate_chunk(chunk, parse_structural_blocks(chunk)) == "本书纯属虚构。\n\n## 序言"
+
+
+def test_lookup_ignores_whitespace_within_lines(memory):
+    _learn(memory, SOURCE, OUTPUT)
+    assert memory.lookup("\nThis  book is a\twork of fiction.  \r\n") == "本书纯属虚构。"
+    assert memory.lookup("This book is a\nwork of fiction.") is None
+
+
+def test_line_breaks_and_indentation_are_part_of_the_key(memory):
+    memory.store([("- one\n  - two", "- 一\n  - 二"), ("Roses are red\nviolets are blue", "玫瑰是红的\n紫罗兰是蓝的")])
+    assert memory.lookup("- one\n- two") is None
+    assert memory.lookup("Roses are red violets are blue") is None
+    assert memory.lookup("- one  \n  - two") == "- 一\n  - 二"
+
+
+def test_chunk_with_an_unknown_block_is_left_for_translation(memory):
+    _learn(memory, SOURCE, OUTPUT)
+    chunk = "## Preface\n\nSomething new."
+    assert memory.translate_chunk(chunk, parse_structural_blocks(chunk)) is None
+
+
+def test_code_only_chunk_is_copied_verbatim(memory):
+    chunk = "```python\nx = 1\n```"
+    assert memory.translate_chunk(chunk, parse_structural_blocks(chunk)) == chunk
+
+
+def test_language_pairs_are_kept_apart(memory, tmp_path):
+    _learn(memory, SOURCE, OUTPUT)
+    with TranslationMemory(memory.path, "en", "ja") as other:
+        assert other.lookup("## Preface") is None
+
+
+def test_misaligned_translation_stores_only_the_whole_chunk(memory):
+    merged = "序言：本书纯属虚构。\n\n```\nprint('hi')\n```"  # heading folded into the paragraph
+    assert align_blocks(parse_structural_blocks(SOURCE), parse_structural_blocks(merged)) is None
+    assert _learn(memory, SOURCE, merged) == 0
+    assert memory.translate_chunk(SOURCE, parse_structural_blocks(SOURCE)) == merged
+    assert memory.lookup("## Preface") is None
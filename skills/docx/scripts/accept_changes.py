@@ -1,14 +1,20 @@
 """Accept all tracked changes in a DOCX file using LibreOffice.
 
 Requires LibreOffice (soffice) to be installed.
+
+accept_changes() also takes an open office.helpers.package.Package: it is
+saved to output_file, LibreOffice edits that file, and the Package is
+reloaded from it, so later edits in the same process see the result.
 """
 
 import argparse
 import logging
+import os
 import shutil
 import subprocess
 from pathlib import Path
 
+from office.helpers.package import Package
 from office.soffice import get_soffice_env
 
 logger = logging.getLogger(__name__)
@@ -34,21 +40,25 @@ ACCEPT_CHANGES_MACRO = """<?xml version="1.0" encoding="UTF-8"?>
 
 
 def accept_changes(
-    input_file: str,
+    input_file: str | Package,
     output_file: str,
 ) -> tuple[None, str]:
-    input_path = Path(input_file)
+    package = None if isinstance(input_file, (str, os.PathLike)) else input_file
+    input_path = Path(input_file) if package is None else package.path
     output_path = Path(output_file)
 
     if not input_path.exists():
-        return None, f"Error: Input file not found: {input_file}"
+        return None, f"Error: Input file not found: {input_path}"
 
-    if not input_path.suffix.lower() == ".docx":
-        return None, f"Error: Input file is not a DOCX file: {input_file}"
+    if package is None and not input_path.suffix.lower() == ".docx":
+        return None, f"Error: Input file is not a DOCX file: {input_path}"
 
     try:
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        shutil.copy2(input_path, output_path)
+        if package is None:
+            shutil.copy2(input_path, output_path)
+        else:
+            package.save(output_path)
     except Exception as e:
         return None, f"Error: Failed to copy input file to output location: {e}"
 
@@ -74,17 +84,16 @@ def accept_changes(
             env=get_soffice_env(),
         )
     except subprocess.TimeoutExpired:
-        return (
-            None,
-            f"Successfully accepted all tracked changes: {input_file} -> {output_file}",
-        )
+        result = None
 
-    if result.returncode != 0:
+    if result is not None and result.returncode != 0:
         return None, f"Error: LibreOffice failed: {result.stderr}"
 
+    if package is not None:
+        package.reload()
     return (
         None,
-        f"Successfully accepted all tracked changes: {input_file} -> {output_file}",
+        f"Successfully accepted all tracked changes: {input_path} -> {output_file}",
     )
 
 
@@ -1,13 +1,14 @@
 """Add comments to a DOCX document.
 
-Accepts either an unpacked directory OR a .docx/.dotx file directly.
+Accepts an unpacked directory, a .docx/.dotx file, or (from Python) an open
+office.helpers.package.Package shared with other scripts.
 
 Usage:
     # Against an unpacked directory (writes satellite files in place)
     python comment.py unpacked/ "Comment text"
     python comment.py unpacked/ "Reply text" --parent 0
 
-    # Against a .docx directly (extracts, writes satellite files, rezips)
+    # Against a .docx directly (edited in memory, written back once)
     python comment.py contract.docx "This cap is too low" -o annotated.docx
     python comment.py contract.docx "Comment" --id 5      # explicit ID
 
@@ -24,9 +25,7 @@ After running, add markers to word/document.xml so the comment is visible:
 
 import argparse
 import random
-import shutil
 import sys
-import tempfile
 import zipfile
 from datetime import datetime, timezone
 from pathlib import Path
@@ -35,7 +34,8 @@ import defusedxml.minidom
 from xml.parsers.expat import ExpatError
 from xml.sax.saxutils import escape as xml_escape
 
-from office.helpers import opc_target, rezip as _rezip, safe_extract as _safe_extract
+from office.helpers import opc_target
+from office.helpers.package import Package, open_package
 
 TEMPLATE_DIR = Path(__file__).parent / "templates"
 NS = {
@@ -97,8 +97,8 @@ def _encode_smart_quotes(text: str) -> str:
     return text
 
 
-def _append_xml(xml_path: Path, root_tag: str, content: str) -> None:
-    dom = defusedxml.minidom.parseString(xml_path.read_text(encoding="utf-8"))
+def _append_xml(package: Package, part: str, root_tag: str, content: str) -> None:
+    dom = defusedxml.minidom.parseString(package.read(part))
     root = dom.getElementsByTagName(root_tag)[0]
     ns_attrs = " ".join(f'xmlns:{k}="{v}"' for k, v in NS.items())
     wrapper_dom = defusedxml.minidom.parseString(f"<root {ns_attrs}>{content}</root>")
@@ -106,11 +106,11 @@ def _append_xml(xml_path: Path, root_tag: str, content: str) -> None:
         if child.nodeType == child.ELEMENT_NODE:
             root.appendChild(dom.importNode(child, True))
     output = _encode_smart_quotes(dom.toxml(encoding="UTF-8").decode("utf-8"))
-    xml_path.write_text(output, encoding="utf-8")
+    package.write(part, output)
 
 
-def _find_para_id(comments_path: Path, comment_id: int) -> str | None:
-    dom = defusedxml.minidom.parseString(comments_path.read_text(encoding="utf-8"))
+def _find_para_id(package: Package, comments_part: str, comment_id: int) -> str | None:
+    dom = defusedxml.minidom.parseString(package.read(comments_part))
     for c in dom.getElementsByTagName("w:comment"):
         if c.getAttribute("w:id") == str(comment_id):
             for p in c.getElementsByTagName("w:p"):
@@ -119,10 +119,10 @@ def _find_para_id(comments_path: Path, comment_id: int) -> str | None:
     return None
 
 
-def _next_comment_id(comments_path: Path) -> int:
-    if not comments_path.exists():
+def _next_comment_id(package: Package, comments_part: str) -> int:
+    if comments_part not in package:
         return 0
-    dom = defusedxml.minidom.parseString(comments_path.read_text(encoding="utf-8"))
+    dom = defusedxml.minidom.parseString(package.read(comments_part))
     ids = []
     for c in dom.getElementsByTagName("w:comment"):
         try:
@@ -132,8 +132,7 @@ def _next_comment_id(comments_path: Path) -> int:
     return (max(ids) + 1) if ids else 0
 
 
-def _get_next_rid(rels_path: Path) -> int:
-    dom = defusedxml.minidom.parseString(rels_path.read_text(encoding="utf-8"))
+def _get_next_rid(dom) -> int:
     max_rid = 0
     for rel in dom.getElementsByTagName("Relationship"):
         rid = rel.getAttribute("Id")
@@ -145,16 +144,16 @@ def _get_next_rid(rels_path: Path) -> int:
     return max_rid + 1
 
 
-def _has_relationship(rels_path: Path, target: str) -> bool:
-    dom = defusedxml.minidom.parseString(rels_path.read_text(encoding="utf-8"))
+def _has_relationship(package: Package, rels_part: str, target: str) -> bool:
+    dom = package.dom(rels_part)
     return any(
         rel.getAttribute("Target") == target
         for rel in dom.getElementsByTagName("Relationship")
     )
 
 
-def _has_content_type(ct_path: Path, part_name: str) -> bool:
-    dom = defusedxml.minidom.parseString(ct_path.read_text(encoding="utf-8"))
+def _has_content_type(package: Package, part_name: str) -> bool:
+    dom = package.dom("[Content_Types].xml")
     return any(
         o.getAttribute("PartName") == part_name
         for o in dom.getElementsByTagName("Override")
@@ -175,11 +174,11 @@ _COMMENT_OVERRIDES = [
 ]
 
 
-def _ensure_comment_relationships(unpacked_dir: Path) -> None:
-    rels_path = unpacked_dir / "word" / "_rels" / "document.xml.rels"
-    if not rels_path.exists():
+def _ensure_comment_relationships(package: Package) -> None:
+    rels_part = "word/_rels/document.xml.rels"
+    if rels_part not in package:
         return
-    dom = defusedxml.minidom.parseString(rels_path.read_text(encoding="utf-8"))
+    dom = package.dom(rels_part)
     root = dom.documentElement
     comment_types = {rel_type for rel_type, _ in _COMMENT_RELS}
     existing = set()
@@ -193,7 +192,7 @@ def _ensure_comment_relationships(unpacked_dir: Path) -> None:
         )
         if part is not None:
             existing.add(part)
-    next_rid = _get_next_rid(rels_path)
+    next_rid = _get_next_rid(dom)
     changed = False
     for rel_type, target in _COMMENT_RELS:
         if opc_target(target, "word/document.xml") in existing:
@@ -206,14 +205,14 @@ def _ensure_comment_relationships(unpacked_dir: Path) -> None:
         next_rid += 1
         changed = True
     if changed:
-        rels_path.write_bytes(dom.toxml(encoding="UTF-8"))
+        package.mark_dirty(rels_part)
 
 
-def _ensure_comment_content_types(unpacked_dir: Path) -> None:
-    ct_path = unpacked_dir / "[Content_Types].xml"
-    if not ct_path.exists():
+def _ensure_comment_content_types(package: Package) -> None:
+    ct_part = "[Content_Types].xml"
+    if ct_part not in package:
         return
-    dom = defusedxml.minidom.parseString(ct_path.read_text(encoding="utf-8"))
+    dom = package.dom(ct_part)
     root = dom.documentElement
     existing = {
         o.getAttribute("PartName")
@@ -229,11 +228,16 @@ def _ensure_comment_content_types(unpacked_dir: Path) -> None:
         root.appendChild(override)  
         changed = True
     if changed:
-        ct_path.write_bytes(dom.toxml(encoding="UTF-8"))
+        package.mark_dirty(ct_part)
+
+
+def _ensure_part(package: Package, part: str, template: str) -> None:
+    if part not in package:
+        package.write(part, (TEMPLATE_DIR / template).read_bytes())
 
 
 def add_comment(
-    unpacked_dir: Path | str,
+    target: Path | str | Package,
     text: str,
     comment_id: int | None = None,
     author: str = "Claude",
@@ -241,70 +245,67 @@ def add_comment(
     parent_id: int | None = None,
     raw: bool = False,
 ) -> tuple[int, str, str]:
-    unpacked_dir = Path(unpacked_dir)
     if not raw:
         text = xml_escape(text)
     author = xml_escape(author, {'"': "&quot;"})
     initials = xml_escape(initials, {'"': "&quot;"})
-    word = unpacked_dir / "word"
-    if not word.exists():
-        raise FileNotFoundError(f"{word} not found (not an unpacked .docx?)")
-
-    comments = word / "comments.xml"
-    if comment_id is None:
-        comment_id = _next_comment_id(comments)
-
-    parent_para = None
-    if parent_id is not None:
-        parent_para = _find_para_id(comments, parent_id) if comments.exists() else None
-        if not parent_para:
-            raise ValueError(f"parent comment {parent_id} not found")
-
-    para_id, durable_id = _generate_hex_id(), _generate_hex_id()
-    ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-
-    if not comments.exists():
-        shutil.copy(TEMPLATE_DIR / "comments.xml", comments)
-    _ensure_comment_relationships(unpacked_dir)
-    _ensure_comment_content_types(unpacked_dir)
-    _append_xml(
-        comments,
-        "w:comments",
-        COMMENT_XML.format(
-            id=comment_id, author=author, date=ts, initials=initials,
-            para_id=para_id, text=text,
-        ),
-    )
 
-    ext = word / "commentsExtended.xml"
-    if not ext.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsExtended.xml", ext)
-    if parent_para is not None:
+    with open_package(target) as package:
+        if not any(name.startswith("word/") for name in package.names()):
+            raise FileNotFoundError(f"{package.path} has no word/ part (not a .docx?)")
+
+        comments = "word/comments.xml"
+        if comment_id is None:
+            comment_id = _next_comment_id(package, comments)
+
+        parent_para = None
+        if parent_id is not None:
+            parent_para = _find_para_id(package, comments, parent_id) if comments in package else None
+            if not parent_para:
+                raise ValueError(f"parent comment {parent_id} not found")
+
+        para_id, durable_id = _generate_hex_id(), _generate_hex_id()
+        ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        _ensure_part(package, comments, "comments.xml")
+        _ensure_comment_relationships(package)
+        _ensure_comment_content_types(package)
         _append_xml(
-            ext, "w15:commentsEx",
-            f'<w15:commentEx w15:paraId="{para_id}" w15:paraIdParent="{parent_para}" w15:done="0"/>',
+            package,
+            comments,
+            "w:comments",
+            COMMENT_XML.format(
+                id=comment_id, author=author, date=ts, initials=initials,
+                para_id=para_id, text=text,
+            ),
         )
-    else:
+
+        ext = "word/commentsExtended.xml"
+        _ensure_part(package, ext, "commentsExtended.xml")
+        if parent_para is not None:
+            _append_xml(
+                package, ext, "w15:commentsEx",
+                f'<w15:commentEx w15:paraId="{para_id}" w15:paraIdParent="{parent_para}" w15:done="0"/>',
+            )
+        else:
+            _append_xml(
+                package, ext, "w15:commentsEx",
+                f'<w15:commentEx w15:paraId="{para_id}" w15:done="0"/>',
+            )
+
+        ids = "word/commentsIds.xml"
+        _ensure_part(package, ids, "commentsIds.xml")
         _append_xml(
-            ext, "w15:commentsEx",
-            f'<w15:commentEx w15:paraId="{para_id}" w15:done="0"/>',
+            package, ids, "w16cid:commentsIds",
+            f'<w16cid:commentId w16cid:paraId="{para_id}" w16cid:durableId="{durable_id}"/>',
         )
 
-    ids = word / "commentsIds.xml"
-    if not ids.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsIds.xml", ids)
-    _append_xml(
-        ids, "w16cid:commentsIds",
-        f'<w16cid:commentId w16cid:paraId="{para_id}" w16cid:durableId="{durable_id}"/>',
-    )
-
-    extensible = word / "commentsExtensible.xml"
-    if not extensible.exists():
-        shutil.copy(TEMPLATE_DIR / "commentsExtensible.xml", extensible)
-    _append_xml(
-        extensible, "w16cex:commentsExtensible",
-        f'<w16cex:commentExtensible w16cex:durableId="{durable_id}" w16cex:dateUtc="{ts}"/>',
-    )
+        extensible = "word/commentsExtensible.xml"
+        _ensure_part(package, extensible, "commentsExtensible.xml")
+        _append_xml(
+            package, extensible, "w16cex:commentsExtensible",
+            f'<w16cex:commentExtensible w16cex:durableId="{durable_id}" w16cex:dateUtc="{ts}"/>',
+        )
 
     action = "reply" if parent_id is not None else "comment"
     return comment_id, para_id, f"Added {action} id={comment_id} (paraId={para_id})"
@@ -339,16 +340,13 @@ def main() -> None:
             print(msg)
         elif src.is_file() and src.suffix.lower() in (".docx", ".dotx"):
             out = Path(args.output) if args.output else src
-            with tempfile.TemporaryDirectory() as tmp:
-                tmp_path = Path(tmp)
-                with zipfile.ZipFile(src) as zf:
-                    _safe_extract(zf, tmp_path)
+            with Package(src) as package:
                 cid, _, msg = add_comment(
-                    tmp_path, args.text, comment_id=args.comment_id,
+                    package, args.text, comment_id=args.comment_id,
                     author=args.author, initials=args.initials,
                     parent_id=args.parent, raw=args.raw,
                 )
-                _rezip(tmp_path, out)
+                package.save(out)
             print(msg)
             print(f"Wrote {out} (comment defined; add markers to word/document.xml to make it visible)")
         else:
@@ -21,47 +21,52 @@ Usage:
     python merge_runs.py unpacked/                  # after unzip, before editing
     python merge_runs.py document.docx              # rewrite in place
     python merge_runs.py document.docx -o out.docx
+
+merge_runs() also takes an open office.helpers.package.Package, so it can run
+between other edits without the document being unpacked or rezipped.
 """
 
 
 import argparse
 import sys
-import tempfile
 import zipfile
 from pathlib import Path
 
 import defusedxml.minidom
 
-from office.helpers import XML_SPACE, rendered_text, rezip, safe_extract
+from office.helpers import XML_SPACE, rendered_text
+from office.helpers.package import Package, open_package
 
 WORDML_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
 
 
-def merge_runs(input_dir: str) -> tuple[int, str]:
-    doc_xml = Path(input_dir) / "word" / "document.xml"
-
-    if not doc_xml.exists():
-        return 0, f"Error: {doc_xml} not found"
-
+def merge_runs(target: str | Path | Package) -> tuple[int, str]:
+    doc_xml = "word/document.xml"
     try:
-        dom = defusedxml.minidom.parseString(doc_xml.read_text(encoding="utf-8"))
-        root = dom.documentElement
-        run_names = _run_tag_names(root)
+        with open_package(target) as package:
+            if doc_xml not in package:
+                return 0, f"Error: {Path(package.path) / doc_xml} not found"
+            return _merge_document(package, doc_xml)
+    except Exception as e:
+        return 0, f"Error: {e}"
 
-        _remove_elements(root, "proofErr")
 
-        runs = _find_runs(root, run_names)
-        _strip_rsid_attrs(runs)
+def _merge_document(package: Package, doc_xml: str) -> tuple[int, str]:
+    dom = defusedxml.minidom.parseString(package.read(doc_xml))
+    root = dom.documentElement
+    run_names = _run_tag_names(root)
 
-        merge_count = 0
-        for container in {run.parentNode for run in runs}:
-            merge_count += _merge_runs_in(container, run_names)
+    _remove_elements(root, "proofErr")
 
-        doc_xml.write_bytes(dom.toxml(encoding="UTF-8"))
-        return merge_count, f"Merged {merge_count} runs"
+    runs = _find_runs(root, run_names)
+    _strip_rsid_attrs(runs)
 
-    except Exception as e:
-        return 0, f"Error: {e}"
+    merge_count = 0
+    for container in {run.parentNode for run in runs}:
+        merge_count += _merge_runs_in(container, run_names)
+
+    package.write(doc_xml, dom.toxml(encoding="UTF-8"))
+    return merge_count, f"Merged {merge_count} runs"
 
 
 
@@ -263,8 +268,8 @@ def _consolidate_text_elements(run, tag: str):
 
 
 
-def _merge_or_die(path: Path) -> str:
-    _, msg = merge_runs(str(path))
+def _merge_or_die(target: Path | Package) -> str:
+    _, msg = merge_runs(target)
     if msg.startswith("Error"):
         print(msg, file=sys.stderr)
         sys.exit(1)
@@ -291,12 +296,9 @@ def main() -> None:
             print(_merge_or_die(src))
         elif src.is_file() and src.suffix.lower() in (".docx", ".dotx"):
             out = Path(args.output) if args.output else src
-            with tempfile.TemporaryDirectory() as tmp:
-                tmp_path = Path(tmp)
-                with zipfile.ZipFile(src) as zf:
-                    safe_extract(zf, tmp_path)
-                msg = _merge_or_die(tmp_path)
-                rezip(tmp_path, out)
+            with Package(src) as package:
+                msg = _merge_or_die(package)
+                package.save(out)
             print(f"{msg}; wrote {out}")
         else:
             print(f"Error: {src} is neither a directory nor a .docx/.dotx file", file=sys.stderr)
@@ -5,6 +5,7 @@ import stat
 import tempfile
 import urllib.parse
 import zipfile
+from contextlib import contextmanager
 from pathlib import Path
 
 OOXML_FAMILY = {
@@ -82,22 +83,15 @@ def safe_extract(zf: zipfile.ZipFile, dest: Path) -> None:
         zf.extract(m, dest)
 
 
-def rezip(src_dir: Path, out_path: Path) -> None:
-    files = sorted(p for p in src_dir.rglob("*") if p.is_file())
-    ct = src_dir / "[Content_Types].xml"
+@contextmanager
+def atomic_output(out_path: Path):
     fd, tmp_name = tempfile.mkstemp(
         prefix=out_path.name + ".", suffix=".tmp", dir=out_path.parent
     )
     tmp_out = Path(tmp_name)
     try:
         with os.fdopen(fd, "wb") as fh:
-            with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as zf:
-                if ct.exists():
-                    zf.write(ct, ct.relative_to(src_dir), compress_type=zipfile.ZIP_STORED)
-                for f in files:
-                    if f == ct:
-                        continue
-                    zf.write(f, f.relative_to(src_dir))
+            yield fh
         if out_path.exists():
             mode = out_path.stat().st_mode & 0o777
         else:
@@ -109,3 +103,16 @@ def rezip(src_dir: Path, out_path: Path) -> None:
     finally:
         if tmp_out.exists():
             tmp_out.unlink()
+
+
+def rezip(src_dir: Path, out_path: Path) -> None:
+    files = sorted(p for p in src_dir.rglob("*") if p.is_file())
+    ct = src_dir / "[Content_Types].xml"
+    with atomic_output(out_path) as fh:
+        with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as zf:
+            if ct.exists():
+                zf.write(ct, ct.relative_to(src_dir), compress_type=zipfile.ZIP_STORED)
+            for f in files:
+                if f == ct:
+                    continue
+                zf.write(f, f.relative_to(src_dir))
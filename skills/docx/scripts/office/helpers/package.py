@@ -0,0 +1,292 @@
+"""An OPC package held in memory, so a chain of edits loads and saves it once.
+
+A Package opens a .docx/.pptx/.xlsx (or an unpacked directory of one) without
+extracting it. Parts are read on first access, parsed on first dom() call,
+and saving copies every member nobody changed straight from the old archive,
+compressed bytes and all -- only dirty parts, and the rare ZIP64 or encrypted
+member, are deflated again.
+"""
+
+from __future__ import annotations
+
+import os
+import stat
+import struct
+import tempfile
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+import defusedxml.minidom
+
+from . import atomic_output
+
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+_DATA_DESCRIPTOR_FLAG = 0x08
+
+
+class Package:
+    """Parts of an OPC package by name ("word/document.xml"), read lazily.
+
+    write() and delete() change only the in-memory copy; dom() hands out a
+    cached minidom Document, and mark_dirty() records that it was edited.
+    Nothing reaches disk until save().
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._zip: zipfile.ZipFile | None = None
+        self._open()
+
+    def _open(self) -> None:
+        self.close()
+        self._members: dict[str, zipfile.ZipInfo | None] = {}
+        self._data: dict[str, bytes] = {}
+        self._doms: dict = {}
+        self._dirty: set[str] = set()
+        self._names: set[str] = set()
+
+        if self.path.is_dir():
+            for file_path in self.path.rglob("*"):
+                if file_path.is_file():
+                    self._members[file_path.relative_to(self.path).as_posix()] = None
+        else:
+            self._zip = zipfile.ZipFile(self.path)
+            for info in self._zip.infolist():
+                if info.is_dir():
+                    continue
+                if stat.S_ISLNK(info.external_attr >> 16):
+                    raise ValueError(f"symlink archive entry not allowed: {info.filename!r}")
+                self._members[info.filename] = info
+        self._names = set(self._members)
+
+    @property
+    def is_dir(self) -> bool:
+        return self._zip is None
+
+    def close(self) -> None:
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+
+    def reload(self) -> None:
+        """Drop every in-memory change and read self.path again."""
+        self._open()
+
+    def __enter__(self) -> Package:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def names(self) -> list[str]:
+        return sorted(self._names)
+
+    @property
+    def dirty(self) -> set[str]:
+        """Parts written, edited through dom() or deleted since the last save."""
+        return set(self._dirty)
+
+    def size(self, name: str) -> int:
+        info = self._members.get(name)
+        if name in self._dirty or name in self._data or name not in self._members:
+            return len(self.read(name))
+        if info is None:
+            return (self.path / name).stat().st_size
+        return info.file_size
+
+    def read(self, name: str) -> bytes:
+        if name not in self._names:
+            raise KeyError(f"{name} is not in {self.path}")
+        if name in self._doms and name in self._dirty:
+            return self._doms[name].toxml(encoding="UTF-8")
+        if name not in self._data:
+            if self._zip is None:
+                self._data[name] = (self.path / name).read_bytes()
+            else:
+                self._data[name] = self._zip.read(self._members[name])
+        return self._data[name]
+
+    def read_text(self, name: str) -> str:
+        return self.read(name).decode("utf-8")
+
+    def write(self, name: str, data: bytes | str) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._doms.pop(name, None)
+        self._data[name] = data
+        self._names.add(name)
+        self._dirty.add(name)
+
+    def delete(self, name: str) -> None:
+        if name not in self._names:
+            raise KeyError(f"{name} is not in {self.path}")
+        self._names.discard(name)
+        self._data.pop(name, None)
+        self._doms.pop(name, None)
+        if name in self._members:
+            self._dirty.add(name)
+        else:
+            self._dirty.discard(name)
+
+    def dom(self, name: str):
+        """The part parsed with minidom, cached; call mark_dirty() after editing it."""
+        if name not in self._doms:
+            self._doms[name] = defusedxml.minidom.parseString(self.read(name))
+        return self._doms[name]
+
+    def mark_dirty(self, name: str) -> None:
+        if name not in self._doms:
+            raise KeyError(f"{name} was not opened with dom()")
+        self._data.pop(name, None)
+        self._dirty.add(name)
+
+    def extract(self, dest: Path) -> None:
+        """Write the current state of every part under dest."""
+        dest = dest.resolve()
+        for name in self._names:
+            target = (dest / name).resolve()
+            if not target.is_relative_to(dest):
+                raise ValueError(f"unsafe part name: {name!r}")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_bytes(self.read(name))
+
+    def save(self, out: Path | str | None = None) -> Path:
+        """Write the package to out (default: where it came from) and reopen it there.
+
+        An unpacked directory can only be saved in place: dirty parts are
+        rewritten and deleted ones removed, along with any directory that
+        leaves empty. Anywhere else the result is a zip.
+        """
+        out = Path(out) if out is not None else self.path
+        if self.is_dir and out.resolve() == self.path.resolve():
+            self._save_dir()
+        elif out.is_dir():
+            raise ValueError(f"{out} is a directory; only an unpacked package is saved in place")
+        else:
+            self._save_zip(out)
+            self.path = out
+        self._open()
+        return out
+
+    def _save_dir(self) -> None:
+        # Every rewritten part is staged before any file is replaced, so a
+        # failed write leaves the directory as it was.
+        staged = []
+        try:
+            for name in sorted(self._dirty & self._names):
+                file_path = self.path / name
+                file_path.parent.mkdir(parents=True, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.")
+                staged.append((tmp, file_path))
+                with os.fdopen(fd, "wb") as f:
+                    f.write(self.read(name))
+        except BaseException:
+            for tmp, _ in staged:
+                Path(tmp).unlink(missing_ok=True)
+            raise
+        for tmp, file_path in staged:
+            os.replace(tmp, file_path)
+
+        for name in sorted(self._dirty - self._names):
+            file_path = self.path / name
+            if file_path.exists():
+                file_path.unlink()
+                parent = file_path.parent
+                while parent != self.path and not any(parent.iterdir()):
+                    parent.rmdir()
+                    parent = parent.parent
+
+    def _save_zip(self, out: Path) -> None:
+        order = [name for name in self._members if name in self._names]
+        order += sorted(self._names - set(self._members))
+        if CONTENT_TYPES_PART in self._names:
+            order.remove(CONTENT_TYPES_PART)
+            order.insert(0, CONTENT_TYPES_PART)
+
+        with atomic_output(out) as fh:
+            with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as zf:
+                for name in order:
+                    info = self._members.get(name)
+                    clean = info is not None and name not in self._dirty
+                    if clean and _copyable(info) and _copy_member(self._zip, info, zf):
+                        continue
+                    if name == CONTENT_TYPES_PART:
+                        zf.writestr(name, self.read(name), compress_type=zipfile.ZIP_STORED)
+                    elif info is None:
+                        zf.writestr(name, self.read(name), compress_type=zipfile.ZIP_DEFLATED)
+                    else:
+                        copy = zipfile.ZipInfo(name, info.date_time)
+                        copy.external_attr = info.external_attr
+                        copy.create_system = info.create_system
+                        zf.writestr(copy, self.read(name), compress_type=info.compress_type)
+
+
+
+def _copyable(info: zipfile.ZipInfo) -> bool:
+    return (
+        max(info.file_size, info.compress_size, info.header_offset) < zipfile.ZIP64_LIMIT
+        and not info.flag_bits & 0x01
+    )
+
+
+def _copy_member(source: zipfile.ZipFile, info: zipfile.ZipInfo, zf: zipfile.ZipFile) -> bool:
+    # zipfile has no raw-copy API: read the member's compressed bytes past its
+    # local header and append them under a fresh header, keeping ZipFile's
+    # bookkeeping (filelist, start_dir) in step so close() writes a correct
+    # central directory. CRC and sizes come from the central directory and go
+    # in the new header, so a data descriptor the original used is dropped.
+    # Returns False, having written nothing, if the local header is not where
+    # the central directory says; the caller then re-deflates the member.
+    fp = source.fp
+    fp.seek(info.header_offset)
+    header = fp.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size:
+        return False
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        return False
+    name_length, extra_length = fields[-2:]
+    fp.seek(info.header_offset + _LOCAL_HEADER.size + name_length + extra_length)
+    raw = fp.read(info.compress_size)
+    if len(raw) != info.compress_size:
+        return False
+
+    copy = zipfile.ZipInfo(info.filename, info.date_time)
+    copy.compress_type = info.compress_type
+    copy.flag_bits = info.flag_bits & ~_DATA_DESCRIPTOR_FLAG
+    copy.external_attr = info.external_attr
+    copy.create_system = info.create_system
+    copy.CRC = info.CRC
+    copy.compress_size = info.compress_size
+    copy.file_size = info.file_size
+    copy.header_offset = zf.fp.tell()
+    zf.fp.write(copy.FileHeader(zip64=False))
+    zf.fp.write(raw)
+    zf.filelist.append(copy)
+    zf.NameToInfo[copy.filename] = copy
+    zf.start_dir = zf.fp.tell()
+    zf._didModify = True
+    return True
+
+
+@contextmanager
+def open_package(target):
+    """Yield target itself if it is already a Package; otherwise open the path
+    as one and save it in place when the block finishes without raising."""
+    if not isinstance(target, (str, os.PathLike)):
+        yield target
+        return
+    package = Package(target)
+    try:
+        yield package
+        if package.dirty:
+            package.save()
+    finally:
+        package.close()
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from dataclasses import dataclass
 import json
 import sys
@@ -12,34 +13,91 @@ class RectAndField:
     field: dict
 
 
+# Rectangles covering more grid cells than this are kept out of the grid and
+# tested against every candidate instead, so one page-sized box cannot blow
+# up the index.
+MAX_CELLS_PER_RECT = 64
+
+
+def rects_intersect(r1, r2):
+    disjoint_horizontal = r1[0] >= r2[2] or r1[2] <= r2[0]
+    disjoint_vertical = r1[1] >= r2[3] or r1[3] <= r2[1]
+    return not (disjoint_horizontal or disjoint_vertical)
+
+
+class PageGrid:
+    """Uniform-grid index over one page's rectangles.
+
+    Two intersecting rectangles share a point, so they share the grid cell
+    holding it; a query only tests the rectangles filed in its own cells.
+    """
+
+    def __init__(self, indexed_rects: list[tuple[int, list[float]]]):
+        sizes = sorted(
+            max(abs(rect[2] - rect[0]), abs(rect[3] - rect[1])) for _, rect in indexed_rects
+        )
+        self.cell_size = max(sizes[len(sizes) // 2], 1.0) if sizes else 1.0
+        self.rects = dict(indexed_rects)
+        self.cells = defaultdict(list)
+        self.oversized = []
+        for index, rect in indexed_rects:
+            cells = self._cells(rect)
+            if cells is None:
+                self.oversized.append(index)
+            else:
+                for cell in cells:
+                    self.cells[cell].append(index)
+
+    def _cells(self, rect):
+        x0, x1 = sorted((rect[0], rect[2]))
+        y0, y1 = sorted((rect[1], rect[3]))
+        cx0, cx1 = int(x0 // self.cell_size), int(x1 // self.cell_size)
+        cy0, cy1 = int(y0 // self.cell_size), int(y1 // self.cell_size)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > MAX_CELLS_PER_RECT:
+            return None
+        return [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+
+    def intersecting_after(self, index: int) -> list[int]:
+        """Indices greater than `index` whose rectangle intersects its rectangle, ascending."""
+        rect = self.rects[index]
+        cells = self._cells(rect)
+        if cells is None:
+            candidates = self.rects.keys()
+        else:
+            candidates = {j for cell in cells for j in self.cells.get(cell, ())}
+            candidates.update(self.oversized)
+        return sorted(
+            j for j in candidates if j > index and rects_intersect(rect, self.rects[j])
+        )
+
+
 def get_bounding_box_messages(fields_json_stream) -> list[str]:
     messages = []
     fields = json.load(fields_json_stream)
     messages.append(f"Read {len(fields['form_fields'])} fields")
 
-    def rects_intersect(r1, r2):
-        disjoint_horizontal = r1[0] >= r2[2] or r1[2] <= r2[0]
-        disjoint_vertical = r1[1] >= r2[3] or r1[3] <= r2[1]
-        return not (disjoint_horizontal or disjoint_vertical)
-
     rects_and_fields = []
     for f in fields["form_fields"]:
         rects_and_fields.append(RectAndField(f["label_bounding_box"], "label", f))
         rects_and_fields.append(RectAndField(f["entry_bounding_box"], "entry", f))
 
+    by_page = defaultdict(list)
+    for i, rf in enumerate(rects_and_fields):
+        by_page[rf.field["page_number"]].append((i, rf.rect))
+    grids = {page: PageGrid(indexed_rects) for page, indexed_rects in by_page.items()}
+
     has_error = False
     for i, ri in enumerate(rects_and_fields):
-        for j in range(i + 1, len(rects_and_fields)):
+        for j in grids[ri.field["page_number"]].intersecting_after(i):
             rj = rects_and_fields[j]
-            if ri.field["page_number"] == rj.field["page_number"] and rects_intersect(ri.rect, rj.rect):
-                has_error = True
-                if ri.field is rj.field:
-                    messages.append(f"FAILURE: intersection between label and entry bounding boxes for `{ri.field['description']}` ({ri.rect}, {rj.rect})")
-                else:
-                    messages.append(f"FAILURE: intersection between {ri.rect_type} bounding box for `{ri.field['description']}` ({ri.rect}) and {rj.rect_type} bounding box for `{rj.field['description']}` ({rj.rect})")
-                if len(messages) >= 20:
-                    messages.append("Aborting further checks; fix bounding boxes and try again")
-                    return messages
+            has_error = True
+            if ri.field is rj.field:
+                messages.append(f"FAILURE: intersection between label and entry bounding boxes for `{ri.field['description']}` ({ri.rect}, {rj.rect})")
+            else:
+                messages.append(f"FAILURE: intersection between {ri.rect_type} bounding box for `{ri.field['description']}` ({ri.rect}) and {rj.rect_type} bounding box for `{rj.field['description']}` ({rj.rect})")
+            if len(messages) >= 20:
+                messages.append("Aborting further checks; fix bounding boxes and try again")
+                return messages
         if ri.rect_type == "entry":
             if "entry_text" in ri.field:
                 font_size = ri.field["entry_text"].get("font_size", 14)
@@ -1,33 +1,116 @@
 import os
 import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 from pdf2image import convert_from_path
+from PIL import Image
+from pypdf import PdfReader
 
 
+MAX_DPI = 200
+PAGES_PER_BATCH = 8
+# DPIs are rounded down to a multiple of this, so pages of nearly the same
+# size share a DPI and can be rendered in one batch
+DPI_STEP = 5
 
 
-def convert(pdf_path, output_dir, max_dim=1000):
-    images = convert_from_path(pdf_path, dpi=200)
+def page_dpis(pdf_path, max_dim):
+    """Per page, the DPI whose long side lands on (or just under) max_dim, never above MAX_DPI.
 
-    for i, image in enumerate(images):
+    Sizes come from the MediaBox, which is what pdftoppm renders by default,
+    scaled by the page's /UserUnit.
+    """
+    dpis = []
+    for page in PdfReader(pdf_path).pages:
+        box = page.mediabox
+        long_side = max(float(box.width), float(box.height)) * float(page.user_unit)
+        dpi = min(MAX_DPI, 72 * max_dim / long_side) if long_side > 0 else MAX_DPI
+        dpis.append(max(DPI_STEP, int(dpi // DPI_STEP) * DPI_STEP))
+    return dpis
+
+
+def _batches(dpis, pages):
+    """(first_page, last_page, dpi) runs of at most PAGES_PER_BATCH consecutive pages sharing a DPI."""
+    start = 0
+    for i in range(1, len(pages) + 1):
+        if (
+            i == len(pages)
+            or i - start == PAGES_PER_BATCH
+            or pages[i] != pages[i - 1] + 1
+            or dpis[pages[i] - 1] != dpis[pages[start] - 1]
+        ):
+            yield pages[start], pages[i - 1], dpis[pages[start] - 1]
+            start = i
+
+
+def render_pages(pdf_path, output_folder, dpis, pages, threads):
+    """Rasterize pages (sorted, 1-based) into output_folder, one batch at a time.
+
+    Yields a list of (page_number, ppm_path) per batch; the caller removes the
+    files, and the next batch is only rendered when it asks for it.
+    """
+    for first, last, dpi in _batches(dpis, pages):
+        ppm_paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            first_page=first,
+            last_page=last,
+            output_folder=output_folder,
+            paths_only=True,
+            thread_count=min(threads, last - first + 1),
+        )
+        yield list(enumerate(ppm_paths, first))
+
+
+def _save_png(ppm_path, image_path, max_dim):
+    with Image.open(ppm_path) as image:
         width, height = image.size
         if width > max_dim or height > max_dim:
             scale_factor = min(max_dim / width, max_dim / height)
-            new_width = int(width * scale_factor)
-            new_height = int(height * scale_factor)
-            image = image.resize((new_width, new_height))
-        
-        image_path = os.path.join(output_dir, f"page_{i+1}.png")
+            image = image.resize((int(width * scale_factor), int(height * scale_factor)))
         image.save(image_path)
-        print(f"Saved page {i+1} as {image_path} (size: {image.size})")
+        size = image.size
+    os.remove(ppm_path)
+    return size
+
+
+def _report(pending):
+    for page_number, image_path, future in pending:
+        print(f"Saved page {page_number} as {image_path} (size: {future.result()})")
+
+
+def convert(pdf_path, output_dir, max_dim=1000, threads=None):
+    threads = threads or os.cpu_count() or 1
+    dpis = page_dpis(pdf_path, max_dim)
+
+    # pdftoppm writes each batch to disk instead of handing PIL images back,
+    # and a batch's PNGs are encoded on the pool while the next one renders,
+    # so at most two batches of pages exist at once.
+    with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = []
+        for batch in render_pages(pdf_path, tmp, dpis, range(1, len(dpis) + 1), threads):
+            _report(pending)
+            pending = []
+            for page_number, ppm_path in batch:
+                image_path = os.path.join(output_dir, f"page_{page_number}.png")
+                pending.append((page_number, image_path, pool.submit(_save_png, ppm_path, image_path, max_dim)))
+        _report(pending)
 
-    print(f"Converted {len(images)} pages to PNG images")
+    print(f"Converted {len(dpis)} pages to PNG images")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: convert_pdf_to_images.py [input pdf] [output directory]")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].partition("=")[::2] for a in sys.argv[1:] if a.startswith("--"))
+    if len(args) != 2 or set(options) - {"max-dim", "threads"}:
+        print("Usage: convert_pdf_to_images.py [input pdf] [output directory] [--max-dim=1000] [--threads=N]")
         sys.exit(1)
-    pdf_path = sys.argv[1]
-    output_directory = sys.argv[2]
-    convert(pdf_path, output_directory)
+    pdf_path = args[0]
+    output_directory = args[1]
+    convert(
+        pdf_path,
+        output_directory,
+        max_dim=int(options.get("max-dim", 1000)),
+        threads=int(options["threads"]) if "threads" in options else None,
+    )
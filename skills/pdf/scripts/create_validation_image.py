@@ -1,9 +1,19 @@
 import json
+import os
 import sys
+import tempfile
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from PIL import Image, ImageDraw
 
+from convert_pdf_to_images import page_dpis, render_pages
+from extract_form_structure import page_count, parse_page_ranges
 
+SHEET_THUMB_WIDTH = 300
+SHEET_COLS = 5
+SHEET_PADDING = 10
+SHEET_LABEL_HEIGHT = 16
 
 
 def create_validation_image(page_number, fields_json_path, input_path, output_path):
@@ -26,9 +36,128 @@ def create_validation_image(page_number, fields_json_path, input_path, output_pa
         print(f"Created validation image at {output_path} with {num_boxes} bounding boxes")
 
 
+def _draw_page(ppm_path, output_path, fields, page_info, max_dim):
+    # fields.json boxes are top-left-origin in either PDF points (pdf_width)
+    # or the pixels of some earlier rendering (image_width); both scale onto
+    # this rendering by its width and height. Without a pages entry they are
+    # drawn as-is, like the single-page mode does.
+    with Image.open(ppm_path) as image:
+        width, height = image.size
+        if width > max_dim or height > max_dim:
+            scale_factor = min(max_dim / width, max_dim / height)
+            image = image.resize((int(width * scale_factor), int(height * scale_factor)))
+        else:
+            image = image.convert("RGB")
+    os.remove(ppm_path)
+
+    page_info = page_info or {}
+    ref_width = page_info.get("pdf_width") or page_info.get("image_width") or image.width
+    ref_height = page_info.get("pdf_height") or page_info.get("image_height") or image.height
+    sx, sy = image.width / ref_width, image.height / ref_height
+
+    draw = ImageDraw.Draw(image)
+    for field in fields:
+        for key, color in (("entry_bounding_box", "red"), ("label_bounding_box", "blue")):
+            x0, y0, x1, y1 = field[key]
+            draw.rectangle([x0 * sx, y0 * sy, x1 * sx, y1 * sy], outline=color, width=2)
+    image.save(output_path)
+
+    thumb_height = round(image.height * SHEET_THUMB_WIDTH / image.width)
+    return image.resize((SHEET_THUMB_WIDTH, max(thumb_height, 1)))
+
+
+def _contact_sheet(thumbnails, sheet_path):
+    cols = min(SHEET_COLS, len(thumbnails))
+    rows = -(-len(thumbnails) // cols)
+    cell_height = max(thumb.height for _, thumb in thumbnails) + SHEET_LABEL_HEIGHT
+    sheet = Image.new(
+        "RGB",
+        (cols * SHEET_THUMB_WIDTH + (cols + 1) * SHEET_PADDING, rows * cell_height + (rows + 1) * SHEET_PADDING),
+        "white",
+    )
+    draw = ImageDraw.Draw(sheet)
+    for i, (page_number, thumb) in enumerate(thumbnails):
+        x = SHEET_PADDING + (i % cols) * (SHEET_THUMB_WIDTH + SHEET_PADDING)
+        y = SHEET_PADDING + (i // cols) * (cell_height + SHEET_PADDING)
+        draw.text((x, y), f"page {page_number}", fill="black")
+        sheet.paste(thumb, (x, y + SHEET_LABEL_HEIGHT))
+        draw.rectangle([x - 1, y + SHEET_LABEL_HEIGHT - 1, x + thumb.width, y + SHEET_LABEL_HEIGHT + thumb.height], outline="gray")
+    sheet.save(sheet_path)
+
+
+def create_validation_images(fields_json_path, pdf_path, output_dir, pages=None, contact_sheet_path=None, max_dim=1000, threads=None):
+    """Render every page (or just pages) of pdf_path with its boxes from fields.json drawn on.
+
+    fields.json is read once and its boxes grouped by page. Pages are
+    rasterized in batches and overlaid on a thread pool while the next batch
+    renders; each lands in output_dir as page_N.png, and contact_sheet_path,
+    if given, gets one grid image of them all.
+    """
+    with open(fields_json_path) as f:
+        data = json.load(f)
+    fields_by_page = defaultdict(list)
+    for field in data["form_fields"]:
+        fields_by_page[field["page_number"]].append(field)
+    page_info = {page["page_number"]: page for page in data.get("pages", [])}
+
+    threads = threads or os.cpu_count() or 1
+    dpis = page_dpis(pdf_path, max_dim)
+    pages = sorted(set(pages)) if pages else list(range(1, len(dpis) + 1))
+    if pages[0] < 1 or pages[-1] > len(dpis):
+        raise ValueError(f"pages must be within 1-{len(dpis)}")
+    missing = sorted(set(fields_by_page) - set(range(1, len(dpis) + 1)))
+    if missing:
+        print(f"Warning: fields.json has fields on pages {missing}, which {pdf_path} does not have")
+    os.makedirs(output_dir, exist_ok=True)
+
+    thumbnails = []
+
+    def report(pending):
+        for page_number, output_path, future in pending:
+            thumbnails.append((page_number, future.result()))
+            print(f"Created validation image at {output_path} with {2 * len(fields_by_page[page_number])} bounding boxes")
+
+    with tempfile.TemporaryDirectory() as tmp, ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = []
+        for batch in render_pages(pdf_path, tmp, dpis, pages, threads):
+            report(pending)
+            pending = []
+            for page_number, ppm_path in batch:
+                output_path = os.path.join(output_dir, f"page_{page_number}.png")
+                future = pool.submit(
+                    _draw_page, ppm_path, output_path, fields_by_page[page_number], page_info.get(page_number), max_dim
+                )
+                pending.append((page_number, output_path, future))
+        report(pending)
+
+    if contact_sheet_path and thumbnails:
+        _contact_sheet(thumbnails, contact_sheet_path)
+        print(f"Created contact sheet at {contact_sheet_path} with {len(thumbnails)} pages")
+
+
 if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].partition("=")[::2] for a in sys.argv[1:] if a.startswith("--"))
+    if "all" in options:
+        if len(args) != 3 or set(options) - {"all", "pages", "contact-sheet", "max-dim", "threads"}:
+            print("Usage: create_validation_image.py --all [fields.json file] [input pdf] [output directory] "
+                  "[--pages=1-20,31] [--contact-sheet=sheet.png] [--max-dim=1000] [--threads=N]")
+            sys.exit(1)
+        try:
+            create_validation_images(
+                args[0], args[1], args[2],
+                pages=parse_page_ranges(options["pages"], page_count(args[1])) if "pages" in options else None,
+                contact_sheet_path=options.get("contact-sheet") or None,
+                max_dim=int(options.get("max-dim", 1000)),
+                threads=int(options["threads"]) if "threads" in options else None,
+            )
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        sys.exit(0)
     if len(sys.argv) != 5:
         print("Usage: create_validation_image.py [page number] [fields.json file] [input image path] [output image path]")
+        print("       create_validation_image.py --all [fields.json file] [input pdf] [output directory] [--contact-sheet=sheet.png]")
         sys.exit(1)
     page_number = int(sys.argv[1])
     fields_json_path = sys.argv[2]
@@ -1,19 +1,42 @@
+import contextlib
+import hashlib
+import io
 import json
+import os
 import sys
+import tempfile
+from pathlib import Path
 
 from pypdf import PdfReader
+from pypdf.generic import IndirectObject
 
 
+CACHE_VERSION = "1"
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "pdf-field-info"
+)
 
 
-def get_full_annotation_field_id(annotation):
-    components = []
-    while annotation:
-        field_name = annotation.get('/T')
-        if field_name:
-            components.append(field_name)
-        annotation = annotation.get('/Parent')
-    return ".".join(reversed(components)) if components else None
+def get_full_annotation_field_id(annotation, parent_ids=None):
+    """The dotted /T chain from the root field down to annotation.
+
+    parent_ids memoizes the id of every parent already resolved, keyed by its
+    object reference, so the widgets of one group share a single walk.
+    """
+    if parent_ids is None:
+        parent_ids = {}
+    annotation = annotation.get_object()
+    parent_ref = annotation.raw_get("/Parent") if "/Parent" in annotation else None
+    parent_id = None
+    if parent_ref is not None:
+        key = (parent_ref.idnum, parent_ref.generation) if isinstance(parent_ref, IndirectObject) else id(parent_ref)
+        if key not in parent_ids:
+            parent_ids[key] = get_full_annotation_field_id(parent_ref, parent_ids)
+        parent_id = parent_ids[key]
+    field_name = annotation.get('/T')
+    if not field_name:
+        return parent_id
+    return f"{parent_id}.{field_name}" if parent_id else str(field_name)
 
 
 def make_field_dict(field, field_id):
@@ -49,25 +72,36 @@ def get_field_info(reader: PdfReader):
 
     field_info_by_id = {}
     possible_radio_names = set()
+    # Widgets still to be found: each leaf field once, each radio kid once.
+    # When both run out the remaining pages are never loaded.
+    unplaced = set()
+    radio_kids_left = {}
 
     for field_id, field in fields.items():
         if field.get("/Kids"):
             if field.get("/FT") == "/Btn":
                 possible_radio_names.add(field_id)
+                radio_kids_left[field_id] = len(field["/Kids"])
             continue
         field_info_by_id[field_id] = make_field_dict(field, field_id)
+        unplaced.add(field_id)
 
 
     radio_fields_by_id = {}
+    parent_ids = {}
 
     for page_index, page in enumerate(reader.pages):
+        if not unplaced and not any(radio_kids_left.values()):
+            break
         annotations = page.get('/Annots', [])
         for ann in annotations:
-            field_id = get_full_annotation_field_id(ann)
+            field_id = get_full_annotation_field_id(ann, parent_ids)
             if field_id in field_info_by_id:
                 field_info_by_id[field_id]["page"] = page_index + 1
                 field_info_by_id[field_id]["rect"] = ann.get('/Rect')
+                unplaced.discard(field_id)
             elif field_id in possible_radio_names:
+                radio_kids_left[field_id] -= 1
                 try:
                     on_values = [v for v in ann["/AP"]["/N"] if v != "/Off"]
                 except KeyError:
@@ -107,16 +141,72 @@ def get_field_info(reader: PdfReader):
     return sorted_fields
 
 
-def write_field_info(pdf_path: str, json_output_path: str):
-    reader = PdfReader(pdf_path)
-    field_info = get_field_info(reader)
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _store(cache_path: Path, entry):
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=cache_path.stem, suffix=".tmp", dir=cache_path.parent)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_name, cache_path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def load_field_info(pdf_path: str, cache_dir=DEFAULT_CACHE_DIR):
+    """get_field_info for the PDF at pdf_path, cached on disk by its content hash.
+
+    The warnings get_field_info prints are cached with the fields and printed
+    again on a hit. Pass cache_dir=None to always parse.
+    """
+    if cache_dir is None:
+        return get_field_info(PdfReader(pdf_path))
+
+    key = hashlib.sha256(f"{CACHE_VERSION}:{_file_hash(pdf_path)}".encode()).hexdigest()
+    cache_path = Path(cache_dir) / f"{key}.json"
+    try:
+        with open(cache_path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        entry = None
+    if entry is not None:
+        print(entry["messages"], end="")
+        return entry["fields"]
+
+    messages = io.StringIO()
+    with contextlib.redirect_stdout(messages):
+        field_info = get_field_info(PdfReader(pdf_path))
+    print(messages.getvalue(), end="")
+    try:
+        _store(cache_path, {"messages": messages.getvalue(), "fields": field_info})
+    except OSError as e:
+        print(f"Warning: could not write field cache {cache_path}: {e}")
+    return field_info
+
+
+def write_field_info(pdf_path: str, json_output_path: str, cache_dir=DEFAULT_CACHE_DIR):
+    field_info = load_field_info(pdf_path, cache_dir)
     with open(json_output_path, "w") as f:
         json.dump(field_info, f, indent=2)
     print(f"Wrote {len(field_info)} fields to {json_output_path}")
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: extract_form_field_info.py [input pdf] [output json]")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].partition("=")[::2] for a in sys.argv[1:] if a.startswith("--"))
+    if len(args) != 2 or set(options) - {"cache-dir", "no-cache"}:
+        print("Usage: extract_form_field_info.py [input pdf] [output json] [--cache-dir=DIR | --no-cache]")
         sys.exit(1)
-    write_field_info(sys.argv[1], sys.argv[2])
+    if "no-cache" in options:
+        cache_dir = None
+    else:
+        cache_dir = options.get("cache-dir") or DEFAULT_CACHE_DIR
+    write_field_info(args[0], args[1], cache_dir)
@@ -9,105 +9,218 @@ This script analyzes the PDF to find:
 Output: A JSON file with the form structure that can be used to generate
 accurate field coordinates for filling.
 
-Usage: python extract_form_structure.py <input.pdf> <output.json>
+Usage: python extract_form_structure.py <input.pdf> <output.json> [options]
+
+Options:
+  --pages=1-20,31      only these pages (1-based, inclusive ranges)
+  --near=POINTS        keep only labels within POINTS of a detected line or checkbox
+  --jsonl              write one JSON object per page, in page order as each range
+                       finishes, instead of one indented document (for packets of
+                       hundreds of pages)
+  --workers=N          worker processes (default: CPU count; 1 runs in-process)
+
+Pages are split into ranges and extracted in a process pool. Every filter runs
+per page, so with --jsonl only the pages in flight are ever held in memory.
 """
 
 import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+
 import pdfplumber
 
+PAGES_PER_TASK = 8
 
-def extract_form_structure(pdf_path):
-    structure = {
-        "pages": [],
+
+def _near(box, other, margin):
+    dx = max(other["x0"] - box["x1"], box["x0"] - other["x1"], 0)
+    dy = max(other["top"] - box["bottom"], box["top"] - other["bottom"], 0)
+    return dx <= margin and dy <= margin
+
+
+def extract_page(page, near=None):
+    page_num = page.page_number
+    result = {
+        "page_number": page_num,
+        "width": float(page.width),
+        "height": float(page.height),
         "labels": [],
         "lines": [],
         "checkboxes": [],
         "row_boundaries": []
     }
 
-    with pdfplumber.open(pdf_path) as pdf:
-        for page_num, page in enumerate(pdf.pages, 1):
-            structure["pages"].append({
-                "page_number": page_num,
-                "width": float(page.width),
-                "height": float(page.height)
+    for line in page.lines:
+        if abs(float(line["x1"]) - float(line["x0"])) > page.width * 0.5:
+            result["lines"].append({
+                "page": page_num,
+                "y": round(float(line["top"]), 1),
+                "x0": round(float(line["x0"]), 1),
+                "x1": round(float(line["x1"]), 1)
             })
 
-            words = page.extract_words()
-            for word in words:
-                structure["labels"].append({
-                    "page": page_num,
-                    "text": word["text"],
-                    "x0": round(float(word["x0"]), 1),
-                    "top": round(float(word["top"]), 1),
-                    "x1": round(float(word["x1"]), 1),
-                    "bottom": round(float(word["bottom"]), 1)
-                })
-
-            for line in page.lines:
-                if abs(float(line["x1"]) - float(line["x0"])) > page.width * 0.5:
-                    structure["lines"].append({
-                        "page": page_num,
-                        "y": round(float(line["top"]), 1),
-                        "x0": round(float(line["x0"]), 1),
-                        "x1": round(float(line["x1"]), 1)
-                    })
-
-            for rect in page.rects:
-                width = float(rect["x1"]) - float(rect["x0"])
-                height = float(rect["bottom"]) - float(rect["top"])
-                if 5 <= width <= 15 and 5 <= height <= 15 and abs(width - height) < 2:
-                    structure["checkboxes"].append({
-                        "page": page_num,
-                        "x0": round(float(rect["x0"]), 1),
-                        "top": round(float(rect["top"]), 1),
-                        "x1": round(float(rect["x1"]), 1),
-                        "bottom": round(float(rect["bottom"]), 1),
-                        "center_x": round((float(rect["x0"]) + float(rect["x1"])) / 2, 1),
-                        "center_y": round((float(rect["top"]) + float(rect["bottom"])) / 2, 1)
-                    })
-
-    lines_by_page = {}
-    for line in structure["lines"]:
-        page = line["page"]
-        if page not in lines_by_page:
-            lines_by_page[page] = []
-        lines_by_page[page].append(line["y"])
-
-    for page, y_coords in lines_by_page.items():
-        y_coords = sorted(set(y_coords))
-        for i in range(len(y_coords) - 1):
-            structure["row_boundaries"].append({
-                "page": page,
-                "row_top": y_coords[i],
-                "row_bottom": y_coords[i + 1],
-                "row_height": round(y_coords[i + 1] - y_coords[i], 1)
+    for rect in page.rects:
+        width = float(rect["x1"]) - float(rect["x0"])
+        height = float(rect["bottom"]) - float(rect["top"])
+        if 5 <= width <= 15 and 5 <= height <= 15 and abs(width - height) < 2:
+            result["checkboxes"].append({
+                "page": page_num,
+                "x0": round(float(rect["x0"]), 1),
+                "top": round(float(rect["top"]), 1),
+                "x1": round(float(rect["x1"]), 1),
+                "bottom": round(float(rect["bottom"]), 1),
+                "center_x": round((float(rect["x0"]) + float(rect["x1"])) / 2, 1),
+                "center_y": round((float(rect["top"]) + float(rect["bottom"])) / 2, 1)
             })
 
+    anchors = [
+        {"x0": line["x0"], "x1": line["x1"], "top": line["y"], "bottom": line["y"]}
+        for line in result["lines"]
+    ] + result["checkboxes"]
+
+    for word in page.extract_words():
+        label = {
+            "page": page_num,
+            "text": word["text"],
+            "x0": round(float(word["x0"]), 1),
+            "top": round(float(word["top"]), 1),
+            "x1": round(float(word["x1"]), 1),
+            "bottom": round(float(word["bottom"]), 1)
+        }
+        if near is None or any(_near(label, anchor, near) for anchor in anchors):
+            result["labels"].append(label)
+
+    y_coords = sorted({line["y"] for line in result["lines"]})
+    for i in range(len(y_coords) - 1):
+        result["row_boundaries"].append({
+            "page": page_num,
+            "row_top": y_coords[i],
+            "row_bottom": y_coords[i + 1],
+            "row_height": round(y_coords[i + 1] - y_coords[i], 1)
+        })
+
+    return result
+
+
+def _iter_pages(pdf_path, page_numbers, near):
+    with pdfplumber.open(pdf_path, pages=page_numbers) as pdf:
+        for page in pdf.pages:
+            yield extract_page(page, near)
+            page.close()
+
+
+def _extract_pages(pdf_path, page_numbers, near):
+    return list(_iter_pages(pdf_path, page_numbers, near))
+
+
+def page_count(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+
+def parse_page_ranges(spec, total):
+    pages = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        first, last = int(first), int(last or first)
+        if not 1 <= first <= last <= total:
+            raise ValueError(f"page range {part!r} is outside 1-{total}")
+        pages.extend(range(first, last + 1))
+    return sorted(set(pages))
+
+
+def iter_page_structures(pdf_path, pages=None, near=None, workers=None):
+    """Yield one dict per page, in page order, extracting ranges in parallel."""
+    if pages is None:
+        pages = list(range(1, page_count(pdf_path) + 1))
+    tasks = [pages[i:i + PAGES_PER_TASK] for i in range(0, len(pages), PAGES_PER_TASK)]
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    if workers <= 1:
+        yield from _iter_pages(pdf_path, pages, near)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for results in pool.map(_extract_pages, [pdf_path] * len(tasks), tasks, [near] * len(tasks)):
+            yield from results
+
+
+def extract_form_structure(pdf_path, pages=None, near=None, workers=None):
+    structure = {
+        "pages": [],
+        "labels": [],
+        "lines": [],
+        "checkboxes": [],
+        "row_boundaries": []
+    }
+
+    for page in iter_page_structures(pdf_path, pages, near, workers):
+        structure["pages"].append({
+            "page_number": page["page_number"],
+            "width": page["width"],
+            "height": page["height"]
+        })
+        for key in ("labels", "lines", "checkboxes", "row_boundaries"):
+            structure[key].extend(page[key])
+
     return structure
 
 
+def _option(options, name, kind, description, minimum):
+    if name not in options:
+        return None
+    try:
+        value = kind(options[name])
+    except ValueError:
+        value = None
+    # not value >= minimum also rejects NaN
+    if value is None or not value >= minimum:
+        raise ValueError(f"--{name} must be {description}; got {options[name]!r}")
+    return value
+
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: extract_form_structure.py <input.pdf> <output.json>")
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].partition("=")[::2] for a in sys.argv[1:] if a.startswith("--"))
+    unknown = set(options) - {"pages", "near", "jsonl", "workers"}
+    if len(args) != 2 or unknown:
+        print("Usage: extract_form_structure.py <input.pdf> <output.json> "
+              "[--pages=1-20,31] [--near=POINTS] [--jsonl] [--workers=N]")
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
-    output_path = sys.argv[2]
+    pdf_path = args[0]
+    output_path = args[1]
+    try:
+        near = _option(options, "near", float, "a number of points, 0 or more", 0)
+        workers = _option(options, "workers", int, "a whole number, 1 or more", 1)
+        pages = parse_page_ranges(options["pages"], page_count(pdf_path)) if "pages" in options else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
 
     print(f"Extracting structure from {pdf_path}...")
-    structure = extract_form_structure(pdf_path)
-
-    with open(output_path, "w") as f:
-        json.dump(structure, f, indent=2)
+    counts = {"pages": 0, "labels": 0, "lines": 0, "checkboxes": 0, "row_boundaries": 0}
+
+    if "jsonl" in options:
+        with open(output_path, "w") as f:
+            for page in iter_page_structures(pdf_path, pages, near, workers):
+                f.write(json.dumps(page) + "\n")
+                counts["pages"] += 1
+                for key in ("labels", "lines", "checkboxes", "row_boundaries"):
+                    counts[key] += len(page[key])
+    else:
+        structure = extract_form_structure(pdf_path, pages, near, workers)
+        with open(output_path, "w") as f:
+            json.dump(structure, f, indent=2)
+        counts = {key: len(value) for key, value in structure.items()}
 
     print(f"Found:")
-    print(f"  - {len(structure['pages'])} pages")
-    print(f"  - {len(structure['labels'])} text labels")
-    print(f"  - {len(structure['lines'])} horizontal lines")
-    print(f"  - {len(structure['checkboxes'])} checkboxes")
-    print(f"  - {len(structure['row_boundaries'])} row boundaries")
+    print(f"  - {counts['pages']} pages")
+    print(f"  - {counts['labels']} text labels")
+    print(f"  - {counts['lines']} horizontal lines")
+    print(f"  - {counts['checkboxes']} checkboxes")
+    print(f"  - {counts['row_boundaries']} row boundaries")
     print(f"Saved to {output_path}")
 
 
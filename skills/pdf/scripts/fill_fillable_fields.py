@@ -1,9 +1,13 @@
+import csv
 import json
+import os
+import re
 import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 
 from pypdf import PdfReader, PdfWriter
 
-from extract_form_field_info import get_field_info
+from extract_form_field_info import load_field_info
 
 
 
@@ -11,47 +15,175 @@ from extract_form_field_info import get_field_info
 def fill_pdf_fields(input_pdf_path: str, fields_json_path: str, output_pdf_path: str):
     with open(fields_json_path) as f:
         fields = json.load(f)
-    fields_by_page = {}
-    for field in fields:
-        if "value" in field:
-            field_id = field["field_id"]
-            page = field["page"]
-            if page not in fields_by_page:
-                fields_by_page[page] = {}
-            fields_by_page[page][field_id] = field["value"]
-    
+
     reader = PdfReader(input_pdf_path)
 
-    has_error = False
-    field_info = get_field_info(reader)
+    field_info = load_field_info(input_pdf_path)
     fields_by_ids = {f["field_id"]: f for f in field_info}
+    errors = field_value_errors(fields, fields_by_ids)
+    for err in errors:
+        print(err)
+    if errors:
+        sys.exit(1)
+
+    write_filled_pdf(reader, fields, output_pdf_path)
+
+
+def field_value_errors(fields, fields_by_ids) -> list[str]:
+    errors = []
     for field in fields:
         existing_field = fields_by_ids.get(field["field_id"])
         if not existing_field:
-            has_error = True
-            print(f"ERROR: `{field['field_id']}` is not a valid field ID")
+            errors.append(f"ERROR: `{field['field_id']}` is not a valid field ID")
         elif field["page"] != existing_field["page"]:
-            has_error = True
-            print(f"ERROR: Incorrect page number for `{field['field_id']}` (got {field['page']}, expected {existing_field['page']})")
+            errors.append(f"ERROR: Incorrect page number for `{field['field_id']}` (got {field['page']}, expected {existing_field['page']})")
         else:
             if "value" in field:
                 err = validation_error_for_field_value(existing_field, field["value"])
                 if err:
-                    print(err)
-                    has_error = True
-    if has_error:
-        sys.exit(1)
+                    errors.append(err)
+    return errors
+
+
+def write_filled_pdf(reader: PdfReader, fields, output_pdf_path: str):
+    fields_by_page = {}
+    for field in fields:
+        if "value" in field:
+            field_id = field["field_id"]
+            page = field["page"]
+            if page not in fields_by_page:
+                fields_by_page[page] = {}
+            fields_by_page[page][field_id] = field["value"]
 
     writer = PdfWriter(clone_from=reader)
     for page, field_values in fields_by_page.items():
         writer.update_page_form_field_values(writer.pages[page - 1], field_values, auto_regenerate=False)
 
     writer.set_need_appearances_writer(True)
-    
+
     with open(output_pdf_path, "wb") as f:
         writer.write(f)
 
 
+def _record_fields(record) -> list:
+    """A parsed .jsonl record as a fields.json-style list; ValueError if it is neither form."""
+    if isinstance(record, dict):
+        return [{"field_id": k, "value": v} for k, v in record.items()]
+    if isinstance(record, list) and all(isinstance(f, dict) and "field_id" in f for f in record):
+        return record
+    raise ValueError('expected an object of field values or a list of {"field_id", "page", "value"} entries')
+
+
+def read_records(records_path: str):
+    """Yield (line number, field list, error) per record, fields in fields.json
+    form minus the pages; a record that cannot be read has no field list but an
+    error message instead, so the caller can report it and go on.
+
+    A .csv has one column per field id; an empty cell leaves that field alone.
+    Each line of a .jsonl is either an object mapping field id to value, or a
+    list of {"field_id", "page", "value"} entries exactly like fields.json.
+    """
+    with open(records_path, newline="") as f:
+        if records_path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, [{"field_id": k, "value": v} for k, v in row.items() if k and v not in (None, "")], None
+        else:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield line_no, _record_fields(json.loads(line)), None
+                except ValueError as e:
+                    yield line_no, None, f"ERROR: cannot read record: {e}"
+
+
+def _record_output_name(record, line_no, name_field):
+    value = next((f.get("value") for f in record if f["field_id"] == name_field), None) if name_field else None
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", str(value)).strip("._") if value not in (None, "") else ""
+    return f"{stem or f'record_{line_no}'}.pdf"
+
+
+_template_reader = None
+
+
+def _init_batch_worker(input_pdf_path: str):
+    global _template_reader
+    monkeypatch_pydpf_method()
+    _template_reader = PdfReader(input_pdf_path)
+
+
+def _fill_record(fields, output_pdf_path: str):
+    write_filled_pdf(_template_reader, fields, output_pdf_path)
+    return output_pdf_path
+
+
+def fill_pdf_batch(input_pdf_path: str, records_path: str, output_dir: str, name_field=None, workers=None) -> int:
+    """Fill one output per record from a single parse of the template.
+
+    Field metadata is read once; every record is checked against it before
+    being handed to a worker process (each of which opens the template once),
+    and a bad record, or a line that is not a record at all, is reported by
+    its line number and skipped without stopping the rest.
+    Returns the number of records that failed.
+    """
+    field_info = load_field_info(input_pdf_path)
+    fields_by_ids = {f["field_id"]: f for f in field_info}
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    failed = written = 0
+    in_flight = {}
+    used_names = set()
+
+    def collect(done):
+        nonlocal failed, written
+        for future in done:
+            line_no = in_flight.pop(future)
+            try:
+                print(f"record {line_no}: wrote {future.result()}")
+                written += 1
+            except Exception as e:
+                print(f"record {line_no}: ERROR: {e}")
+                failed += 1
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker, initargs=(input_pdf_path,)) as pool:
+        for line_no, record, error in read_records(records_path):
+            try:
+                if error is None:
+                    for field in record:
+                        if "page" not in field and field["field_id"] in fields_by_ids:
+                            field["page"] = fields_by_ids[field["field_id"]]["page"]
+                    errors = field_value_errors(record, fields_by_ids)
+                else:
+                    errors = [error]
+            except (KeyError, TypeError, ValueError) as e:
+                errors = [f"ERROR: malformed record: {type(e).__name__}: {e}"]
+            if errors:
+                for err in errors:
+                    print(f"record {line_no}: {err}")
+                failed += 1
+                continue
+            name = _record_output_name(record, line_no, name_field)
+            if name in used_names:
+                # Another record may be named stem_N itself: count on until free
+                stem, suffix = name[:-4], f"_{line_no}"
+                name = f"{stem}{suffix}.pdf"
+                extra = 1
+                while name in used_names:
+                    extra += 1
+                    name = f"{stem}{suffix}_{extra}.pdf"
+            used_names.add(name)
+            output_pdf_path = os.path.join(output_dir, name)
+            in_flight[pool.submit(_fill_record, record, output_pdf_path)] = line_no
+            if len(in_flight) >= workers * 4:
+                collect(wait(in_flight, return_when=FIRST_COMPLETED).done)
+        collect(list(in_flight))
+
+    print(f"Filled {written} of {written + failed} records into {output_dir}")
+    return failed
+
+
 def validation_error_for_field_value(field_info, field_value):
     field_type = field_info["type"]
     field_id = field_info["field_id"]
@@ -76,6 +208,8 @@ def monkeypatch_pydpf_method():
     from pypdf.constants import FieldDictionaryAttributes
 
     original_get_inherited = DictionaryObject.get_inherited
+    if getattr(original_get_inherited, "_opt_pairs_patched", False):
+        return
 
     def patched_get_inherited(self, key: str, default = None):
         result = original_get_inherited(self, key, default)
@@ -84,12 +218,27 @@ def monkeypatch_pydpf_method():
                 result = [r[0] for r in result]
         return result
 
+    patched_get_inherited._opt_pairs_patched = True
     DictionaryObject.get_inherited = patched_get_inherited
 
 
 if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    options = dict(a[2:].partition("=")[::2] for a in sys.argv[1:] if a.startswith("--"))
+    if "batch" in options:
+        if len(args) != 3 or set(options) - {"batch", "name-field", "workers"}:
+            print("Usage: fill_fillable_fields.py --batch [input pdf] [records.jsonl|records.csv] [output dir] [--name-field=FIELD_ID] [--workers=N]")
+            sys.exit(1)
+        monkeypatch_pydpf_method()
+        failed = fill_pdf_batch(
+            args[0], args[1], args[2],
+            name_field=options.get("name-field"),
+            workers=int(options["workers"]) if "workers" in options else None,
+        )
+        sys.exit(1 if failed else 0)
     if len(sys.argv) != 4:
         print("Usage: fill_fillable_fields.py [input pdf] [field_values.json] [output pdf]")
+        print("       fill_fillable_fields.py --batch [input pdf] [records.jsonl|records.csv] [output dir]")
         sys.exit(1)
     monkeypatch_pydpf_method()
     input_pdf = sys.argv[1]
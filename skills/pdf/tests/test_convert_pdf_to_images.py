@@ -0,0 +1,45 @@
+"""Tests for scripts/convert_pdf_to_images.py."""
+import sys
+from pathlib import Path
+
+from pypdf import PdfWriter
+from pypdf.generic import NameObject, NumberObject, RectangleObject
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from convert_pdf_to_images import DPI_STEP, page_dpis  # noqa: E402
+
+
+def _pdf(path, pages):
+    """Write a PDF of blank pages given as (width, height, cropbox or None, user_unit)."""
+    writer = PdfWriter()
+    for width, height, cropbox, user_unit in pages:
+        page = writer.add_blank_page(width, height)
+        if cropbox is not None:
+            page.cropbox = RectangleObject(cropbox)
+        if user_unit != 1:
+            page[NameObject("/UserUnit")] = NumberObject(user_unit)
+    writer.write(path)
+    return str(path)
+
+
+def test_dpi_is_sized_from_the_mediabox_that_pdftoppm_renders(tmp_path):
+    path = _pdf(tmp_path / "doc.pdf", [
+        (612, 792, None, 1),
+        # A cropped page still renders at its full MediaBox
+        (612, 792, (100, 100, 400, 500), 1),
+        (306, 396, None, 2),
+    ])
+
+    dpis = page_dpis(path, 1000)
+
+    assert dpis[0] == dpis[1] == dpis[2]
+    assert all(dpi % DPI_STEP == 0 for dpi in dpis)
+    assert 792 * dpis[1] / 72 <= 1000 < 792 * (dpis[1] + DPI_STEP) / 72
+
+
+def test_dpi_never_exceeds_max_dpi(tmp_path):
+    path = _pdf(tmp_path / "small.pdf", [(72, 72, None, 1)])
+
+    assert page_dpis(path, 1000) == [200]
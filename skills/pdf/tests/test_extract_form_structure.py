@@ -0,0 +1,20 @@
+"""Tests for scripts/extract_form_structure.py."""
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+
+
+@pytest.mark.parametrize("option", ["--near=abc", "--near=-1", "--near=nan", "--workers=x", "--workers=0"])
+def test_bad_option_values_are_reported_without_a_traceback(tmp_path, option):
+    result = subprocess.run(
+        [sys.executable, str(SCRIPT_DIR / "extract_form_structure.py"),
+         str(tmp_path / "form.pdf"), str(tmp_path / "form.json"), option],
+        capture_output=True, text=True,
+    )
+    assert result.returncode == 1
+    assert result.stdout.startswith(f"Error: {option.partition('=')[0]} must be")
+    assert "Traceback" not in result.stderr
@@ -8,10 +8,10 @@ Does all of the package bookkeeping, so the deck stays valid:
   - inserts <p:sldId id="..." r:id="..."/> with a fresh id into
     <p:sldIdLst> — at the end, or after --after SLIDE
 
-Works on an unpacked directory (during an editing session) or directly on a
-.pptx/.potx file (extracted to a temp dir, then rezipped atomically; the
-temp dir is discarded, so unpack the output if you still need to edit the
-new slide's content).
+Works on an unpacked directory (during an editing session), directly on a
+.pptx/.potx file (edited in memory and rewritten atomically, so unpack the
+output if you still need to edit the new slide's content), or on an open
+office.helpers.package.Package shared with other scripts.
 
 Usage:
     python add_slide.py unpacked/ slide2.xml                 # duplicate slide2
@@ -19,6 +19,12 @@ Usage:
     python add_slide.py unpacked/ slide2.xml --after slide2.xml
     python add_slide.py deck.pptx slide2.xml                 # rewrite deck.pptx in place
     python add_slide.py deck.pptx slide2.xml -o out.pptx
+    python add_slide.py unpacked/ --batch ops.txt            # many slides, one transaction
+
+A batch file holds one "SOURCE [AFTER]" per line. The three registry parts
+are read once and written once, after every line has succeeded; if any line
+fails, nothing is written and the deck is left as it was. An AFTER may name
+a slide created earlier in the batch.
 
 A duplicated slide still holds the source's content: edit ppt/slides/slideN.xml
 (printed on success) to change it. To list layouts: ls <dir>/ppt/slideLayouts/
@@ -26,14 +32,12 @@ A duplicated slide still holds the source's content: edit ppt/slides/slideN.xml
 
 import argparse
 import re
-import shutil
 import sys
 from typing import NoReturn
-import tempfile
 import zipfile
 from pathlib import Path
 
-from office.helpers import rezip, safe_extract
+from office.helpers.package import Package, open_package
 
 MINIMAL_SLIDE_XML = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <p:sld xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main">
@@ -73,9 +77,9 @@ def _die(msg: str) -> NoReturn:
     sys.exit(1)
 
 
-def get_next_slide_number(slides_dir: Path) -> int:
-    existing = [int(m.group(1)) for f in slides_dir.glob("slide*.xml")
-                if (m := re.match(r"slide(\d+)\.xml", f.name))]
+def get_next_slide_number(package: Package) -> int:
+    existing = [int(m.group(1)) for name in package.names()
+                if (m := re.fullmatch(r"ppt/slides/slide(\d+)\.xml", name))]
     return max(existing) + 1 if existing else 1
 
 
@@ -86,77 +90,112 @@ def parse_source(source: str) -> tuple[str, str | None]:
     return ("slide", None)
 
 
-def create_slide_from_layout(unpacked_dir: Path, layout_file: str, after: str | None = None) -> str:
-    slides_dir = unpacked_dir / "ppt" / "slides"
-    rels_dir = slides_dir / "_rels"
-    layout_path = unpacked_dir / "ppt" / "slideLayouts" / layout_file
-
-    if not layout_path.exists():
-        _die(f"{layout_path} not found")
-
-    next_num = get_next_slide_number(slides_dir)
-    dest = f"slide{next_num}.xml"
-    after_rid = _precheck_registration(unpacked_dir, after, dest)
-    slides_dir.mkdir(parents=True, exist_ok=True)
-
-    (slides_dir / dest).write_text(MINIMAL_SLIDE_XML, encoding="utf-8")
-
-    rels_dir.mkdir(exist_ok=True)
+class SlideRegistry:
+    """presentation.xml, its .rels and [Content_Types].xml, held in memory.
+
+    Slide numbers, rIds and slide ids are allocated against the in-memory
+    text, so any number of additions read and write each part once. Slide
+    parts added along the way are recorded and removed by rollback().
+    """
+
+    PRESENTATION = "ppt/presentation.xml"
+    PRESENTATION_RELS = "ppt/_rels/presentation.xml.rels"
+    CONTENT_TYPES = "[Content_Types].xml"
+
+    def __init__(self, package: Package):
+        self.package = package
+        if self.PRESENTATION not in package:
+            _die(f"{package.path} has no {self.PRESENTATION} — is this a PPTX?")
+        self.pres_xml = package.read_text(self.PRESENTATION)
+        self.pres_rels = package.read_text(self.PRESENTATION_RELS) if self.PRESENTATION_RELS in package else ""
+        self.content_types = package.read_text(self.CONTENT_TYPES) if self.CONTENT_TYPES in package else ""
+
+        self.next_slide_number = get_next_slide_number(package)
+        self.used_rids = {int(n) for n in re.findall(r'\bId="rId(\d+)"', self.pres_rels)}
+        self.used_rids |= {int(n) for n in re.findall(r'\br:id="rId(\d+)"', self.pres_xml)}
+        self.used_slide_ids = {int(m) for m in re.findall(r'<p:sldId[^>]*\bid="(\d+)"', self.pres_xml)}
+        self.written: list[str] = []
+        self.messages: list[str] = []
+
+    def allocate_slide_name(self) -> str:
+        dest = f"slide{self.next_slide_number}.xml"
+        self.next_slide_number += 1
+        return dest
+
+    def write(self, name: str, content: str | bytes) -> None:
+        self.written.append(name)
+        self.package.write(name, content)
+
+    def commit(self) -> None:
+        self.package.write(self.CONTENT_TYPES, self.content_types)
+        self.package.write(self.PRESENTATION_RELS, self.pres_rels)
+        self.package.write(self.PRESENTATION, self.pres_xml)
+        self.written.clear()
+        for message in self.messages:
+            print(message)
+
+    def rollback(self) -> None:
+        for name in reversed(self.written):
+            if name in self.package:
+                self.package.delete(name)
+        self.written.clear()
+        self.messages.clear()
+
+
+def create_slide_from_layout(registry: SlideRegistry, layout_file: str, after: str | None = None) -> str:
+    if f"ppt/slideLayouts/{layout_file}" not in registry.package:
+        _die(f"ppt/slideLayouts/{layout_file} not found in {registry.package.path}")
+
+    dest = registry.allocate_slide_name()
+    after_rid = _precheck_registration(registry, after, dest)
+
+    registry.write(f"ppt/slides/{dest}", MINIMAL_SLIDE_XML)
     rels_xml = f'''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
 <Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
   <Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/slideLayout" Target="../slideLayouts/{layout_file}"/>
 </Relationships>'''
-    (rels_dir / f"{dest}.rels").write_text(rels_xml, encoding="utf-8")
+    registry.write(f"ppt/slides/_rels/{dest}.rels", rels_xml)
 
-    _register_slide(unpacked_dir, dest, layout_file, after_rid)
+    _register_slide(registry, dest, layout_file, after_rid)
     return dest
 
 
-def duplicate_slide(unpacked_dir: Path, source: str, after: str | None = None) -> str:
-    slides_dir = unpacked_dir / "ppt" / "slides"
-    rels_dir = slides_dir / "_rels"
-    source_slide = slides_dir / source
+def duplicate_slide(registry: SlideRegistry, source: str, after: str | None = None) -> str:
+    package = registry.package
+    source_slide = f"ppt/slides/{source}"
 
-    if not source_slide.exists():
-        _die(f"{source_slide} not found")
+    if source_slide not in package:
+        _die(f"{source_slide} not found in {package.path}")
 
-    next_num = get_next_slide_number(slides_dir)
-    dest = f"slide{next_num}.xml"
-    after_rid = _precheck_registration(unpacked_dir, after, dest)
+    dest = registry.allocate_slide_name()
+    after_rid = _precheck_registration(registry, after, dest)
 
-    shutil.copy2(source_slide, slides_dir / dest)
+    registry.write(f"ppt/slides/{dest}", package.read(source_slide))
 
-    source_rels = rels_dir / f"{source}.rels"
+    source_rels = f"ppt/slides/_rels/{source}.rels"
     shared_parts: list[str] = []
-    if source_rels.exists():
-        dest_rels = rels_dir / f"{dest}.rels"
-        shutil.copy2(source_rels, dest_rels)
-        rels_content = dest_rels.read_text(encoding="utf-8")
+    if source_rels in package:
         rels_content = RELATIONSHIP_RE.sub(
             lambda m: "" if NOTES_SLIDE_TYPE_RE.search(m.group(0)) else m.group(0),
-            rels_content,
+            package.read_text(source_rels),
         )
-        dest_rels.write_text(rels_content, encoding="utf-8")
+        registry.write(f"ppt/slides/_rels/{dest}.rels", rels_content)
         shared_parts = sorted({
             t for t in re.findall(r'Type="[^"]*/relationships/(\w+)"', rels_content)
             if t in SHARED_PART_TYPES
         })
 
-    _register_slide(unpacked_dir, dest, source, after_rid)
+    _register_slide(registry, dest, source, after_rid)
     if shared_parts:
-        print(
+        registry.messages.append(
             f"Note: {dest} shares its {', '.join(shared_parts)} part(s) with {source} "
             f"(they are referenced, not copied) — editing those parts changes both slides"
         )
     return dest
 
 
-def _precheck_registration(unpacked_dir: Path, after: str | None, dest: str) -> str | None:
-    pres_path = unpacked_dir / "ppt" / "presentation.xml"
-    if not pres_path.exists():
-        _die(f"{pres_path} not found — is this an unpacked PPTX?")
-    xml = pres_path.read_text(encoding="utf-8")
-
+def _precheck_registration(registry: SlideRegistry, after: str | None, dest: str) -> str | None:
+    xml = registry.pres_xml
     has_slot = (
         "</p:sldIdLst>" in xml
         or re.search(r"<p:sldIdLst\s*/>", xml)
@@ -166,13 +205,9 @@ def _precheck_registration(unpacked_dir: Path, after: str | None, dest: str) ->
         _die("presentation.xml has no <p:sldIdLst> (or <p:sldMasterIdLst> to anchor a new one)")
 
     stale = []
-    content_types = unpacked_dir / "[Content_Types].xml"
-    if content_types.exists() and f'PartName="/ppt/slides/{dest}"' in content_types.read_text(encoding="utf-8"):
+    if f'PartName="/ppt/slides/{dest}"' in registry.content_types:
         stale.append("[Content_Types].xml")
-    pres_rels = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-    if pres_rels.exists() and _find_slide_relationship(
-        pres_rels.read_text(encoding="utf-8"), dest
-    ):
+    if _find_slide_relationship(registry.pres_rels, dest):
         stale.append("presentation.xml.rels")
     if stale:
         _die(
@@ -182,52 +217,49 @@ def _precheck_registration(unpacked_dir: Path, after: str | None, dest: str) ->
 
     if not after:
         return None
-    after_rid = _rid_for_slide(unpacked_dir, after)
+    after_rid = _rid_for_slide(registry, after)
     if not re.search(rf'<p:sldId\b[^>]*r:id="{re.escape(after_rid)}"[^>]*>', xml):
         _die(f"{after} ({after_rid}) is not listed in <p:sldIdLst>")
     return after_rid
 
 
-def _register_slide(unpacked_dir: Path, dest: str, source_desc: str, after_rid: str | None) -> None:
-    _add_to_content_types(unpacked_dir, dest)
-    rid = _add_to_presentation_rels(unpacked_dir, dest)
-    slide_id = _get_next_slide_id(unpacked_dir)
-    pos, total = _insert_into_sld_id_lst(unpacked_dir, slide_id, rid, after_rid)
+def _register_slide(registry: SlideRegistry, dest: str, source_desc: str, after_rid: str | None) -> None:
+    _add_to_content_types(registry, dest)
+    rid = _add_to_presentation_rels(registry, dest)
+    slide_id = _get_next_slide_id(registry)
+    pos, total = _insert_into_sld_id_lst(registry, slide_id, rid, after_rid)
 
-    print(f"Created ppt/slides/{dest} from {source_desc}")
-    print(
+    registry.messages.append(f"Created ppt/slides/{dest} from {source_desc}")
+    registry.messages.append(
         f'Inserted <p:sldId id="{slide_id}" r:id="{rid}"/> into <p:sldIdLst> '
         f"at position {pos} of {total}"
     )
 
 
-def _add_to_content_types(unpacked_dir: Path, dest: str) -> None:
-    content_types_path = unpacked_dir / "[Content_Types].xml"
-    content_types = content_types_path.read_text(encoding="utf-8")
+def _add_to_content_types(registry: SlideRegistry, dest: str) -> None:
+    if not registry.content_types:
+        _die(f"{registry.package.path} has no {registry.CONTENT_TYPES} — is this a PPTX?")
 
     new_override = f'<Override PartName="/ppt/slides/{dest}" ContentType="application/vnd.openxmlformats-officedocument.presentationml.slide+xml"/>'
 
-    if f'PartName="/ppt/slides/{dest}"' not in content_types:
-        content_types = content_types.replace("</Types>", f"  {new_override}\n</Types>")
-        content_types_path.write_text(content_types, encoding="utf-8")
+    if f'PartName="/ppt/slides/{dest}"' not in registry.content_types:
+        registry.content_types = registry.content_types.replace("</Types>", f"  {new_override}\n</Types>")
 
 
-def _add_to_presentation_rels(unpacked_dir: Path, dest: str) -> str:
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-    pres_rels = pres_rels_path.read_text(encoding="utf-8")
+def _add_to_presentation_rels(registry: SlideRegistry, dest: str) -> str:
+    if not registry.pres_rels:
+        _die(f"{registry.package.path} has no {registry.PRESENTATION_RELS} — is this a PPTX?")
 
-    existing = _find_slide_relationship(pres_rels, dest)
+    existing = _find_slide_relationship(registry.pres_rels, dest)
     if existing:
         return existing
 
-    pres_xml = (unpacked_dir / "ppt" / "presentation.xml").read_text(encoding="utf-8")
-    used = {int(n) for n in re.findall(r'\bId="rId(\d+)"', pres_rels)}
-    used |= {int(n) for n in re.findall(r'\br:id="rId(\d+)"', pres_xml)}
-    rid = f"rId{max(used) + 1 if used else 1}"
+    number = max(registry.used_rids) + 1 if registry.used_rids else 1
+    registry.used_rids.add(number)
+    rid = f"rId{number}"
 
     new_rel = f'<Relationship Id="{rid}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/slide" Target="slides/{dest}"/>'
-    pres_rels = pres_rels.replace("</Relationships>", f"  {new_rel}\n</Relationships>")
-    pres_rels_path.write_text(pres_rels, encoding="utf-8")
+    registry.pres_rels = registry.pres_rels.replace("</Relationships>", f"  {new_rel}\n</Relationships>")
 
     return rid
 
@@ -242,24 +274,22 @@ def _find_slide_relationship(pres_rels: str, slide_name: str) -> str | None:
     return None
 
 
-def _get_next_slide_id(unpacked_dir: Path) -> int:
-    pres_content = (unpacked_dir / "ppt" / "presentation.xml").read_text(encoding="utf-8")
-    used = {int(m) for m in re.findall(r'<p:sldId[^>]*\bid="(\d+)"', pres_content)}
+def _get_next_slide_id(registry: SlideRegistry) -> int:
+    used = registry.used_slide_ids
 
     candidate = max((i for i in used if i >= SLIDE_ID_MIN), default=SLIDE_ID_MIN - 1) + 1
-    if candidate <= SLIDE_ID_MAX and candidate not in used:
-        return candidate
-    for i in range(SLIDE_ID_MIN, SLIDE_ID_MAX + 1):
-        if i not in used:
-            return i
-    _die("no slide id available in [256, 2147483647] — the deck is full")
+    if not (candidate <= SLIDE_ID_MAX and candidate not in used):
+        candidate = next((i for i in range(SLIDE_ID_MIN, SLIDE_ID_MAX + 1) if i not in used), None)
+        if candidate is None:
+            _die("no slide id available in [256, 2147483647] — the deck is full")
+    used.add(candidate)
+    return candidate
 
 
 def _insert_into_sld_id_lst(
-    unpacked_dir: Path, slide_id: int, rid: str, after_rid: str | None = None
+    registry: SlideRegistry, slide_id: int, rid: str, after_rid: str | None = None
 ) -> tuple[int, int]:
-    pres_path = unpacked_dir / "ppt" / "presentation.xml"
-    xml = pres_path.read_text(encoding="utf-8")
+    xml = registry.pres_xml
     entry = f'<p:sldId id="{slide_id}" r:id="{rid}"/>'
 
     if f'r:id="{rid}"' in xml:
@@ -287,7 +317,7 @@ def _insert_into_sld_id_lst(
     else:
         _die("presentation.xml has no <p:sldIdLst> (or <p:sldMasterIdLst> to anchor a new one)")
 
-    pres_path.write_text(xml, encoding="utf-8")
+    registry.pres_xml = xml
 
     lst = re.search(r"<p:sldIdLst>(.*)</p:sldIdLst>", xml, re.DOTALL)
     entries = re.findall(r"<p:sldId\b[^>]*>", lst.group(1)) if lst else []
@@ -297,33 +327,79 @@ def _insert_into_sld_id_lst(
     return position, len(entries)
 
 
-def _rid_for_slide(unpacked_dir: Path, slide_name: str) -> str:
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-    rid = _find_slide_relationship(pres_rels_path.read_text(encoding="utf-8"), slide_name)
+def _rid_for_slide(registry: SlideRegistry, slide_name: str) -> str:
+    rid = _find_slide_relationship(registry.pres_rels, slide_name)
     if not rid:
         _die(f"{slide_name} has no relationship in presentation.xml.rels")
     return rid
 
 
-def add_slide(unpacked_dir: Path, source: str, after: str | None = None) -> str:
-    source_type, layout_file = parse_source(source)
-    if source_type == "layout" and layout_file is not None:
-        return create_slide_from_layout(unpacked_dir, layout_file, after)
-    return duplicate_slide(unpacked_dir, source, after)
+def add_slides(
+    target: Path | Package, operations: list[tuple[str, str | None]]
+) -> list[str]:
+    """Apply (source, after) operations in order as one transaction.
+
+    target is an unpacked directory (saved in place) or an open Package (left
+    for the caller to save). An `after` may name a slide created earlier in
+    the same batch. If any operation fails, the slide parts already added are
+    removed and the three registry parts are left untouched.
+    """
+    with open_package(target) as package:
+        registry = SlideRegistry(package)
+        created = []
+        try:
+            for source, after in operations:
+                source_type, layout_file = parse_source(source)
+                if source_type == "layout" and layout_file is not None:
+                    created.append(create_slide_from_layout(registry, layout_file, after))
+                else:
+                    created.append(duplicate_slide(registry, source, after))
+            registry.commit()
+        except BaseException:
+            registry.rollback()
+            raise
+    return created
+
+
+def add_slide(target: Path | Package, source: str, after: str | None = None) -> str:
+    return add_slides(target, [(source, after)])[0]
+
+
+def read_batch(path: str) -> list[tuple[str, str | None]]:
+    """One operation per line: SOURCE [AFTER]. Blank lines and # comments are skipped."""
+    text = sys.stdin.read() if path == "-" else Path(path).read_text(encoding="utf-8")
+    operations = []
+    for lineno, line in enumerate(text.splitlines(), 1):
+        fields = line.split("#", 1)[0].split()
+        if not fields:
+            continue
+        if len(fields) > 2:
+            _die(f"{path}:{lineno}: expected 'SOURCE [AFTER]', got {line.strip()!r}")
+        operations.append((fields[0], fields[1] if len(fields) == 2 else None))
+    if not operations:
+        _die(f"{path} lists no operations")
+    return operations
+
+
+def add_slides_to_package(
+    package: Path, operations: list[tuple[str, str | None]], output: Path | None = None
+) -> list[str]:
+    out = output or package
+    with Package(package) as opened:
+        created = add_slides(opened, operations)
+        opened.save(out)
+    if len(created) == 1:
+        print(f"Wrote {out} — the new slide is ppt/slides/{created[0]} inside it (unpack to edit its content)")
+    else:
+        names = ", ".join(f"ppt/slides/{dest}" for dest in created)
+        print(f"Wrote {out} — the new slides {names} are inside it (unpack to edit their content)")
+    return created
 
 
 def add_slide_to_package(
     package: Path, source: str, after: str | None = None, output: Path | None = None
 ) -> str:
-    out = output or package
-    with tempfile.TemporaryDirectory() as tmp:
-        tmp_path = Path(tmp)
-        with zipfile.ZipFile(package) as zf:
-            safe_extract(zf, tmp_path)
-        dest = add_slide(tmp_path, source, after)
-        rezip(tmp_path, out)
-    print(f"Wrote {out} — the new slide is ppt/slides/{dest} inside it (unpack to edit its content)")
-    return dest
+    return add_slides_to_package(package, [(source, after)], output)[0]
 
 
 def main() -> None:
@@ -334,9 +410,16 @@ def main() -> None:
     parser.add_argument("target", help="Unpacked PPTX directory OR a .pptx/.potx file")
     parser.add_argument(
         "source",
+        nargs="?",
         help="slideN.xml to duplicate, or slideLayoutN.xml to create from a layout "
         "(list layouts with: ls <dir>/ppt/slideLayouts/)",
     )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="add many slides in one transaction: one 'SOURCE [AFTER]' per line ('-' reads stdin); "
+        "nothing is registered unless every line succeeds",
+    )
     parser.add_argument(
         "--after",
         metavar="SLIDE",
@@ -349,14 +432,23 @@ def main() -> None:
     )
     args = parser.parse_args()
 
+    if args.batch:
+        if args.source or args.after:
+            parser.error("--batch takes its sources and --after slides from FILE, not the command line")
+        operations = read_batch(args.batch)
+    elif args.source:
+        operations = [(args.source, args.after)]
+    else:
+        parser.error("give a SOURCE slide/layout or --batch FILE")
+
     target = Path(args.target)
     if target.is_dir():
         if args.output:
             parser.error("--output is only valid for .pptx/.potx input; a directory is modified in place")
-        add_slide(target, args.source, args.after)
+        add_slides(target, operations)
     elif target.is_file() and target.suffix.lower() in (".pptx", ".potx"):
         try:
-            add_slide_to_package(target, args.source, args.after, Path(args.output) if args.output else None)
+            add_slides_to_package(target, operations, Path(args.output) if args.output else None)
         except (OSError, ValueError, zipfile.BadZipFile) as e:
             _die(str(e))
     else:
@@ -1,57 +1,54 @@
-"""Remove unreferenced files from an unpacked PPTX directory.
+"""Remove unreferenced files from an unpacked PPTX directory (or a .pptx).
 
-Usage: python clean.py <unpacked_dir>
+Usage: python clean.py <unpacked_dir | deck.pptx> [--dry-run]
 
 Example:
     python clean.py unpacked/
+    python clean.py unpacked/ --dry-run
+    python clean.py deck.pptx            # rewritten in place
 
-This script removes:
-- Orphaned slides (not in sldIdLst) and their relationships
+One mark-and-sweep pass: every part reachable from _rels/.rels over the
+package's relationships is live, except slides missing from <p:sldIdLst>.
+Everything else is deleted, wherever it sits in the tree:
+- Orphaned slides and their relationships
 - [trash] directory (unreferenced files)
-- Orphaned .rels files for deleted resources
-- Unreferenced media, embeddings, charts, diagrams, drawings, ink files
-- Unreferenced theme files
-- Unreferenced notes slides
+- .rels files whose source part is gone
+- Media, embeddings, charts, diagrams, drawings, ink, themes, notes slides,
+  and any other part nothing points at
 - Content-Type overrides for deleted files
+
+--dry-run lists what would go, with the bytes it would free, and changes nothing.
 """
 
 import posixpath
 import re
 import sys
+import zipfile
 from pathlib import Path
 
 import defusedxml.minidom
 
-from office.helpers import SLIDE_REL_TYPE, opc_target, rels_source_part
+from office.helpers import SLIDE_REL_TYPE, opc_target
+from office.helpers.package import Package, open_package
 
+PRESENTATION_PART = "ppt/presentation.xml"
+CONTENT_TYPES_PART = "[Content_Types].xml"
 
-def _slide_rids(pres_rels_path: Path, unpacked_dir: Path) -> dict[str, str]:
-    source_part = rels_source_part(pres_rels_path, unpacked_dir)
-    rels_dom = defusedxml.minidom.parse(str(pres_rels_path))
 
+def _slide_rids(package: Package) -> dict[str, str]:
     rids: dict[str, str] = {}
-    for rel in rels_dom.getElementsByTagName("Relationship"):
-        if rel.getAttribute("Type") != SLIDE_REL_TYPE:
-            continue
-        part = opc_target(
-            rel.getAttribute("Target"), source_part, rel.getAttribute("TargetMode")
-        )
-        if part is not None:
-            rids[rel.getAttribute("Id")] = part
+    for rid, rel_type, part in _relationships(package, PRESENTATION_PART):
+        if rel_type == SLIDE_REL_TYPE and part is not None:
+            rids[rid] = part
     return rids
 
 
-def get_slides_in_sldidlst(unpacked_dir: Path) -> set[str]:
-    pres_path = unpacked_dir / "ppt" / "presentation.xml"
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-
-    if not pres_path.exists() or not pres_rels_path.exists():
+def get_slides_in_sldidlst(package: Package) -> set[str]:
+    if PRESENTATION_PART not in package or _rels_path(PRESENTATION_PART) not in package:
         return set()
 
-    rid_to_slide = _slide_rids(pres_rels_path, unpacked_dir)
-
-    pres_content = pres_path.read_text(encoding="utf-8")
-    referenced_rids = set(re.findall(r'<p:sldId[^>]*r:id="([^"]+)"', pres_content))
+    rid_to_slide = _slide_rids(package)
+    referenced_rids = _listed_rids(package)
 
     return {
         posixpath.basename(rid_to_slide[rid])
@@ -64,246 +61,174 @@ class RefusedToClean(Exception):
     """The package does not look the way a readable package should."""
 
 
-def remove_orphaned_slides(unpacked_dir: Path) -> list[str]:
-    slides_dir = unpacked_dir / "ppt" / "slides"
-    slides_rels_dir = slides_dir / "_rels"
-    pres_rels_path = unpacked_dir / "ppt" / "_rels" / "presentation.xml.rels"
-
-    if not slides_dir.exists():
-        return []
+def _rels_path(part: str) -> str:
+    directory, base = posixpath.split(part)
+    return posixpath.join(directory, "_rels", f"{base}.rels")
 
-    referenced_slides = get_slides_in_sldidlst(unpacked_dir)
-    on_disk = sorted(slides_dir.glob("slide*.xml"))
 
-    if on_disk and not any(s.name in referenced_slides for s in on_disk):
-        listed = re.findall(
-            r'<p:sldId[^>]*r:id="([^"]+)"',
-            (unpacked_dir / "ppt" / "presentation.xml").read_text(encoding="utf-8")
-            if (unpacked_dir / "ppt" / "presentation.xml").exists()
-            else "",
+def _relationships(package: Package, source_part: str) -> list[tuple[str, str, str | None]]:
+    dom = defusedxml.minidom.parseString(package.read(_rels_path(source_part)))
+    return [
+        (
+            rel.getAttribute("Id"),
+            rel.getAttribute("Type"),
+            opc_target(rel.getAttribute("Target"), source_part, rel.getAttribute("TargetMode")),
         )
-        if listed:
-            raise RefusedToClean(
-                f"<p:sldIdLst> lists {len(listed)} slide(s) and none of the "
-                f"{len(on_disk)} slide(s) on disk match any of them. Refusing to "
-                f"delete them all — this is a parse failure, not an empty deck."
-            )
-
-    removed = []
-
-    for slide_file in on_disk:
-        if slide_file.name not in referenced_slides:
-            rel_path = slide_file.relative_to(unpacked_dir)
-            slide_file.unlink()
-            removed.append(str(rel_path))
-
-            rels_file = slides_rels_dir / f"{slide_file.name}.rels"
-            if rels_file.exists():
-                rels_file.unlink()
-                removed.append(str(rels_file.relative_to(unpacked_dir)))
-
-    if removed and pres_rels_path.exists():
-        rels_dom = defusedxml.minidom.parse(str(pres_rels_path))
-        source_part = rels_source_part(pres_rels_path, unpacked_dir)
-        changed = False
-
-        for rel in list(rels_dom.getElementsByTagName("Relationship")):
-            if rel.getAttribute("Type") != SLIDE_REL_TYPE:
-                continue
-            part = opc_target(
-                rel.getAttribute("Target"), source_part, rel.getAttribute("TargetMode")
-            )
-            if part is None:
-                continue
-            if posixpath.basename(part) not in referenced_slides:
-                if rel.parentNode:
-                    rel.parentNode.removeChild(rel)
-                    changed = True
-
-        if changed:
-            with open(pres_rels_path, "wb") as f:
-                f.write(rels_dom.toxml(encoding="utf-8"))
-
-    return removed
-
+        for rel in dom.getElementsByTagName("Relationship")
+    ]
 
-def remove_trash_directory(unpacked_dir: Path) -> list[str]:
-    trash_dir = unpacked_dir / "[trash]"
-    removed = []
 
-    if trash_dir.exists() and trash_dir.is_dir():
-        for file_path in trash_dir.iterdir():
-            if file_path.is_file():
-                rel_path = file_path.relative_to(unpacked_dir)
-                removed.append(str(rel_path))
-                file_path.unlink()
-        trash_dir.rmdir()
-
-    return removed
-
-
-def _referenced_by(rels_files, unpacked_dir: Path) -> set:
-    referenced = set()
+def _listed_rids(package: Package) -> set[str]:
+    if PRESENTATION_PART not in package:
+        return set()
+    return set(re.findall(r'<p:sldId[^>]*r:id="([^"]+)"', package.read_text(PRESENTATION_PART)))
 
-    for rels_file in rels_files:
-        source_part = rels_source_part(rels_file, unpacked_dir)
-        dom = defusedxml.minidom.parse(str(rels_file))
-        for rel in dom.getElementsByTagName("Relationship"):
-            part = opc_target(
-                rel.getAttribute("Target"), source_part, rel.getAttribute("TargetMode")
-            )
-            if part is not None:
-                referenced.add(Path(part))
 
-    return referenced
+def _check_slide_list(package: Package) -> None:
+    on_disk = [
+        posixpath.basename(name) for name in package.names()
+        if re.fullmatch(r"ppt/slides/slide[^/]*\.xml", name)
+    ]
+    referenced_slides = get_slides_in_sldidlst(package)
+    listed = _listed_rids(package)
 
+    if on_disk and listed and not any(name in referenced_slides for name in on_disk):
+        raise RefusedToClean(
+            f"<p:sldIdLst> lists {len(listed)} slide(s) and none of the "
+            f"{len(on_disk)} slide(s) in the package match any of them. Refusing to "
+            f"delete them all — this is a parse failure, not an empty deck."
+        )
 
-def remove_orphaned_rels_files(unpacked_dir: Path) -> list[str]:
-    resource_dirs = ["charts", "diagrams", "drawings"]
-    removed = []
 
-    for dir_name in resource_dirs:
-        rels_dir = unpacked_dir / "ppt" / dir_name / "_rels"
-        if not rels_dir.exists():
+def mark_live_parts(package: Package) -> tuple[set[str], set[str]]:
+    """Walk every relationship once from _rels/.rels.
+
+    Returns the live part names and the ids of presentation.xml slide
+    relationships that are not in <p:sldIdLst>. Slide edges are only followed
+    from presentation.xml and only for listed ids, so a notes slide's back
+    reference or a hyperlink cannot keep a deleted slide alive.
+    """
+    listed = _listed_rids(package)
+    live = {CONTENT_TYPES_PART}
+    unlisted_rids = set()
+    resolved_any = False
+    stack = [""]
+
+    while stack:
+        part = stack.pop()
+        rels_part = _rels_path(part)
+        if rels_part not in package:
             continue
+        live.add(rels_part)
 
-        for rels_file in rels_dir.glob("*.rels"):
-            resource_file = rels_dir.parent / rels_file.name.replace(".rels", "")
-            if not resource_file.exists():
-                rels_file.unlink()
-                removed.append(str(rels_file.relative_to(unpacked_dir)))
-
-    return removed
-
-
-def get_referenced_files(unpacked_dir: Path) -> set:
-    return _referenced_by(sorted(unpacked_dir.rglob("*.rels")), unpacked_dir)
-
+        for rid, rel_type, target in _relationships(package, part):
+            if target is None:
+                continue
+            if rel_type == SLIDE_REL_TYPE:
+                if part != PRESENTATION_PART:
+                    continue
+                if rid not in listed:
+                    unlisted_rids.add(rid)
+                    continue
+            if target in live or target not in package:
+                continue
+            resolved_any = True
+            live.add(target)
+            stack.append(target)
 
-def remove_orphaned_files(unpacked_dir: Path, referenced: set) -> list[str]:
-    resource_dirs = ["media", "embeddings", "charts", "diagrams", "tags", "drawings", "ink"]
-    removed = []
+    if not resolved_any:
+        raise RefusedToClean(
+            "no relationship reachable from _rels/.rels names a part we can resolve. "
+            "Refusing to treat every file as unreferenced."
+        )
+    return live, unlisted_rids
 
-    for dir_name in resource_dirs:
-        dir_path = unpacked_dir / "ppt" / dir_name
-        if not dir_path.exists():
-            continue
 
-        for file_path in dir_path.glob("*"):
-            if not file_path.is_file():
-                continue
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
-
-    theme_dir = unpacked_dir / "ppt" / "theme"
-    if theme_dir.exists():
-        for file_path in theme_dir.glob("theme*.xml"):
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
-                theme_rels = theme_dir / "_rels" / f"{file_path.name}.rels"
-                if theme_rels.exists():
-                    theme_rels.unlink()
-                    removed.append(str(theme_rels.relative_to(unpacked_dir)))
-
-    notes_dir = unpacked_dir / "ppt" / "notesSlides"
-    if notes_dir.exists():
-        for file_path in notes_dir.glob("*.xml"):
-            if not file_path.is_file():
-                continue
-            rel_path = file_path.relative_to(unpacked_dir)
-            if rel_path not in referenced:
-                file_path.unlink()
-                removed.append(str(rel_path))
+def _drop_slide_relationships(package: Package, rids: set[str]) -> None:
+    pres_rels = _rels_path(PRESENTATION_PART)
+    if not rids or pres_rels not in package:
+        return
 
-        notes_rels_dir = notes_dir / "_rels"
-        if notes_rels_dir.exists():
-            for file_path in notes_rels_dir.glob("*.rels"):
-                notes_file = notes_dir / file_path.name.replace(".rels", "")
-                if not notes_file.exists():
-                    file_path.unlink()
-                    removed.append(str(file_path.relative_to(unpacked_dir)))
+    rels_dom = package.dom(pres_rels)
+    changed = False
+    for rel in list(rels_dom.getElementsByTagName("Relationship")):
+        if rel.getAttribute("Type") == SLIDE_REL_TYPE and rel.getAttribute("Id") in rids:
+            if rel.parentNode:
+                rel.parentNode.removeChild(rel)
+                changed = True
 
-    return removed
+    if changed:
+        package.mark_dirty(pres_rels)
 
 
-def update_content_types(unpacked_dir: Path, removed_files: list[str]) -> None:
-    ct_path = unpacked_dir / "[Content_Types].xml"
-    if not ct_path.exists():
+def update_content_types(package: Package, removed_files: list[str]) -> None:
+    if CONTENT_TYPES_PART not in package:
         return
 
-    dom = defusedxml.minidom.parse(str(ct_path))
+    removed = set(removed_files)
+    dom = package.dom(CONTENT_TYPES_PART)
     changed = False
 
     for override in list(dom.getElementsByTagName("Override")):
         part_name = override.getAttribute("PartName").lstrip("/")
-        if part_name in removed_files:
+        if part_name in removed:
             if override.parentNode:
                 override.parentNode.removeChild(override)
                 changed = True
 
     if changed:
-        with open(ct_path, "wb") as f:
-            f.write(dom.toxml(encoding="utf-8"))
-
-
-def clean_unused_files(unpacked_dir: Path) -> list[str]:
-    all_removed = []
-
-    if list(unpacked_dir.rglob("*.rels")) and not get_referenced_files(unpacked_dir):
-        raise RefusedToClean(
-            "no relationship in this package names a part we can resolve. "
-            "Refusing to treat every file as unreferenced."
-        )
+        package.mark_dirty(CONTENT_TYPES_PART)
 
-    slides_removed = remove_orphaned_slides(unpacked_dir)
-    all_removed.extend(slides_removed)
 
-    trash_removed = remove_trash_directory(unpacked_dir)
-    all_removed.extend(trash_removed)
+def clean_unused_files(target: Path | Package, dry_run: bool = False) -> dict[str, int]:
+    """Delete every unreachable part; return {part name: size in bytes}.
 
-    while True:
-        removed_rels = remove_orphaned_rels_files(unpacked_dir)
-        referenced = get_referenced_files(unpacked_dir)
-        removed_files = remove_orphaned_files(unpacked_dir, referenced)
+    target is an unpacked directory or .pptx (saved in place) or an open
+    Package (left for the caller to save).
+    """
+    with open_package(target) as package:
+        _check_slide_list(package)
+        live, unlisted_rids = mark_live_parts(package)
 
-        total_removed = removed_rels + removed_files
-        if not total_removed:
-            break
+        dead = {name: package.size(name) for name in package.names() if name not in live}
+        if dry_run:
+            return dead
 
-        all_removed.extend(total_removed)
+        for name in dead:
+            package.delete(name)
+        _drop_slide_relationships(package, unlisted_rids)
+        if dead:
+            update_content_types(package, list(dead))
 
-    if all_removed:
-        update_content_types(unpacked_dir, all_removed)
-
-    return all_removed
+    return dead
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python clean.py <unpacked_dir>", file=sys.stderr)
+    args = [a for a in sys.argv[1:] if a != "--dry-run"]
+    dry_run = "--dry-run" in sys.argv[1:]
+
+    if len(args) != 1:
+        print("Usage: python clean.py <unpacked_dir | deck.pptx> [--dry-run]", file=sys.stderr)
         print("Example: python clean.py unpacked/", file=sys.stderr)
         sys.exit(1)
 
-    unpacked_dir = Path(sys.argv[1])
+    unpacked_dir = Path(args[0])
 
     if not unpacked_dir.exists():
         print(f"Error: {unpacked_dir} not found", file=sys.stderr)
         sys.exit(1)
 
     try:
-        removed = clean_unused_files(unpacked_dir)
-    except (RefusedToClean, ValueError) as e:
+        removed = clean_unused_files(unpacked_dir, dry_run=dry_run)
+    except (RefusedToClean, ValueError, zipfile.BadZipFile) as e:
         print(f"Error: {e}", file=sys.stderr)
         print("Nothing was deleted.", file=sys.stderr)
         sys.exit(1)
 
     if removed:
-        print(f"Removed {len(removed)} unreferenced files:")
-        for f in removed:
-            print(f"  {f}")
+        verb = "Would remove" if dry_run else "Removed"
+        print(f"{verb} {len(removed)} unreferenced files ({sum(removed.values()):,} bytes):")
+        for f, size in removed.items():
+            print(f"  {f} ({size:,} bytes)")
     else:
         print("No unreferenced files found")
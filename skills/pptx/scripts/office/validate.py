@@ -6,7 +6,12 @@ Usage:
 
 The first argument can be either:
 - An unpacked directory containing the Office document XML files
-- A packed Office file (.docx/.pptx/.xlsx or .dotx/.potx/.xltx template) which will be unpacked to a temp directory
+- A packed Office file (.docx/.pptx/.xlsx or .dotx/.potx/.xltx template), opened as a Package
+  and extracted to a temp directory for the validators; repairs are written back into the file,
+  and members no repair touched are copied over without being recompressed
+
+From Python, validate() also takes an open helpers.package.Package; repairs are applied to it
+and left for the caller to save.
 
 Auto-repair fixes:
 - paraId/durableId values that exceed OOXML limits
@@ -14,6 +19,7 @@ Auto-repair fixes:
 """
 
 import argparse
+import os
 import sys
 import tempfile
 import zipfile
@@ -22,7 +28,8 @@ from pathlib import Path
 import defusedxml.ElementTree as ET
 from defusedxml.common import DefusedXmlException
 
-from helpers import OOXML_FAMILY, rezip, safe_extract
+from helpers import OOXML_FAMILY
+from helpers.package import Package
 from validators import DOCXSchemaValidator, PPTXSchemaValidator, RedliningValidator
 
 WORD_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
@@ -105,68 +112,122 @@ def main():
     if args.author is not None and family != "docx":
         _fail(f"--author only applies to docx files, not {family}")
 
-    packed_file = None
-    temp_dir_ctx = None
+    if family == "xlsx":
+        exts = ", ".join(k for k, v in sorted(OOXML_FAMILY.items()) if v == "xlsx")
+        print(
+            f"No XSD schema validation is performed for xlsx-family files ({exts}). "
+            "For formula-error checking, use scripts/recalc.py instead."
+        )
+        sys.exit(0)
+    if family not in ("docx", "pptx"):
+        print(f"Error: Validation not supported for file type {family}")
+        sys.exit(1)
+
     if path.is_file() and path.suffix.lower() in OOXML_FAMILY:
-        packed_file = path
-        temp_dir_ctx = tempfile.TemporaryDirectory()
-        unpacked_dir = Path(temp_dir_ctx.name)
         try:
-            with zipfile.ZipFile(path, "r") as zf:
-                safe_extract(zf, unpacked_dir)
+            target = Package(path)
         except (zipfile.BadZipFile, ValueError, OSError) as e:
             _fail(f"cannot unpack {path}: {e}")
+    elif path.is_dir():
+        target = path
     else:
-        if not path.is_dir():
-            _fail(f"{path} is not a directory or Office file")
-        unpacked_dir = path
-
-    match family:
-        case "docx":
-            validators = [
-                DOCXSchemaValidator(unpacked_dir, original_file, verbose=args.verbose),
-            ]
-            if args.author is not None:
-                validators.append(
-                    RedliningValidator(unpacked_dir, original_file, verbose=args.verbose)  
-                )
-            elif original_file and _has_tracked_changes(unpacked_dir):
-                print(
-                    "Note: this document has tracked changes; they were not "
-                    "checked against the original (pass --author to check)."
-                )
-        case "pptx":
-            validators = [
-                PPTXSchemaValidator(unpacked_dir, original_file, verbose=args.verbose),
-            ]
-        case "xlsx":
-            exts = ", ".join(k for k, v in sorted(OOXML_FAMILY.items()) if v == "xlsx")
+        _fail(f"{path} is not a directory or Office file")
+
+    success, total_repairs = validate(
+        target,
+        family,
+        original_file,
+        verbose=args.verbose,
+        auto_repair=args.auto_repair,
+        check_redlining=args.author is not None,
+    )
+    if isinstance(target, Package):
+        if total_repairs:
+            target.save()
+            print(f"Wrote repaired file to {path}")
+        target.close()
+
+    if success:
+        print("All validations PASSED!")
+
+    sys.exit(0 if success else 1)
+
+
+def validate(
+    target,
+    family: str,
+    original_file: Path | None = None,
+    verbose: bool = False,
+    auto_repair: bool = False,
+    check_redlining: bool = False,
+) -> tuple[bool, int]:
+    """Run the docx or pptx validators over an unpacked directory or a Package.
+
+    The validators work on files, so a Package is extracted to a temp
+    directory; auto-repairs made there are copied back into it (unsaved).
+    Returns (passed, number of repairs).
+    """
+    if isinstance(target, (str, os.PathLike)):
+        return _run_validators(
+            Path(target), family, original_file, verbose, auto_repair, check_redlining
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        unpacked_dir = Path(tmp)
+        target.extract(unpacked_dir)
+        success, total_repairs = _run_validators(
+            unpacked_dir, family, original_file, verbose, auto_repair, check_redlining
+        )
+        if total_repairs:
+            repaired = {
+                file_path.relative_to(unpacked_dir).as_posix(): file_path
+                for file_path in unpacked_dir.rglob("*")
+                if file_path.is_file()
+            }
+            for name in target.names():
+                if name not in repaired:
+                    target.delete(name)
+            for name, file_path in sorted(repaired.items()):
+                data = file_path.read_bytes()
+                if name not in target or data != target.read(name):
+                    target.write(name, data)
+    return success, total_repairs
+
+
+def _run_validators(
+    unpacked_dir: Path,
+    family: str,
+    original_file: Path | None,
+    verbose: bool,
+    auto_repair: bool,
+    check_redlining: bool,
+) -> tuple[bool, int]:
+    if family == "docx":
+        validators = [
+            DOCXSchemaValidator(unpacked_dir, original_file, verbose=verbose),
+        ]
+        if check_redlining:
+            validators.append(
+                RedliningValidator(unpacked_dir, original_file, verbose=verbose)
+            )
+        elif original_file and _has_tracked_changes(unpacked_dir):
             print(
-                f"No XSD schema validation is performed for xlsx-family files ({exts}). "
-                "For formula-error checking, use scripts/recalc.py instead."
+                "Note: this document has tracked changes; they were not "
+                "checked against the original (pass --author to check)."
             )
-            sys.exit(0)
-        case _:
-            print(f"Error: Validation not supported for file type {family}")
-            sys.exit(1)
+    else:
+        validators = [
+            PPTXSchemaValidator(unpacked_dir, original_file, verbose=verbose),
+        ]
 
-    if args.auto_repair:
+    total_repairs = 0
+    if auto_repair:
         total_repairs = sum(v.repair() for v in validators)
         if total_repairs:
             print(f"Auto-repaired {total_repairs} issue(s)")
-            if packed_file is not None:
-                rezip(unpacked_dir, packed_file)
-                print(f"Wrote repaired file to {packed_file}")
 
     success = all([v.validate() for v in validators])
-
-    if temp_dir_ctx is not None:
-        temp_dir_ctx.cleanup()
-
-    if success:
-        print("All validations PASSED!")
-
-    sys.exit(0 if success else 1)
+    return success, total_repairs
 
 
 if __name__ == "__main__":
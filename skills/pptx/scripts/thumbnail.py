@@ -4,8 +4,14 @@ Creates a grid layout of slide thumbnails for quick visual analysis.
 Labels each thumbnail with its XML filename (e.g., slide1.xml).
 Hidden slides are shown with a placeholder pattern.
 
+Rendered slides are cached by a hash of the slide and everything it draws
+from (layout, master, theme, media), so after a one-slide edit only that slide
+goes through LibreOffice again. PDF pages are rasterized in parallel. The
+cache keeps its most recently used slides and is trimmed to --cache-max-mb.
+
 Usage:
     python thumbnail.py input.pptx [output_prefix] [--cols N]
+                        [--cache-dir DIR [--cache-max-mb MB] | --no-cache]
 
 Examples:
     python thumbnail.py presentation.pptx
@@ -16,11 +22,17 @@ Examples:
 """
 
 import argparse
+import hashlib
+import os
 import posixpath
+import re
+import shutil
 import subprocess
 import sys
 import tempfile
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import defusedxml.minidom
@@ -29,6 +41,10 @@ from office.helpers import SLIDE_REL_TYPE, opc_target
 from office.soffice import run_soffice
 from PIL import Image, ImageDraw, ImageFont
 
+try:
+    import resource
+except ImportError:
+    resource = None
 
 THUMBNAIL_WIDTH = 300
 CONVERSION_DPI = 100
@@ -39,6 +55,21 @@ GRID_PADDING = 20
 BORDER_WIDTH = 2
 FONT_SIZE_RATIO = 0.10
 LABEL_PADDING_RATIO = 0.4
+CACHE_VERSION = "1"
+DEFAULT_CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "pptx-thumbnails"
+)
+DEFAULT_CACHE_MAX_MB = 256
+
+# Relationships that do not change how a slide renders; following them would
+# tie a slide's cache key to its notes, to other slides it links to, or (from a
+# master) to every layout of that master.
+_SKIPPED_REL_SUFFIXES = ("/slide", "/notesSlide", "/comments", "/commentAuthors", "/tags")
+
+_SLD_ID_LST_RE = re.compile(r"<p:sldIdLst>.*?</p:sldIdLst>", re.DOTALL)
+_SLD_ID_RE = re.compile(r"<p:sldId\b[^>]*?/>")
+_SLD_RID_RE = re.compile(r'\br:id="([^"]+)"')
+_PAGE_NUM_RE = re.compile(r"-(\d+)\.jpg$")
 
 
 def main():
@@ -58,6 +89,23 @@ def main():
         default=DEFAULT_COLS,
         help=f"Number of columns (default: {DEFAULT_COLS}, max: {MAX_COLS})",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help=f"Rendered-slide cache (default: {DEFAULT_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"Trim the cache to this size, least recently used first (default: {DEFAULT_CACHE_MAX_MB})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Render every slide and leave the cache untouched",
+    )
 
     args = parser.parse_args()
 
@@ -77,7 +125,14 @@ def main():
 
         with tempfile.TemporaryDirectory() as temp_dir:
             temp_path = Path(temp_dir)
-            visible_images = convert_to_images(input_path, temp_path)
+            if args.no_cache:
+                visible_images = convert_to_images(input_path, temp_path)
+            else:
+                visible_images, hits, misses = render_with_cache(
+                    input_path, slide_info, temp_path, args.cache_dir,
+                    args.cache_max_mb * 1024 * 1024,
+                )
+                print(f"Thumbnail cache: {hits} hit(s), {misses} miss(es)")
 
             if not visible_images and not any(s["hidden"] for s in slide_info):
                 print("Error: No slides found", file=sys.stderr)
@@ -85,9 +140,11 @@ def main():
 
             slides = build_slide_list(slide_info, visible_images, temp_path)
 
+            started = time.perf_counter()
             grid_files = create_grids(slides, cols, THUMBNAIL_WIDTH, output_path)
+            elapsed = time.perf_counter() - started
 
-            print(f"Created {len(grid_files)} grid(s):")
+            print(f"Created {len(grid_files)} grid(s) in {elapsed:.2f}s{_peak_rss()}:")
             for grid_file in grid_files:
                 print(f"  {grid_file}")
 
@@ -96,6 +153,15 @@ def main():
         sys.exit(1)
 
 
+def _peak_rss() -> str:
+    if resource is None:
+        return ""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024
+    return f", peak RSS {peak / 2**20:.0f} MB"
+
+
 def _is_hidden(zf: zipfile.ZipFile, part: str) -> bool:
     try:
         with zf.open(part) as f:
@@ -128,17 +194,73 @@ def get_slide_info(pptx_path: Path) -> list[dict]:
 
         present = set(zf.namelist())
 
+        deck_hash = _hash(_SLD_ID_LST_RE.sub("", pres_content).encode("utf-8"))
+
         slides = []
         for sld_id in pres_dom.getElementsByTagName("p:sldId"):
-            part = rid_to_part.get(sld_id.getAttribute("r:id"))
+            rid = sld_id.getAttribute("r:id")
+            part = rid_to_part.get(rid)
             if part is not None and part in present:
+                key, numbered = _slide_cache_key(zf, part, deck_hash)
                 slides.append(
-                    {"name": posixpath.basename(part), "hidden": _is_hidden(zf, part)}
+                    {
+                        "name": posixpath.basename(part),
+                        "hidden": _is_hidden(zf, part),
+                        "part": part,
+                        "rid": rid,
+                        "key": key,
+                        "numbered": numbered,
+                    }
                 )
 
+        for index, info in enumerate(slides):
+            if info["numbered"]:
+                info["key"] = _hash(f"{info['key']}:{index}".encode())
+
         return slides
 
 
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _rendering_parts(zf: zipfile.ZipFile, slide_part: str, present: set) -> list[str]:
+    seen = {slide_part}
+    stack = [slide_part]
+    while stack:
+        part = stack.pop()
+        directory, base = posixpath.split(part)
+        rels_path = posixpath.join(directory, "_rels", base + ".rels")
+        if rels_path not in present:
+            continue
+        rels_dom = defusedxml.minidom.parseString(zf.read(rels_path))
+        for rel in rels_dom.getElementsByTagName("Relationship"):
+            rel_type = rel.getAttribute("Type")
+            if rel_type.endswith(_SKIPPED_REL_SUFFIXES):
+                continue
+            if rel_type.endswith("/slideLayout") and part != slide_part:
+                continue
+            try:
+                target = opc_target(
+                    rel.getAttribute("Target"), part, rel.getAttribute("TargetMode")
+                )
+            except ValueError:
+                continue
+            if target is not None and target in present and target not in seen:
+                seen.add(target)
+                stack.append(target)
+    return sorted(seen)
+
+
+def _slide_cache_key(zf: zipfile.ZipFile, slide_part: str, deck_hash: str) -> tuple[str, bool]:
+    digest = hashlib.sha256(f"{CACHE_VERSION}:{CONVERSION_DPI}:{deck_hash}".encode())
+    for part in _rendering_parts(zf, slide_part, set(zf.namelist())):
+        digest.update(part.encode("utf-8") + b"\0" + _hash(zf.read(part)).encode())
+    # A slide-number field shows the slide's position, so that is part of its key.
+    numbered = b'type="slidenum"' in zf.read(slide_part)
+    return digest.hexdigest(), numbered
+
+
 def build_slide_list(
     slide_info: list[dict],
     visible_images: list[Path],
@@ -185,7 +307,7 @@ def create_hidden_placeholder(size: tuple[int, int]) -> Image.Image:
     return img
 
 
-def convert_to_images(pptx_path: Path, temp_dir: Path) -> list[Path]:
+def convert_to_pdf(pptx_path: Path, temp_dir: Path) -> Path:
     pdf_path = temp_dir / f"{pptx_path.stem}.pdf"
 
     result = run_soffice(
@@ -196,23 +318,180 @@ def convert_to_images(pptx_path: Path, temp_dir: Path) -> list[Path]:
     if result.returncode != 0 or not pdf_path.exists():
         detail = (result.stderr or result.stdout or "").strip()
         raise RuntimeError(f"PDF conversion failed: {detail}" if detail else "PDF conversion failed")
+    return pdf_path
 
-    result = subprocess.run(
-        [
-            "pdftoppm",
-            "-jpeg",
-            "-r",
-            str(CONVERSION_DPI),
-            str(pdf_path),
-            str(temp_dir / "slide"),
-        ],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode != 0:
+
+def _page_count(pdf_path: Path) -> int:
+    result = subprocess.run(["pdfinfo", str(pdf_path)], capture_output=True, text=True)
+    match = re.search(r"^Pages:\s+(\d+)", result.stdout, re.MULTILINE)
+    if result.returncode != 0 or match is None:
+        raise RuntimeError("Could not read the PDF page count")
+    return int(match.group(1))
+
+
+def _page_ranges(pages: list[int], parts: int) -> list[tuple[int, int]]:
+    size = max(1, -(-len(pages) // parts))
+    ranges: list[list[int]] = []
+    for page in sorted(pages):
+        if ranges and page == ranges[-1][1] + 1 and ranges[-1][1] - ranges[-1][0] + 1 < size:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return [(first, last) for first, last in ranges]
+
+
+def rasterize_pages(pdf_path: Path, out_dir: Path, pages: list[int] | None = None) -> dict[int, Path]:
+    if pages is None:
+        pages = list(range(1, _page_count(pdf_path) + 1))
+    if not pages:
+        return {}
+    ranges = _page_ranges(pages, os.cpu_count() or 1)
+
+    def run(page_range: tuple[int, int]) -> subprocess.CompletedProcess:
+        first, last = page_range
+        return subprocess.run(
+            [
+                "pdftoppm",
+                "-jpeg",
+                "-r",
+                str(CONVERSION_DPI),
+                "-f",
+                str(first),
+                "-l",
+                str(last),
+                str(pdf_path),
+                str(out_dir / "slide"),
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+    with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+        results = list(pool.map(run, ranges))
+    if any(result.returncode != 0 for result in results):
         raise RuntimeError("Image conversion failed")
 
-    return sorted(temp_dir.glob("slide-*.jpg"))
+    images = {}
+    for image in out_dir.glob("slide-*.jpg"):
+        match = _PAGE_NUM_RE.search(image.name)
+        if match is not None:
+            images[int(match.group(1))] = image
+    return images
+
+
+def convert_to_images(pptx_path: Path, temp_dir: Path) -> list[Path]:
+    pdf_path = convert_to_pdf(pptx_path, temp_dir)
+    images = rasterize_pages(pdf_path, temp_dir)
+    return [images[page] for page in sorted(images)]
+
+
+def _subset_deck(pptx_path: Path, keep_rids: set[str], out_path: Path) -> None:
+    def keep(match: re.Match) -> str:
+        rid = _SLD_RID_RE.search(match.group(0))
+        return match.group(0) if rid is not None and rid.group(1) in keep_rids else ""
+
+    with zipfile.ZipFile(pptx_path) as src, zipfile.ZipFile(out_path, "w") as dst:
+        for item in src.infolist():
+            data = src.read(item)
+            if item.filename == "ppt/presentation.xml":
+                data = _SLD_ID_RE.sub(keep, data.decode("utf-8")).encode("utf-8")
+            dst.writestr(item, data)
+
+
+def _store(cache_dir: Path, key: str, image: Path) -> None:
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=key, suffix=".tmp", dir=cache_dir)
+    os.close(fd)
+    try:
+        shutil.copyfile(image, tmp_name)
+        os.replace(tmp_name, cache_dir / f"{key}.jpg")
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def _evict(cache_dir: Path, max_bytes: int, in_use: set[str]) -> int:
+    entries = []
+    total = 0
+    for entry in cache_dir.glob("*.jpg"):
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime_ns, st.st_size, entry))
+        total += st.st_size
+    removed = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        # The grid is still to be drawn from this deck's cached slides.
+        if entry.stem in in_use:
+            continue
+        entry.unlink(missing_ok=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+def render_with_cache(
+    pptx_path: Path,
+    slide_info: list[dict],
+    temp_dir: Path,
+    cache_dir: Path,
+    max_bytes: int = DEFAULT_CACHE_MAX_MB * 1024 * 1024,
+) -> tuple[list[Path], int, int]:
+    visible = [info for info in slide_info if not info["hidden"]]
+    images = {}
+    for info in visible:
+        cached = cache_dir / f"{info['key']}.jpg"
+        if info["key"] not in images and cached.is_file():
+            images[info["key"]] = cached
+            try:
+                os.utime(cached)
+            except FileNotFoundError:
+                pass
+    # Slides with identical content share a key: render each key once.
+    misses = []
+    for info in visible:
+        if info["key"] not in images:
+            images[info["key"]] = None
+            misses.append(info)
+
+    if misses:
+        render_dir = temp_dir / "render"
+        render_dir.mkdir()
+        if len(misses) == len(images) or any(info["numbered"] for info in misses):
+            # Slide-number fields only come out right when rendered in the full deck.
+            pdf_path = convert_to_pdf(pptx_path, render_dir)
+            page_count = _page_count(pdf_path)
+            if page_count == len(slide_info):
+                pages = slide_info
+            elif page_count == len(visible):
+                pages = visible
+            else:
+                raise ValueError(
+                    f"LibreOffice rendered {page_count} page(s) for {len(visible)} "
+                    f"visible slide(s) of {len(slide_info)}; thumbnails would be mislabeled"
+                )
+            page_of = {}
+            for i, info in enumerate(pages):
+                page_of.setdefault(info["key"], i + 1)
+        else:
+            subset_path = render_dir / f"{pptx_path.stem}.pptx"
+            _subset_deck(pptx_path, {info["rid"] for info in misses}, subset_path)
+            pdf_path = convert_to_pdf(subset_path, render_dir)
+            page_of = {info["key"]: i + 1 for i, info in enumerate(misses)}
+
+        rendered = rasterize_pages(pdf_path, render_dir, [page_of[info["key"]] for info in misses])
+        for info in misses:
+            image = rendered.get(page_of[info["key"]])
+            if image is None:
+                raise RuntimeError(f"No page was rendered for {info['name']}")
+            images[info["key"]] = image
+            _store(cache_dir, info["key"], image)
+        _evict(cache_dir, max_bytes, set(images))
+
+    return [images[info["key"]] for info in visible], len(visible) - len(misses), len(misses)
 
 
 def create_grids(
@@ -222,26 +501,25 @@ def create_grids(
     output_path: Path,
 ) -> list[str]:
     max_per_grid = cols * (cols + 1)
-    grid_files = []
-
-    for chunk_idx, start_idx in enumerate(range(0, len(slides), max_per_grid)):
-        end_idx = min(start_idx + max_per_grid, len(slides))
-        chunk_slides = slides[start_idx:end_idx]
-
-        grid = create_grid(chunk_slides, cols, width)
+    chunks = [slides[i : i + max_per_grid] for i in range(0, len(slides), max_per_grid)]
 
-        if len(slides) <= max_per_grid:
+    def write_grid(chunk_idx: int) -> str:
+        if len(chunks) == 1:
             grid_filename = output_path
         else:
             stem = output_path.stem
             suffix = output_path.suffix
             grid_filename = output_path.parent / f"{stem}-{chunk_idx + 1}{suffix}"
 
+        grid = create_grid(chunks[chunk_idx], cols, width)
         grid_filename.parent.mkdir(parents=True, exist_ok=True)
         grid.save(str(grid_filename), quality=JPEG_QUALITY)
-        grid_files.append(str(grid_filename))
+        grid.close()
+        return str(grid_filename)
 
-    return grid_files
+    workers = max(1, min(len(chunks), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(write_grid, range(len(chunks))))
 
 
 def create_grid(
@@ -288,6 +566,9 @@ def create_grid(
         y_thumbnail = y_base + label_padding + font_size + label_padding
 
         with Image.open(img_path) as img:
+            # Let the JPEG decoder downscale by 1/2..1/8 while decoding, so a slide
+            # is never held at full CONVERSION_DPI size just to be shrunk.
+            img.draft("RGB", (width, height))
             img.thumbnail((width, height), Image.Resampling.LANCZOS)
             w, h = img.size
             tx = x + (width - w) // 2
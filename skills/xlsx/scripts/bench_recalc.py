@@ -0,0 +1,104 @@
+"""
+Benchmark the in-process formula engine against the LibreOffice recalculation.
+
+Each workbook is copied twice; one copy goes through LibreOffice, the other
+through formula_engine, and the cached values the two leave behind are compared
+cell by cell, so a speedup is only reported next to proof the numbers agree.
+"""
+
+import json
+import math
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+
+import formula_engine
+from office.helpers.xlsx_sheet import WorkbookScan
+from recalc import recalc
+
+
+def cached_formula_values(path):
+    with zipfile.ZipFile(path) as archive:
+        scan = WorkbookScan(archive)
+        values = {}
+        for sheet, part in scan.sheets:
+            for cell in scan.iter_cells(part):
+                if cell.formula is None:
+                    continue
+                value = cell.value
+                if value is not None and cell.data_type == "s":
+                    value = scan.shared_string(int(value))
+                values[f"{sheet}!{cell.coordinate}"] = (cell.data_type, value)
+        return values
+
+
+def _same(a, b):
+    if a == b:
+        return True
+    (ta, va), (tb, vb) = a, b
+    if ta == tb == "n" and va is not None and vb is not None:
+        return math.isclose(float(va), float(vb), rel_tol=1e-9, abs_tol=1e-12)
+    return False
+
+
+def bench(path, runs, timeout):
+    report = {"file": str(path)}
+    with tempfile.TemporaryDirectory(prefix="bench-recalc-") as tmp:
+        lo_copy = Path(tmp) / f"libreoffice{path.suffix}"
+        py_copy = Path(tmp) / f"python{path.suffix}"
+
+        lo_times, py_times = [], []
+        for _ in range(runs):
+            shutil.copyfile(path, lo_copy)
+            started = time.perf_counter()
+            lo_result = recalc(str(lo_copy), timeout)
+            lo_times.append(time.perf_counter() - started)
+
+            shutil.copyfile(path, py_copy)
+            started = time.perf_counter()
+            py_result = formula_engine.recalculate(str(py_copy))
+            py_times.append(time.perf_counter() - started)
+
+        report["libreoffice_seconds"] = round(min(lo_times), 4)
+        report["python_seconds"] = round(min(py_times), 4)
+        if py_result["unsupported"]:
+            report["python_unsupported"] = py_result["unsupported"][:10]
+            return report
+        report["recalculated_formulas"] = py_result["recalculated"]
+        report["speedup"] = round(min(lo_times) / max(min(py_times), 1e-9), 1)
+        if "error" in lo_result:
+            report["libreoffice_error"] = lo_result["error"]
+            return report
+
+        lo_values = cached_formula_values(lo_copy)
+        py_values = cached_formula_values(py_copy)
+        mismatches = [
+            {"cell": cell, "libreoffice": lo_values[cell][1], "python": py_values.get(cell, (None, None))[1]}
+            for cell in lo_values
+            if not _same(lo_values[cell], py_values.get(cell, (None, None)))
+        ]
+        report["mismatches"] = len(mismatches)
+        report["mismatch_sample"] = mismatches[:10]
+    return report
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    runs = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--runs=")), 3)
+    timeout = next((int(a.split("=", 1)[1]) for a in sys.argv[1:] if a.startswith("--timeout=")), 60)
+    if not args:
+        print("Usage: python bench_recalc.py <excel_file>... [--runs=3] [--timeout=60]")
+        print("\nTimes LibreOffice and the in-process engine on copies of each file and")
+        print("compares the cached values each leaves behind.")
+        sys.exit(1)
+
+    reports = [bench(Path(a), runs, timeout) for a in args]
+    print(json.dumps(reports, indent=2))
+    sys.exit(1 if any(r.get("mismatches") for r in reports) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,870 @@
+"""
+In-process formula recalculation for workbooks of plain arithmetic and lookups.
+
+Formulas are parsed into a dependency graph. Formula cells with no cached value
+(openpyxl strips them all on save) and every cell downstream of a named changed
+input are recomputed; everything else keeps the value already in the file. A
+formula the engine cannot evaluate exactly is reported, never approximated, so
+the caller can hand the workbook to LibreOffice instead.
+"""
+
+import math
+import os
+import re
+import tempfile
+import zipfile
+from bisect import bisect_right
+from collections import defaultdict
+from decimal import MAX_EMAX, MIN_EMIN, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP, Decimal, localcontext
+from xml.sax.saxutils import escape as xml_escape
+
+from openpyxl.formula.tokenizer import Token, Tokenizer
+from openpyxl.formula.translate import Translator
+
+from office.helpers.xlsx_sheet import CELL_REF_RE, WorkbookScan, column_index, column_letter
+
+MAX_COLUMN = 16384
+
+REF_PART = r"(\$?[A-Z]{1,3}\$?\d+|\$?[A-Z]{1,3}|\$?\d+)"
+REF_RE = re.compile(
+    rf"^(?:(?:'((?:[^']|'')+)'|([^'!:\[\]]+))!)?{REF_PART}(?::{REF_PART})?$", re.IGNORECASE
+)
+CHANGED_REF_RE = re.compile(r"^(?:(?:'((?:[^']|'')+)'|([^'!]+))!)?\$?([A-Z]+)\$?(\d+)$", re.IGNORECASE)
+CELL_XML_RE = re.compile(r"<c\b([^>]*?)(/>|>(.*?)</c>)", re.DOTALL)
+CELL_R_RE = re.compile(r'\br="([^"]+)"')
+CELL_T_RE = re.compile(r'\s+t="[^"]*"')
+VALUE_XML_RE = re.compile(r"<v\s*/>|<v>.*?</v>", re.DOTALL)
+FORMULA_END_RE = re.compile(r"</f>|<f\b[^>]*/>")
+
+INFIX = {"=": 1, "<>": 1, "<": 1, ">": 1, "<=": 1, ">=": 1, "&": 2, "+": 3, "-": 3, "*": 4, "/": 4, "^": 5}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class ExcelError(str):
+    pass
+
+
+class CellError(Exception):
+    def __init__(self, error):
+        super().__init__(error)
+        self.error = error
+
+
+DIV0 = ExcelError("#DIV/0!")
+VALUE = ExcelError("#VALUE!")
+REF = ExcelError("#REF!")
+NUM = ExcelError("#NUM!")
+NA = ExcelError("#N/A")
+
+
+class Area:
+    def __init__(self, book, sheet, r1, c1, r2, c2):
+        self.book, self.sheet = book, sheet
+        self.r1, self.c1, self.r2, self.c2 = r1, c1, r2, c2
+
+    @property
+    def height(self):
+        return self.r2 - self.r1 + 1
+
+    @property
+    def width(self):
+        return self.c2 - self.c1 + 1
+
+    def value(self, row, col):
+        return self.book.values.get((self.sheet, self.r1 + row, self.c1 + col))
+
+    def values(self):
+        for r in range(self.r1, self.r2 + 1):
+            for c in range(self.c1, self.c2 + 1):
+                yield self.book.values.get((self.sheet, r, c))
+
+    def vector(self):
+        if self.height == 1:
+            return [self.value(0, c) for c in range(self.width)]
+        if self.width == 1:
+            return [self.value(r, 0) for r in range(self.height)]
+        raise CellError(NA)
+
+
+# ---------------------------------------------------------------- parsing --
+
+
+class Parser:
+    def __init__(self, book, sheet, formula):
+        self.book, self.sheet = book, sheet
+        try:
+            items = Tokenizer("=" + formula).items
+        except Exception as e:
+            raise Unsupported(f"cannot tokenize: {e}")
+        self.tokens = [t for t in items if t.type != Token.WSPACE]
+        self.pos = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise Unsupported("empty formula")
+        node = self.expr(0)
+        if self.pos != len(self.tokens):
+            raise Unsupported(f"unexpected {self.tokens[self.pos].value!r}")
+        return node
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self):
+        token = self.peek()
+        if token is None:
+            raise Unsupported("formula ends early")
+        self.pos += 1
+        return token
+
+    def expr(self, min_prec):
+        left = self.unary()
+        while True:
+            token = self.peek()
+            if token is None or token.type != Token.OP_IN or token.value not in INFIX:
+                if token is not None and token.type == Token.OP_IN:
+                    raise Unsupported(f"operator {token.value!r}")
+                return left
+            prec = INFIX[token.value]
+            if prec < min_prec:
+                return left
+            self.pos += 1
+            left = ("op", token.value, left, self.expr(prec + 1))
+
+    def unary(self):
+        token = self.peek()
+        if token is not None and token.type == Token.OP_PRE:
+            self.pos += 1
+            operand = self.unary()
+            return ("neg", operand) if token.value == "-" else operand
+        node = self.primary()
+        while (token := self.peek()) is not None and token.type == Token.OP_POST:
+            self.pos += 1
+            node = ("pct", node)
+        return node
+
+    def primary(self):
+        token = self.take()
+        if token.type == Token.OPERAND:
+            if token.subtype == Token.NUMBER:
+                return ("const", float(token.value))
+            if token.subtype == Token.TEXT:
+                return ("const", token.value[1:-1].replace('""', '"'))
+            if token.subtype == Token.LOGICAL:
+                return ("const", token.value.upper() == "TRUE")
+            if token.subtype == Token.ERROR:
+                return ("const", ExcelError(token.value.upper()))
+            return self.reference(token.value)
+        if token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = self.expr(0)
+            close = self.take()
+            if close.type != Token.PAREN or close.subtype != Token.CLOSE:
+                raise Unsupported("unbalanced parentheses")
+            return node
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            name = token.value[:-1].upper()
+            if name not in FUNCTIONS:
+                raise Unsupported(f"function {name}")
+            args = []
+            if (t := self.peek()) is not None and t.type == Token.FUNC and t.subtype == Token.CLOSE:
+                self.pos += 1
+                return ("call", name, args)
+            while True:
+                t = self.peek()
+                if t is None or t.type == Token.SEP or (t.type == Token.FUNC and t.subtype == Token.CLOSE):
+                    raise Unsupported(f"empty argument to {name}")
+                args.append(self.expr(0))
+                t = self.take()
+                if t.type == Token.FUNC and t.subtype == Token.CLOSE:
+                    return ("call", name, args)
+                if t.type != Token.SEP or t.subtype != Token.ARG:
+                    raise Unsupported(f"unexpected {t.value!r} in {name}")
+        raise Unsupported(f"unexpected {token.value!r}")
+
+    def reference(self, text):
+        m = REF_RE.match(text)
+        if not m:
+            raise Unsupported(f"reference {text!r}")
+        quoted, bare, start, end = m.groups()
+        sheet = quoted.replace("''", "'") if quoted is not None else (bare or self.sheet)
+        if sheet not in self.book.sheet_index:
+            raise Unsupported(f"reference to unknown sheet {sheet!r}")
+        r1, c1 = self._bound(start)
+        if end is None:
+            if r1 is None or c1 is None:
+                raise Unsupported(f"reference {text!r}")
+            return ("cell", sheet, r1, c1)
+        r2, c2 = self._bound(end)
+        if (r1 is None) != (r2 is None) or (c1 is None) != (c2 is None):
+            raise Unsupported(f"reference {text!r}")
+        max_row, max_col = self.book.dimensions[sheet]
+        r1, r2 = (1, max_row) if r1 is None else (min(r1, r2), max(r1, r2))
+        c1, c2 = (1, max_col) if c1 is None else (min(c1, c2), max(c1, c2))
+        return ("area", sheet, r1, c1, r2, c2)
+
+    def _bound(self, part):
+        part = part.replace("$", "").upper()
+        letters = part.rstrip("0123456789")
+        digits = part[len(letters):]
+        col = column_index(letters) if letters else None
+        row = int(digits) if digits else None
+        if (col is not None and col > MAX_COLUMN) or row == 0:
+            raise Unsupported(f"reference {part!r}")
+        return row, col
+
+
+def references(node):
+    kind = node[0]
+    if kind in ("cell", "area"):
+        yield node
+    elif kind in ("neg", "pct"):
+        yield from references(node[1])
+    elif kind == "op":
+        yield from references(node[2])
+        yield from references(node[3])
+    elif kind == "call":
+        for arg in node[2]:
+            yield from references(arg)
+
+
+# ------------------------------------------------------------- coercions --
+
+
+def _check(value):
+    if isinstance(value, ExcelError):
+        raise CellError(value)
+    return value
+
+
+def to_number(value):
+    value = _check(value)
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return 1.0 if value else 0.0
+    if isinstance(value, float):
+        return value
+    try:
+        return float(value.strip())
+    except ValueError:
+        raise CellError(VALUE)
+
+
+def to_bool(value):
+    value = _check(value)
+    if value is None:
+        return False
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, float):
+        return value != 0
+    if value.upper() in ("TRUE", "FALSE"):
+        return value.upper() == "TRUE"
+    raise CellError(VALUE)
+
+
+def format_number(value):
+    if value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return f"{value:.15g}".upper()
+
+
+def to_text(value):
+    value = _check(value)
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return format_number(value)
+    return value
+
+
+def _rank(value):
+    if isinstance(value, bool):
+        return 2
+    if isinstance(value, str):
+        return 1
+    return 0
+
+
+def compare(a, b):
+    _check(a)
+    _check(b)
+    if a is None:
+        a = "" if isinstance(b, str) else (False if isinstance(b, bool) else 0.0)
+    if b is None:
+        b = "" if isinstance(a, str) else (False if isinstance(a, bool) else 0.0)
+    ra, rb = _rank(a), _rank(b)
+    if ra != rb:
+        return (ra > rb) - (ra < rb)
+    if ra == 1:
+        a, b = a.lower(), b.lower()
+    return (a > b) - (a < b)
+
+
+def _finite(value):
+    if math.isnan(value) or math.isinf(value):
+        raise CellError(NUM)
+    return value
+
+
+def _scalar(arg):
+    if isinstance(arg, Area):
+        raise Unsupported("a range where a single value is expected")
+    return arg
+
+
+# ------------------------------------------------------------- functions --
+
+
+def _numbers(args):
+    for arg in args:
+        if isinstance(arg, Area):
+            for v in arg.values():
+                _check(v)
+                if isinstance(v, float):
+                    yield v
+        else:
+            yield to_number(arg)
+
+
+def fn_sum(args):
+    return math.fsum(_numbers(args))
+
+
+def fn_average(args):
+    values = list(_numbers(args))
+    if not values:
+        raise CellError(DIV0)
+    return math.fsum(values) / len(values)
+
+
+def fn_min(args):
+    return min(_numbers(args), default=0.0)
+
+
+def fn_max(args):
+    return max(_numbers(args), default=0.0)
+
+
+def fn_count(args):
+    count = 0
+    for arg in args:
+        if isinstance(arg, Area):
+            count += sum(1 for v in arg.values() if isinstance(v, float))
+        else:
+            try:
+                to_number(arg)
+                count += arg is not None
+            except CellError:
+                pass
+    return float(count)
+
+
+def fn_counta(args):
+    count = 0
+    for arg in args:
+        if isinstance(arg, Area):
+            count += sum(1 for v in arg.values() if v is not None)
+        else:
+            count += 1
+    return float(count)
+
+
+def _logicals(args):
+    found = []
+    for arg in args:
+        if isinstance(arg, Area):
+            for v in arg.values():
+                _check(v)
+                if isinstance(v, (bool, float)):
+                    found.append(bool(v))
+        else:
+            found.append(to_bool(arg))
+    if not found:
+        raise CellError(VALUE)
+    return found
+
+
+def fn_and(args):
+    return all(_logicals(args))
+
+
+def fn_or(args):
+    return any(_logicals(args))
+
+
+def fn_not(args):
+    _arity("NOT", args, 1, 1)
+    return not to_bool(_scalar(args[0]))
+
+
+def _rounder(name, mode):
+    def fn(args):
+        _arity(name, args, 2, 2)
+        number, digits = to_number(_scalar(args[0])), int(to_number(_scalar(args[1])))
+        exact = Decimal(repr(number))
+        if exact.as_tuple().exponent >= -digits:
+            return number  # no digits past the one being rounded to
+        # What is left keeps at most the float's 17 digits plus a carry, but
+        # the quantum's exponent can be far outside the default context
+        with localcontext() as ctx:
+            ctx.prec, ctx.Emax, ctx.Emin = 40, MAX_EMAX, MIN_EMIN
+            return _finite(float(exact.quantize(Decimal(1).scaleb(-digits), rounding=mode)))
+
+    return fn
+
+
+def fn_abs(args):
+    _arity("ABS", args, 1, 1)
+    return abs(to_number(_scalar(args[0])))
+
+
+def fn_concatenate(args):
+    return "".join(to_text(_scalar(a)) for a in args)
+
+
+def _area(name, arg):
+    if not isinstance(arg, Area):
+        raise Unsupported(f"{name} over something other than a range")
+    return arg
+
+
+def _lookup_key(name, value):
+    value = _check(_scalar(value))
+    if isinstance(value, str) and any(ch in value for ch in "*?~"):
+        raise Unsupported(f"{name} with a wildcard lookup value")
+    return 0.0 if value is None else value
+
+
+def _position(keys, value, mode):
+    if mode == 0:
+        for i, key in enumerate(keys):
+            if key is not None and _rank(key) == _rank(value) and compare(key, value) == 0:
+                return i
+        raise CellError(NA)
+    found = None
+    for i, key in enumerate(keys):
+        if key is None or isinstance(key, ExcelError) or _rank(key) != _rank(value):
+            continue
+        order = compare(key, value)
+        if order == 0 or (order < 0) == (mode > 0):
+            found = i
+        else:
+            break
+    if found is None:
+        raise CellError(NA)
+    return found
+
+
+def fn_vlookup(args):
+    _arity("VLOOKUP", args, 3, 4)
+    value = _lookup_key("VLOOKUP", args[0])
+    table = _area("VLOOKUP", args[1])
+    col = int(to_number(_scalar(args[2])))
+    approximate = to_bool(_scalar(args[3])) if len(args) > 3 else True
+    if col < 1:
+        raise CellError(VALUE)
+    if col > table.width:
+        raise CellError(REF)
+    keys = [table.value(r, 0) for r in range(table.height)]
+    return table.value(_position(keys, value, 1 if approximate else 0), col - 1)
+
+
+def fn_match(args):
+    _arity("MATCH", args, 2, 3)
+    value = _lookup_key("MATCH", args[0])
+    keys = _area("MATCH", args[1]).vector()
+    mode = int(to_number(_scalar(args[2]))) if len(args) > 2 else 1
+    mode = (mode > 0) - (mode < 0)
+    return float(_position(keys, value, mode) + 1)
+
+
+def fn_index(args):
+    _arity("INDEX", args, 2, 3)
+    area = _area("INDEX", args[0])
+    row = int(to_number(_scalar(args[1])))
+    col = int(to_number(_scalar(args[2]))) if len(args) > 2 else None
+    if col is None:
+        if area.height == 1:
+            row, col = 1, row
+        elif area.width == 1:
+            col = 1
+        else:
+            raise Unsupported("INDEX without a column over a 2-D range")
+    if row == 0 or col == 0:
+        raise Unsupported("INDEX returning a whole row or column")
+    if row < 0 or col < 0:
+        raise CellError(VALUE)
+    if row > area.height or col > area.width:
+        raise CellError(REF)
+    return area.value(row - 1, col - 1)
+
+
+def _arity(name, args, low, high):
+    if not low <= len(args) <= high:
+        raise Unsupported(f"{name} with {len(args)} arguments")
+
+
+FUNCTIONS = {
+    "SUM": fn_sum,
+    "AVERAGE": fn_average,
+    "MIN": fn_min,
+    "MAX": fn_max,
+    "COUNT": fn_count,
+    "COUNTA": fn_counta,
+    "AND": fn_and,
+    "OR": fn_or,
+    "NOT": fn_not,
+    "ROUND": _rounder("ROUND", ROUND_HALF_UP),
+    "ROUNDUP": _rounder("ROUNDUP", ROUND_UP),
+    "ROUNDDOWN": _rounder("ROUNDDOWN", ROUND_DOWN),
+    "ABS": fn_abs,
+    "CONCATENATE": fn_concatenate,
+    "VLOOKUP": fn_vlookup,
+    "MATCH": fn_match,
+    "INDEX": fn_index,
+    "IF": None,
+    "IFERROR": None,
+}
+
+
+# ------------------------------------------------------------ evaluation --
+
+
+def _arith(op, a, b):
+    a, b = to_number(a), to_number(b)
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return _finite(a * b)
+    if op == "/":
+        if b == 0:
+            raise CellError(DIV0)
+        return _finite(a / b)
+    if a == 0 and b < 0:
+        raise CellError(DIV0)
+    if a == 0 and b == 0:
+        raise CellError(NUM)
+    try:
+        result = a**b
+    except OverflowError:
+        raise CellError(NUM)
+    if isinstance(result, complex):
+        raise CellError(NUM)
+    return _finite(result)
+
+
+def evaluate(book, node):
+    kind = node[0]
+    if kind == "const":
+        return node[1]
+    if kind == "cell":
+        return book.values.get((node[1], node[2], node[3]))
+    if kind == "area":
+        return Area(book, *node[1:])
+    if kind == "neg":
+        return -to_number(_scalar(evaluate(book, node[1])))
+    if kind == "pct":
+        return to_number(_scalar(evaluate(book, node[1]))) / 100
+    if kind == "op":
+        op = node[1]
+        a = _scalar(evaluate(book, node[2]))
+        b = _scalar(evaluate(book, node[3]))
+        if op == "&":
+            return to_text(a) + to_text(b)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            order = compare(a, b)
+            return {
+                "=": order == 0,
+                "<>": order != 0,
+                "<": order < 0,
+                ">": order > 0,
+                "<=": order <= 0,
+                ">=": order >= 0,
+            }[op]
+        return _arith(op, a, b)
+
+    name, args = node[1], node[2]
+    if name == "IF":
+        _arity("IF", args, 2, 3)
+        if to_bool(_scalar(evaluate(book, args[0]))):
+            return _scalar(evaluate(book, args[1]))
+        return _scalar(evaluate(book, args[2])) if len(args) > 2 else False
+    if name == "IFERROR":
+        _arity("IFERROR", args, 2, 2)
+        try:
+            return _check(_scalar(evaluate(book, args[0])))
+        except CellError:
+            return _scalar(evaluate(book, args[1]))
+    return FUNCTIONS[name]([evaluate(book, arg) for arg in args])
+
+
+# --------------------------------------------------------------- workbook --
+
+
+class Book:
+    def __init__(self, archive):
+        self.scan = WorkbookScan(archive)
+        self.sheet_index = {name: i for i, (name, _) in enumerate(self.scan.sheets)}
+        self.values = {}
+        self.formulas = {}
+        self.dimensions = {}
+
+        for name, part in self.scan.sheets:
+            max_row = max_col = 0
+            for cell in self.scan.iter_cells(part, translate=_translate):
+                col, row = CELL_REF_RE.match(cell.coordinate).groups()
+                key = (name, int(row), column_index(col))
+                max_row, max_col = max(max_row, key[1]), max(max_col, key[2])
+                if cell.formula is not None:
+                    self.formulas[key] = cell
+                self.values[key] = self._decode(cell)
+            self.dimensions[name] = (max_row, max_col)
+
+    def _decode(self, cell):
+        if cell.value is None:
+            return None
+        if cell.data_type == "s":
+            return self.scan.shared_string(int(cell.value))
+        if cell.data_type == "b":
+            return cell.value == "1"
+        if cell.data_type == "e":
+            return ExcelError(cell.value)
+        if cell.data_type in ("str", "inlineStr", "d"):
+            return cell.value
+        return float(cell.value)
+
+
+def _translate(formula, origin, dest):
+    return Translator("=" + formula, origin).translate_formula(dest)[1:]
+
+
+def _label(key):
+    sheet, row, col = key
+    return f"{sheet}!{column_letter(col)}{row}"
+
+
+def parse_changed(book, refs):
+    keys = set()
+    first_sheet = book.scan.sheets[0][0] if book.scan.sheets else None
+    for ref in refs:
+        m = CHANGED_REF_RE.match(ref.strip())
+        if not m:
+            raise ValueError(f"not a cell reference: {ref!r}")
+        quoted, bare, col, row = m.groups()
+        sheet = quoted.replace("''", "'") if quoted is not None else (bare or first_sheet)
+        if sheet not in book.sheet_index:
+            raise ValueError(f"no sheet named {sheet!r}")
+        keys.add((sheet, int(row), column_index(col.upper())))
+    return keys
+
+
+class Graph:
+    def __init__(self, book):
+        self.book = book
+        self.nodes = {}
+        self.unsupported = {}
+        self.cell_dependents = defaultdict(list)
+        self.area_dependents = defaultdict(list)
+
+        for key, cell in book.formulas.items():
+            if cell.formula_type in ("array", "dataTable"):
+                self.unsupported[key] = f"{cell.formula_type} formula"
+                continue
+            try:
+                node = Parser(book, key[0], cell.formula).parse()
+            except Unsupported as e:
+                self.unsupported[key] = str(e)
+                continue
+            self.nodes[key] = node
+            for ref in references(node):
+                if ref[0] == "cell":
+                    self.cell_dependents[ref[1:]].append(key)
+                else:
+                    self.area_dependents[ref[1]].append((ref[2:], key))
+
+        for sheet, entries in self.area_dependents.items():
+            entries.sort(key=lambda e: e[0][0])
+            self.area_dependents[sheet] = (entries, [e[0][0] for e in entries])
+
+    def dependents(self, key):
+        yield from self.cell_dependents.get(key, ())
+        sheet, row, col = key
+        if sheet not in self.area_dependents:
+            return
+        entries, starts = self.area_dependents[sheet]
+        for (r1, c1, r2, c2), dependent in entries[: bisect_right(starts, row)]:
+            if row <= r2 and c1 <= col <= c2:
+                yield dependent
+
+    def dirty(self, changed):
+        formula_keys = set(self.nodes) | set(self.unsupported)
+        seeds = {key for key in formula_keys if self.book.values.get(key) is None}
+        seeds |= changed & formula_keys
+        if len(seeds) == len(formula_keys):
+            return seeds
+        dirty = set(seeds)
+        queue = list(seeds | changed)
+        while queue:
+            for dependent in self.dependents(queue.pop()):
+                if dependent not in dirty:
+                    dirty.add(dependent)
+                    queue.append(dependent)
+        return dirty
+
+    def precedents(self, key, dirty, dirty_by_sheet):
+        for ref in references(self.nodes[key]):
+            if ref[0] == "cell":
+                if ref[1:] in dirty:
+                    yield ref[1:]
+                continue
+            sheet, r1, c1, r2, c2 = ref[1:]
+            candidates = dirty_by_sheet.get(sheet, ())
+            if (r2 - r1 + 1) * (c2 - c1 + 1) <= len(candidates):
+                for r in range(r1, r2 + 1):
+                    for c in range(c1, c2 + 1):
+                        if (sheet, r, c) in dirty:
+                            yield (sheet, r, c)
+            else:
+                for other in candidates:
+                    if r1 <= other[1] <= r2 and c1 <= other[2] <= c2:
+                        yield other
+
+    def order(self, dirty):
+        dirty_by_sheet = defaultdict(list)
+        for key in dirty:
+            dirty_by_sheet[key[0]].append(key)
+        state, order = {}, []
+        for start in sorted(dirty):
+            if start in state:
+                continue
+            state[start] = 1
+            stack = [(start, self.precedents(start, dirty, dirty_by_sheet))]
+            while stack:
+                key, pending = stack[-1]
+                for dep in pending:
+                    if state.get(dep) == 1:
+                        raise Unsupported(f"circular reference through {_label(dep)}")
+                    if dep not in state:
+                        state[dep] = 1
+                        stack.append((dep, self.precedents(dep, dirty, dirty_by_sheet)))
+                        break
+                else:
+                    stack.pop()
+                    state[key] = 2
+                    order.append(key)
+        return order
+
+
+# ---------------------------------------------------------------- writing --
+
+
+def _cell_xml(value):
+    if isinstance(value, ExcelError):
+        return "e", xml_escape(value)
+    if isinstance(value, bool):
+        return "b", "1" if value else "0"
+    if isinstance(value, str):
+        return "str", xml_escape(value)
+    if value.is_integer() and abs(value) < 1e15:
+        return None, str(int(value))
+    return None, repr(value)
+
+
+def _rewrite_sheet(xml, updates):
+    pending = dict(updates)
+
+    def replace(m):
+        attrs, _, body = m.groups()
+        r = CELL_R_RE.search(attrs)
+        if r is None or r.group(1) not in pending or body is None:
+            return m.group(0)
+        data_type, text = _cell_xml(pending.pop(r.group(1)))
+        attrs = CELL_T_RE.sub("", attrs) + (f' t="{data_type}"' if data_type else "")
+        body = VALUE_XML_RE.sub("", body)
+        end = FORMULA_END_RE.search(body)
+        if end is None:
+            raise Unsupported(f"cannot place a value in cell {r.group(1)}")
+        body = body[: end.end()] + f"<v>{text}</v>" + body[end.end():]
+        return f"<c{attrs}>{body}</c>"
+
+    xml = CELL_XML_RE.sub(replace, xml)
+    if pending:
+        raise Unsupported(f"cells without an r attribute: {', '.join(sorted(pending)[:5])}")
+    return xml
+
+
+def write_package(path, replacements):
+    fd, tmp_name = tempfile.mkstemp(
+        prefix=os.path.basename(path) + ".", suffix=".tmp", dir=os.path.dirname(path)
+    )
+    try:
+        with os.fdopen(fd, "wb") as fh, zipfile.ZipFile(path) as src, zipfile.ZipFile(fh, "w") as dst:
+            for info in src.infolist():
+                data = replacements.get(info.filename)
+                dst.writestr(info, src.read(info) if data is None else data)
+        os.chmod(tmp_name, os.stat(path).st_mode & 0o777)
+        os.replace(tmp_name, path)
+    finally:
+        if os.path.exists(tmp_name):
+            os.unlink(tmp_name)
+
+
+def recalculate(path, changed=()):
+    """Recompute stale formulas in place, or report why the engine cannot.
+
+    Returns {"recalculated": n, "unsupported": [...]}; the file is only
+    rewritten when "unsupported" is empty.
+    """
+    with zipfile.ZipFile(path) as archive:
+        book = Book(archive)
+        graph = Graph(book)
+        try:
+            changed = parse_changed(book, changed)
+        except ValueError as e:
+            return {"recalculated": 0, "unsupported": [f"changed cell: {e}"]}
+        dirty = graph.dirty(changed)
+
+        unsupported = [
+            f"{_label(key)}: {graph.unsupported[key]}"
+            for key in sorted(dirty)
+            if key in graph.unsupported
+        ]
+        if unsupported:
+            return {"recalculated": 0, "unsupported": unsupported}
+
+        try:
+            order = graph.order(dirty)
+        except Unsupported as e:
+            return {"recalculated": 0, "unsupported": [str(e)]}
+        for key in order:
+            try:
+                value = _scalar(evaluate(book, graph.nodes[key]))
+            except CellError as e:
+                value = e.error
+            except Unsupported as e:
+                return {"recalculated": 0, "unsupported": [f"{_label(key)}: {e}"]}
+            book.values[key] = 0.0 if value is None else value
+
+        updates = defaultdict(dict)
+        for key in order:
+            updates[key[0]][f"{column_letter(key[2])}{key[1]}"] = book.values[key]
+        try:
+            replacements = {
+                part: _rewrite_sheet(archive.read(part).decode("utf-8"), updates[name]).encode("utf-8")
+                for name, part in book.scan.sheets
+                if updates.get(name)
+            }
+        except Unsupported as e:
+            return {"recalculated": 0, "unsupported": [str(e)]}
+
+    if replacements:
+        write_package(path, replacements)
+    return {"recalculated": len(order), "unsupported": []}
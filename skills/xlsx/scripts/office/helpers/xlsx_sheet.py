@@ -0,0 +1,193 @@
+"""Stream worksheet cells out of an .xlsx package without loading the workbook.
+
+openpyxl needs a data_only load for cached values and a second load for
+formulas; one iterparse pass over a sheet part yields both, row by row.
+"""
+
+from __future__ import annotations
+
+import posixpath
+import re
+import zipfile
+from collections import namedtuple
+
+from defusedxml.ElementTree import fromstring, iterparse
+
+from . import opc_target
+
+EXCEL_ERRORS = ("#VALUE!", "#DIV/0!", "#REF!", "#NAME?", "#NULL!", "#NUM!", "#N/A")
+
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+DOC_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+OFFICE_DOCUMENT_REL_TYPE = DOC_REL + "/officeDocument"
+WORKSHEET_REL_TYPE = DOC_REL + "/worksheet"
+SHARED_STRINGS_REL_TYPE = DOC_REL + "/sharedStrings"
+
+CELL_REF_RE = re.compile(r"^\$?([A-Z]+)\$?(\d+)$")
+
+# formula is the cell's own <f> text. A shared-formula follower carries its
+# master's text, untranslated unless iter_cells was given a translate callback --
+# good enough for pattern matching, not for evaluation.
+Cell = namedtuple("Cell", "coordinate formula formula_type data_type value")
+
+
+def column_letter(index: int) -> str:
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+
+def column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - 64
+    return index
+
+
+def _rich_text(node) -> str:
+    snippets = [node.findtext(f"{SHEET_NS}t") or ""]
+    snippets += [r.findtext(f"{SHEET_NS}t") or "" for r in node.findall(f"{SHEET_NS}r")]
+    return "".join(snippets)
+
+
+def _first_error(text: str) -> str | None:
+    for err in EXCEL_ERRORS:
+        if err in text:
+            return err
+    return None
+
+
+class WorkbookScan:
+    """Sheets, defined names and cells of one open workbook archive.
+
+    Shared strings are only read once a string cell needs them: cell_error keeps
+    just the entries holding an error token, shared_string loads the whole table.
+    """
+
+    def __init__(self, archive: zipfile.ZipFile):
+        self.archive = archive
+        self.names = set(archive.namelist())
+        self.sheets = []
+        self.defined_names = {}
+        self._shared_strings_part = None
+        self._shared_errors = None
+        self._shared_strings = None
+
+        book_part = next(
+            (t for _, rel_type, t in self._rels("") if rel_type == OFFICE_DOCUMENT_REL_TYPE),
+            "xl/workbook.xml",
+        )
+        rels = {rid: (rel_type, target) for rid, rel_type, target in self._rels(book_part)}
+        for rel_type, target in rels.values():
+            if rel_type == SHARED_STRINGS_REL_TYPE and target in self.names:
+                self._shared_strings_part = target
+
+        root = fromstring(archive.read(book_part))
+        for sheet in root.iter(f"{SHEET_NS}sheet"):
+            rel_type, target = rels.get(sheet.get(f"{{{DOC_REL}}}id"), (None, None))
+            if rel_type == WORKSHEET_REL_TYPE and target in self.names:
+                self.sheets.append((sheet.get("name"), target))
+        for dn in root.iter(f"{SHEET_NS}definedName"):
+            if dn.text:
+                self.defined_names[dn.get("name")] = dn.text
+
+    def _rels(self, part: str) -> list[tuple[str, str, str | None]]:
+        rels_name = posixpath.join(
+            posixpath.dirname(part), "_rels", posixpath.basename(part) + ".rels"
+        )
+        if rels_name not in self.names:
+            return []
+        out = []
+        for rel in fromstring(self.archive.read(rels_name)).iter(f"{PKG_REL_NS}Relationship"):
+            try:
+                target = opc_target(rel.get("Target", ""), part, rel.get("TargetMode", ""))
+            except ValueError:
+                continue
+            out.append((rel.get("Id"), rel.get("Type"), target))
+        return out
+
+    def iter_cells(self, part: str, translate=None):
+        shared_formulas = {}
+        row_num = 0
+        sheet_data = None
+        with self.archive.open(part) as fh:
+            for event, elem in iterparse(fh, events=("start", "end")):
+                if event == "start":
+                    if elem.tag == f"{SHEET_NS}sheetData":
+                        sheet_data = elem
+                    elif elem.tag == f"{SHEET_NS}row":
+                        row_num = int(elem.get("r") or row_num + 1)
+                        col = 0
+                    continue
+                if elem.tag == f"{SHEET_NS}row" and sheet_data is not None:
+                    sheet_data.clear()
+                    continue
+                if elem.tag != f"{SHEET_NS}c":
+                    continue
+
+                ref = CELL_REF_RE.match(elem.get("r") or "")
+                col = column_index(ref.group(1)) if ref else col + 1
+                coordinate = f"{column_letter(col)}{row_num}"
+
+                formula = formula_type = None
+                f = elem.find(f"{SHEET_NS}f")
+                if f is not None:
+                    formula = f.text or ""
+                    formula_type = f.get("t")
+                    if formula_type == "shared":
+                        si = f.get("si")
+                        if formula:
+                            shared_formulas.setdefault(si, (formula, coordinate))
+                        elif si in shared_formulas:
+                            master, origin = shared_formulas[si]
+                            formula = translate(master, origin, coordinate) if translate else master
+
+                data_type = elem.get("t", "n")
+                if data_type == "inlineStr":
+                    inline = elem.find(f"{SHEET_NS}is")
+                    value = _rich_text(inline) if inline is not None else None
+                else:
+                    value = elem.findtext(f"{SHEET_NS}v")
+                yield Cell(coordinate, formula, formula_type, data_type, value or None)
+
+    def cell_error(self, cell: Cell) -> str | None:
+        if cell.value is None:
+            return None
+        if cell.data_type == "s":
+            try:
+                return self._shared_string_errors().get(int(cell.value))
+            except ValueError:
+                return None
+        if cell.data_type in ("str", "e", "inlineStr"):
+            return _first_error(cell.value)
+        return None
+
+    def shared_string(self, index: int) -> str:
+        if self._shared_strings is None:
+            self._shared_strings = []
+            if self._shared_strings_part:
+                with self.archive.open(self._shared_strings_part) as fh:
+                    for _, elem in iterparse(fh):
+                        if elem.tag == f"{SHEET_NS}si":
+                            self._shared_strings.append(_rich_text(elem))
+                            elem.clear()
+        return self._shared_strings[index]
+
+    def _shared_string_errors(self) -> dict[int, str]:
+        if self._shared_errors is None:
+            self._shared_errors = {}
+            if self._shared_strings_part:
+                with self.archive.open(self._shared_strings_part) as fh:
+                    index = 0
+                    for _, elem in iterparse(fh):
+                        if elem.tag != f"{SHEET_NS}si":
+                            continue
+                        err = _first_error(_rich_text(elem))
+                        if err:
+                            self._shared_errors[index] = err
+                        index += 1
+                        elem.clear()
+        return self._shared_errors
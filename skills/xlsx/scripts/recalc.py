@@ -3,7 +3,6 @@ Excel Formula Recalculation Script
 Recalculates all formulas in an Excel file using LibreOffice
 """
 
-import contextlib
 import json
 import os
 import platform
@@ -16,10 +15,10 @@ import time
 import zipfile
 from pathlib import Path
 
+import formula_engine
+from office.helpers.xlsx_sheet import EXCEL_ERRORS, WorkbookScan
 from office.soffice import get_soffice_env, run_soffice
 
-from openpyxl import load_workbook
-
 MACRO_FILENAME = "Module1.xba"
 SOFFICE_MISSING = "soffice not found on PATH; LibreOffice is required to recalculate"
 
@@ -80,23 +79,16 @@ def setup_libreoffice_macro(profile_dir: Path, timeout=30):
 
 def external_links_at_risk(filename):
     try:
-        with zipfile.ZipFile(filename) as archive:
-            names = archive.namelist()
+        archive = zipfile.ZipFile(filename)
     except (zipfile.BadZipFile, OSError):
         return []
-    if not any(n.startswith("xl/externalLinks/") for n in names):
-        return []
-
-    with contextlib.ExitStack() as stack:
-        formulas = load_workbook(filename, data_only=False)
-        stack.callback(formulas.close)
-        values = load_workbook(filename, data_only=True)
-        stack.callback(values.close)
+    with archive:
+        if not any(n.startswith("xl/externalLinks/") for n in archive.namelist()):
+            return []
 
+        book = WorkbookScan(archive)
         external_names = [
-            name
-            for name, dn in formulas.defined_names.items()
-            if isinstance(getattr(dn, "value", None), str) and EXTERNAL_REF_RE.search(dn.value)
+            name for name, value in book.defined_names.items() if EXTERNAL_REF_RE.search(value)
         ]
         name_re = (
             re.compile(r"\b(" + "|".join(re.escape(n) for n in external_names) + r")\b")
@@ -105,23 +97,51 @@ def external_links_at_risk(filename):
         )
 
         at_risk = []
-        for sheet in formulas.sheetnames:
-            ws = formulas[sheet]
-            if not hasattr(ws, "iter_rows"):  
-                continue
-            cached = values[sheet]
-            for row in ws.iter_rows():
-                for cell in row:
-                    v = cell.value
-                    if not (isinstance(v, str) and v.startswith("=")):
-                        continue
-                    reaches_out = EXTERNAL_REF_RE.search(v) or (name_re and name_re.search(v))
-                    if reaches_out and cached[cell.coordinate].value is None:
-                        at_risk.append(f"{sheet}!{cell.coordinate}")
+        for sheet, part in book.sheets:
+            for cell in book.iter_cells(part):
+                if not cell.formula or cell.formula_type in ("array", "dataTable"):
+                    continue
+                v = "=" + cell.formula
+                reaches_out = EXTERNAL_REF_RE.search(v) or (name_re and name_re.search(v))
+                if reaches_out and cell.value is None:
+                    at_risk.append(f"{sheet}!{cell.coordinate}")
         return at_risk
 
 
-def recalc(filename, timeout=30, force=False):
+def scan_workbook(filename):
+    error_counts = {err: 0 for err in EXCEL_ERRORS}
+    error_locations = {err: [] for err in EXCEL_ERRORS}
+    formula_count = 0
+
+    with zipfile.ZipFile(filename) as archive:
+        book = WorkbookScan(archive)
+        for sheet_name, part in book.sheets:
+            for cell in book.iter_cells(part):
+                if cell.formula is not None and cell.formula_type not in ("array", "dataTable"):
+                    formula_count += 1
+                err = book.cell_error(cell)
+                if err:
+                    error_counts[err] += 1
+                    if len(error_locations[err]) < MAX_LOCATIONS:
+                        error_locations[err].append(f"{sheet_name}!{cell.coordinate}")
+
+    total_errors = sum(error_counts.values())
+    result = {
+        "status": "success" if total_errors == 0 else "errors_found",
+        "total_errors": total_errors,
+        "error_summary": {},
+    }
+    for err_type, count in error_counts.items():
+        if count:
+            entry = {"count": count, "locations": error_locations[err_type]}
+            if count > MAX_LOCATIONS:
+                entry["locations_truncated"] = count - MAX_LOCATIONS
+            result["error_summary"][err_type] = entry
+    result["total_formulas"] = formula_count
+    return result
+
+
+def recalc(filename, timeout=30, force=False, in_process=False, changed=()):
     if not Path(filename).exists():
         return {"error": f"File {filename} does not exist"}
 
@@ -130,11 +150,6 @@ def recalc(filename, timeout=30, force=False):
     if not os.access(abs_path, os.W_OK):
         return {"error": f"{filename} is not writable; recalculation rewrites the file in place"}
 
-    try:
-        get_soffice_env()
-    except Exception as e:  
-        return {"error": f"Could not prepare the LibreOffice environment: {e}"}
-
     if not force:
         try:
             at_risk = external_links_at_risk(filename)
@@ -155,10 +170,33 @@ def recalc(filename, timeout=30, force=False):
                 "external_link_cells_truncated": max(0, len(at_risk) - len(shown)),
             }
 
+    if in_process:
+        try:
+            engine = formula_engine.recalculate(abs_path, changed)
+        except Exception as e:
+            engine = {"unsupported": [f"in-process engine failed: {e}"]}
+        if not engine["unsupported"]:
+            try:
+                result = scan_workbook(filename)
+            except Exception as e:
+                return {"error": str(e)}
+            result["engine"] = "python"
+            result["recalculated_formulas"] = engine["recalculated"]
+            return result
+
+    try:
+        get_soffice_env()
+    except Exception as e:  
+        return {"error": f"Could not prepare the LibreOffice environment: {e}"}
+
     with tempfile.TemporaryDirectory(
         prefix="recalc-lo-profile-", ignore_cleanup_errors=True
     ) as profile_dir:
-        return _recalc_with_profile(filename, abs_path, timeout, Path(profile_dir))
+        result = _recalc_with_profile(filename, abs_path, timeout, Path(profile_dir))
+    if in_process and "error" not in result:
+        result["engine"] = "libreoffice"
+        result["in_process_unsupported"] = engine["unsupported"][:MAX_LOCATIONS]
+    return result
 
 
 def _recalc_with_profile(filename, abs_path, timeout, profile_dir: Path):
@@ -212,79 +250,29 @@ def _recalc_with_profile(filename, abs_path, timeout, profile_dir: Path):
         }
 
     try:
-        wb = load_workbook(filename, data_only=True)
-
-        excel_errors = [
-            "#VALUE!",
-            "#DIV/0!",
-            "#REF!",
-            "#NAME?",
-            "#NULL!",
-            "#NUM!",
-            "#N/A",
-        ]
-        error_details = {err: [] for err in excel_errors}
-        total_errors = 0
-
-        for sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-            if not hasattr(ws, "iter_rows"):  
-                continue
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value is not None and isinstance(cell.value, str):
-                        for err in excel_errors:
-                            if err in cell.value:
-                                location = f"{sheet_name}!{cell.coordinate}"
-                                error_details[err].append(location)
-                                total_errors += 1
-                                break
-
-        result = {
-            "status": "success" if total_errors == 0 else "errors_found",
-            "total_errors": total_errors,
-            "error_summary": {},
-        }
-
-        for err_type, locations in error_details.items():
-            if locations:
-                entry = {"count": len(locations), "locations": locations[:MAX_LOCATIONS]}
-                if len(locations) > MAX_LOCATIONS:
-                    entry["locations_truncated"] = len(locations) - MAX_LOCATIONS
-                result["error_summary"][err_type] = entry
-
-        wb.close()
-
-        wb_formulas = load_workbook(filename, data_only=False)
-        formula_count = 0
-        for sheet_name in wb_formulas.sheetnames:
-            ws = wb_formulas[sheet_name]
-            if not hasattr(ws, "iter_rows"):  
-                continue
-            for row in ws.iter_rows():
-                for cell in row:
-                    if (
-                        cell.value
-                        and isinstance(cell.value, str)
-                        and cell.value.startswith("=")
-                    ):
-                        formula_count += 1
-        wb_formulas.close()
-
-        result["total_formulas"] = formula_count
-
-        return result
-
+        return scan_workbook(filename)
     except Exception as e:
         return {"error": str(e)}
 
 
 def main():
-    args = [a for a in sys.argv[1:] if a != "--force"]
-    force = "--force" in sys.argv[1:]
+    flags = [a for a in sys.argv[1:] if a.startswith("--")]
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    force = "--force" in flags
+    in_process = "--in-process" in flags
+    changed = [
+        ref
+        for flag in flags
+        if flag.startswith("--changed=")
+        for ref in flag.split("=", 1)[1].split(",")
+        if ref
+    ]
 
     if not args:
-        print("Usage: python recalc.py <excel_file> [timeout_seconds] [--force]")
+        print(
+            "Usage: python recalc.py <excel_file> [timeout_seconds] [--force] "
+            "[--in-process [--changed=Sheet!A1,...]]"
+        )
         print("\nRecalculates all formulas in an Excel file using LibreOffice")
         print("\nReturns JSON with error details:")
         print("  - status: 'success' or 'errors_found'")
@@ -294,12 +282,14 @@ def main():
         print("    - #VALUE!, #DIV/0!, #REF!, #NAME?, #NULL!, #NUM!, #N/A")
         print("\nOn any failure the JSON has an 'error' key and no 'status'.")
         print("--force recalculates even when it would destroy external links.")
+        print("--in-process tries the built-in engine first and falls back to LibreOffice")
+        print("  when a formula it needs is unsupported; --changed names edited input cells.")
         sys.exit(1)
 
     filename = args[0]
     timeout = int(args[1]) if len(args) > 1 else 30
 
-    result = recalc(filename, timeout, force=force)
+    result = recalc(filename, timeout, force=force, in_process=in_process, changed=changed)
     print(json.dumps(result, indent=2))
     sys.exit(1 if "error" in result else 0)
 
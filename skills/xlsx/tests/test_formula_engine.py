@@ -0,0 +1,142 @@
+"""Tests for scripts/formula_engine.py."""
+import sys
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+import formula_engine  # noqa: E402
+from office.helpers.xlsx_sheet import WorkbookScan  # noqa: E402
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+
+def _workbook(path, sheets):
+    """Write an .xlsx whose sheets map a name to the XML of its <row>s."""
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        + "".join(
+            f'<Override PartName="/xl/worksheets/sheet{i}.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            for i in range(1, len(sheets) + 1)
+        )
+        + "</Types>"
+    )
+    root_rels = (
+        f'<Relationships xmlns="{PKG_REL_NS}"><Relationship Id="rId1" '
+        f'Type="{REL_NS}/officeDocument" Target="xl/workbook.xml"/></Relationships>'
+    )
+    book = (
+        f'<workbook xmlns="{MAIN_NS}" xmlns:r="{REL_NS}"><sheets>'
+        + "".join(
+            f'<sheet name={quoteattr(name)} sheetId="{i}" r:id="rId{i}"/>'
+            for i, name in enumerate(sheets, 1)
+        )
+        + "</sheets></workbook>"
+    )
+    book_rels = (
+        f'<Relationships xmlns="{PKG_REL_NS}">'
+        + "".join(
+            f'<Relationship Id="rId{i}" Type="{REL_NS}/worksheet" Target="worksheets/sheet{i}.xml"/>'
+            for i in range(1, len(sheets) + 1)
+        )
+        + "</Relationships>"
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", root_rels)
+        zf.writestr("xl/workbook.xml", book)
+        zf.writestr("xl/_rels/workbook.xml.rels", book_rels)
+        for i, rows in enumerate(sheets.values(), 1):
+            zf.writestr(
+                f"xl/worksheets/sheet{i}.xml",
+                f'<worksheet xmlns="{MAIN_NS}"><sheetData>{rows}</sheetData></worksheet>',
+            )
+    return path
+
+
+def _cached(path):
+    """Cached value of every formula cell, by "Sheet!A1"."""
+    with zipfile.ZipFile(path) as archive:
+        scan = WorkbookScan(archive)
+        return {
+            f"{sheet}!{cell.coordinate}": cell.value
+            for sheet, part in scan.sheets
+            for cell in scan.iter_cells(part)
+            if cell.formula is not None
+        }
+
+
+def test_shared_formulas_are_translated_to_each_cell(tmp_path):
+    path = _workbook(tmp_path / "shared.xlsx", {
+        "Sheet1": (
+            '<row r="1"><c r="A1"><v>1</v></c><c r="B1"><f t="shared" ref="B1:B3" si="0">A1*2+$A$1</f></c></row>'
+            '<row r="2"><c r="A2"><v>2</v></c><c r="B2"><f t="shared" si="0"/></c></row>'
+            '<row r="3"><c r="A3"><v>3</v></c><c r="B3"><f t="shared" si="0"/></c></row>'
+        ),
+    })
+
+    assert formula_engine.recalculate(str(path)) == {"recalculated": 3, "unsupported": []}
+    assert _cached(path) == {"Sheet1!B1": "3", "Sheet1!B2": "5", "Sheet1!B3": "7"}
+
+
+def test_cross_sheet_references_follow_a_changed_input(tmp_path):
+    path = _workbook(tmp_path / "cross.xlsx", {
+        "My Data": '<row r="1"><c r="A1"><v>10</v></c><c r="B1"><v>4</v></c></row>',
+        "Summary": (
+            '<row r="1"><c r="A1"><f>\'My Data\'!A1*2</f><v>8</v></c>'
+            '<c r="B1"><f>A1+SUM(\'My Data\'!A1:B1)</f><v>14</v></c>'
+            '<c r="C1"><f>\'My Data\'!B1+1</f><v>99</v></c></row>'
+        ),
+    })
+
+    result = formula_engine.recalculate(str(path), ["'My Data'!A1"])
+
+    assert result == {"recalculated": 2, "unsupported": []}
+    # C1 does not depend on the changed cell, so its cached value is kept
+    assert _cached(path) == {"Summary!A1": "20", "Summary!B1": "34", "Summary!C1": "99"}
+
+
+def test_errors_propagate_to_dependent_cells(tmp_path):
+    path = _workbook(tmp_path / "errors.xlsx", {
+        "Sheet1": (
+            '<row r="1"><c r="A1"><f>1/0</f></c><c r="B1"><f>A1+1</f></c>'
+            '<c r="C1"><f>IFERROR(B1,-1)</f></c><c r="D1"><f>0^0</f></c>'
+            '<c r="E1"><f>D1&amp;"x"</f></c><c r="F1"><f>0^-1</f></c></row>'
+        ),
+    })
+
+    assert formula_engine.recalculate(str(path))["unsupported"] == []
+    assert _cached(path) == {
+        "Sheet1!A1": "#DIV/0!",
+        "Sheet1!B1": "#DIV/0!",
+        "Sheet1!C1": "-1",
+        "Sheet1!D1": "#NUM!",
+        "Sheet1!E1": "#NUM!",
+        "Sheet1!F1": "#DIV/0!",
+    }
+
+
+def test_round_keeps_numbers_beyond_decimal_precision(tmp_path):
+    path = _workbook(tmp_path / "round.xlsx", {
+        "Sheet1": (
+            '<row r="1"><c r="A1"><f>ROUND(1E+30,2)</f></c><c r="B1"><f>ROUND(1E+20,10)</f></c>'
+            '<c r="C1"><f>ROUNDDOWN(2.5,400)</f></c><c r="D1"><f>ROUND(123.456,-10000000)</f></c>'
+            '<c r="E1"><f>ROUNDUP(1234.5,-2)</f></c><c r="F1"><f>ROUND(-2.5,0)</f></c></row>'
+        ),
+    })
+
+    assert formula_engine.recalculate(str(path)) == {"recalculated": 6, "unsupported": []}
+    cached = _cached(path)
+    assert float(cached["Sheet1!A1"]) == 1e30
+    assert float(cached["Sheet1!B1"]) == 1e20
+    assert [cached[f"Sheet1!{c}1"] for c in "CDEF"] == ["2.5", "0", "1300", "-3"]
@@ -0,0 +1,74 @@
+"""Tests for scripts/office/helpers/package.py."""
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent / "scripts"
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from office.helpers.package import Package  # noqa: E402
+
+SHEET = b"<worksheet>" + b"<row><c><v>1</v></c></row>" * 2000 + b"</worksheet>"
+
+
+class _Unseekable(io.RawIOBase):
+    """A sink zipfile cannot seek back into, so it writes data descriptors."""
+
+    def __init__(self):
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def _sizes(path):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {info.filename: info.compress_size for info in zf.infolist()}
+
+
+def test_unchanged_members_keep_their_compressed_bytes(tmp_path):
+    src = tmp_path / "book.xlsx"
+    # Level 1 deflate: a member that went through zlib again at the default
+    # level would come out a different size.
+    with zipfile.ZipFile(src, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/worksheets/sheet1.xml", SHEET)
+        zf.writestr("xl/worksheets/sheet2.xml", SHEET)
+
+    with Package(src) as package:
+        package.write("xl/worksheets/sheet2.xml", SHEET.replace(b"1", b"2"))
+        package.save(tmp_path / "out.xlsx")
+
+    before, after = _sizes(src), _sizes(tmp_path / "out.xlsx")
+    assert after["xl/worksheets/sheet1.xml"] == before["xl/worksheets/sheet1.xml"]
+    with zipfile.ZipFile(tmp_path / "out.xlsx") as zf:
+        assert zf.read("xl/worksheets/sheet1.xml") == SHEET
+        assert zf.read("xl/worksheets/sheet2.xml") == SHEET.replace(b"1", b"2")
+
+
+def test_data_descriptor_and_zip64_members_are_copied(tmp_path):
+    sink = _Unseekable()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("xl/worksheets/sheet1.xml", SHEET)
+        with zf.open("xl/worksheets/sheet2.xml", "w", force_zip64=True) as fh:
+            fh.write(SHEET)
+    src = tmp_path / "streamed.xlsx"
+    src.write_bytes(sink.buffer.getvalue())
+    with zipfile.ZipFile(src) as zf:
+        assert all(info.flag_bits & 0x08 for info in zf.infolist())
+
+    with Package(src) as package:
+        package.write("[Content_Types].xml", "<Types><Default/></Types>")
+        package.save(tmp_path / "out.xlsx")
+
+    with zipfile.ZipFile(tmp_path / "out.xlsx") as zf:
+        assert zf.testzip() is None
+        assert zf.read("xl/worksheets/sheet1.xml") == SHEET
+        assert zf.read("xl/worksheets/sheet2.xml") == SHEET
+        assert not any(info.flag_bits & 0x08 for info in zf.infolist())